@@ -0,0 +1,146 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import exists, func, literal, or_, select, text
+
+# Hot/cold archival. A completed request whose campaigns all completed before
+# the cutoff is moved, with those campaigns and their volunteer rows, from the
+# hot tables to archive tables with the same columns (plus archived_at). The
+# archive tables live in the same database as the hot ones (each region's
+# database when sharded), so a batch is copied and deleted in one transaction.
+# Its duplicate-detection signatures are dropped, as completed requests are
+# never duplicate candidates. Requests and campaigns keep their ids, so the
+# newest row of each hot table is never moved: SQLite hands out max(id) + 1 to
+# the next insert on a plain integer key and would reuse an archived id.
+#
+# Figures that read the moved rows are kept through rollups: the impact stats
+# already come from ImpactRollup and map tiles from RequestTile; leaderboard
+# participation adds each volunteer's ARCHIVED_CAMPS_COUNTER user counter.
+
+ARCHIVED_CAMPS_COUNTER = 'camps_archived'
+
+COUNTER_UPSERT = """
+    INSERT INTO user_counter (user_id, counter, value) VALUES (:user_id, :counter, :delta)
+    ON CONFLICT (user_id, counter) DO UPDATE SET value = user_counter.value + excluded.value"""
+
+Batch = namedtuple('Batch', 'requests campaigns participations')
+
+
+def copy_rows(connection, source, target, where, now, keep_ids=True):
+    """INSERT INTO target SELECT the source columns, archived_at FROM source WHERE ..."""
+    columns = [c.name for c in source.columns if keep_ids or c.name != 'id']
+    connection.execute(target.insert().from_select(
+        columns + ['archived_at'],
+        select(*[source.c[name] for name in columns], literal(now)).where(where)
+    ))
+
+
+def archive_batch(connection, tables, cutoff, batch_size, now=None):
+    """
+    Move up to `batch_size` requests (and campaigns without a request) that
+    are due. `tables` maps 'request', 'campaign', 'campaign_volunteer',
+    'request_signature' and 'archived_request', 'archived_campaign',
+    'archived_campaign_volunteer' to Table objects. `connection` must be in a
+    transaction. Returns a Batch with the moved ids and the moved
+    participations per volunteer ({volunteer_id: count}).
+    """
+    now = now or datetime.utcnow()
+    request, campaign = tables['request'], tables['campaign']
+    volunteer, signature = tables['campaign_volunteer'], tables['request_signature']
+
+    newest_request = connection.execute(select(func.max(request.c.id))).scalar() or 0
+    newest_campaign = connection.execute(select(func.max(campaign.c.id))).scalar() or 0
+
+    open_campaign = select(campaign.c.id).where(
+        campaign.c.request_id == request.c.id,
+        or_(func.coalesce(campaign.c.status, '') != 'completed',
+            campaign.c.completed_at.is_(None),
+            campaign.c.completed_at >= cutoff,
+            campaign.c.id >= newest_campaign)
+    )
+    # Keep canonical requests that a hot duplicate still points at
+    duplicate = request.alias('duplicate')
+    hot_duplicate = select(duplicate.c.id).where(duplicate.c.duplicate_of == request.c.id)
+    request_ids = connection.execute(
+        select(request.c.id).where(
+            request.c.id < newest_request,
+            request.c.status == 'completed',
+            request.c.created_at < cutoff,
+            ~exists(open_campaign),
+            ~exists(hot_duplicate)
+        ).order_by(request.c.id).limit(batch_size)
+    ).scalars().all()
+
+    campaign_ids = connection.execute(
+        select(campaign.c.id).where(campaign.c.request_id.in_(request_ids))
+    ).scalars().all() if request_ids else []
+    campaign_ids += connection.execute(
+        select(campaign.c.id).where(
+            campaign.c.request_id.is_(None),
+            campaign.c.id < newest_campaign,
+            campaign.c.status == 'completed',
+            campaign.c.completed_at < cutoff
+        ).order_by(campaign.c.id).limit(batch_size)
+    ).scalars().all()
+
+    participations = {}
+    if campaign_ids:
+        participations = dict(connection.execute(
+            select(volunteer.c.volunteer_id, func.count(volunteer.c.id)).where(
+                volunteer.c.campaign_id.in_(campaign_ids),
+                volunteer.c.volunteer_id.isnot(None)
+            ).group_by(volunteer.c.volunteer_id)
+        ).all())
+        copy_rows(connection, campaign, tables['archived_campaign'], campaign.c.id.in_(campaign_ids), now)
+        copy_rows(connection, volunteer, tables['archived_campaign_volunteer'], volunteer.c.campaign_id.in_(campaign_ids), now,
+                  keep_ids=False)
+        connection.execute(volunteer.delete().where(volunteer.c.campaign_id.in_(campaign_ids)))
+        connection.execute(campaign.delete().where(campaign.c.id.in_(campaign_ids)))
+    if request_ids:
+        copy_rows(connection, request, tables['archived_request'], request.c.id.in_(request_ids), now)
+        connection.execute(signature.delete().where(signature.c.request_id.in_(request_ids)))
+        connection.execute(request.delete().where(request.c.id.in_(request_ids)))
+    return Batch(request_ids, campaign_ids, participations)
+
+
+def add_archived_camps(connection, participations):
+    """Add moved participations to the volunteers' ARCHIVED_CAMPS_COUNTER (SQLite 3.24+ / PostgreSQL)"""
+    if participations:
+        connection.execute(text(COUNTER_UPSERT), [
+            {'user_id': user_id, 'counter': ARCHIVED_CAMPS_COUNTER, 'delta': count}
+            for user_id, count in participations.items()
+        ])
+
+
+if __name__ == "__main__":
+    import sys
+    from datetime import timedelta
+    from app import app, db, region_engines
+
+    if sys.argv[1:] != ['run']:
+        print("Usage: python archive.py run")
+        sys.exit(1)
+
+    with app.app_context():
+        db.create_all()
+        metadata_tables = db.Model.metadata.tables
+        tables = {name: metadata_tables[name] for name in (
+            'request', 'campaign', 'campaign_volunteer', 'request_signature',
+            'archived_request', 'archived_campaign', 'archived_campaign_volunteer')}
+        cutoff = datetime.utcnow() - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+        for name, engine in region_engines().items():
+            requests = campaigns = 0
+            while True:
+                with engine.begin() as connection:
+                    batch = archive_batch(connection, tables, cutoff, app.config['ARCHIVE_BATCH_SIZE'])
+                    if not db.sharded:
+                        add_archived_camps(connection, batch.participations)
+                if db.sharded:
+                    # Counters are in the global database, committed after the region
+                    with db.engine.begin() as connection:
+                        add_archived_camps(connection, batch.participations)
+                if not batch.requests and not batch.campaigns:
+                    break
+                requests += len(batch.requests)
+                campaigns += len(batch.campaigns)
+            print(f"{name}: archived {requests} request(s) and {campaigns} campaign(s) completed before {cutoff:%Y-%m-%d}")
@@ -0,0 +1,276 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+# Online snapshots of the SQLite databases. Copying the database file while
+# the app runs can give a torn copy; SQLite's backup API instead copies the
+# database page by page through a connection, a few hundred pages per step,
+# sleeping between steps so writers get the lock. A write by another
+# connection restarts the copy; after MAX_RESTARTS the copy is done in one
+# step instead. In WAL mode that step doesn't block writers either; in the
+# default rollback journal mode commits wait for it (up to their busy timeout).
+#
+# A snapshot is a directory named after its UTC time holding one file per
+# database (the global one and, with SHARDS, each region), optionally
+# gzipped, and a manifest.json with each file's checksum and table row
+# counts. verify() restores every file to a temporary path and checks it
+# against the manifest with PRAGMA integrity_check.
+
+PAGES_PER_STEP = 256
+STEP_SLEEP_SECONDS = 0.05
+MAX_RESTARTS = 3
+MANIFEST = 'manifest.json'
+STAMP_FORMAT = '%Y%m%dT%H%M%SZ'
+
+
+class _Restarted(Exception):
+    pass
+
+
+def sqlite_path(engine):
+    """File of a SQLite engine's database, or None for other databases and in-memory ones"""
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return None
+    return engine.url.database
+
+
+def copy_database(source_path, dest_path, pages=PAGES_PER_STEP, sleep=STEP_SLEEP_SECONDS):
+    """Copy a live database with the online backup API. Returns the number of restarts"""
+    restarts = 0
+    source = sqlite3.connect(source_path)
+    try:
+        while True:
+            dest = sqlite3.connect(dest_path)
+            remaining = [None]
+
+            def progress(status, left, total):
+                # Remaining pages going up means another connection wrote and the copy started over
+                if remaining[0] is not None and left > remaining[0]:
+                    raise _Restarted()
+                remaining[0] = left
+
+            try:
+                step = pages if restarts < MAX_RESTARTS else -1
+                source.backup(dest, pages=step, progress=progress, sleep=sleep)
+                return restarts
+            except _Restarted:
+                restarts += 1
+            finally:
+                dest.close()
+    finally:
+        source.close()
+
+
+def table_counts(path):
+    """{table: row count} of a database file, leaving out SQLite's and the FTS/R*Tree shadow tables"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND sql NOT LIKE 'CREATE VIRTUAL TABLE%' ORDER BY name")]
+        shadow = tuple(row[0] + '_' for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%'"))
+        return {table: connection.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+                for table in tables if not table.startswith(shadow)}
+    finally:
+        connection.close()
+
+
+def integrity_check(path):
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = [row[0] for row in connection.execute('PRAGMA integrity_check')]
+    finally:
+        connection.close()
+    return rows == ['ok'], rows[:10]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot(databases, backup_dir, compress=True, now=None):
+    """
+    Snapshot {name: database path} into a new directory under backup_dir.
+    Returns the manifest. The directory only gets its final name once every
+    file and the manifest are written, so a crash never leaves a snapshot
+    that looks complete.
+    """
+    now = now or datetime.utcnow()
+    stamp = now.strftime(STAMP_FORMAT)
+    os.makedirs(backup_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=f'.{stamp}-', dir=backup_dir)
+    manifest = {'created_at': now.isoformat(), 'compressed': compress, 'databases': {}}
+    try:
+        for name, path in databases.items():
+            started = time.monotonic()
+            copy_path = os.path.join(work_dir, f'{name}.db')
+            restarts = copy_database(path, copy_path)
+            entry = {'size': os.path.getsize(copy_path), 'tables': table_counts(copy_path), 'restarts': restarts}
+            if compress:
+                with open(copy_path, 'rb') as src, gzip.open(copy_path + '.gz', 'wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                os.remove(copy_path)
+                copy_path += '.gz'
+            entry['file'] = os.path.basename(copy_path)
+            entry['sha256'] = file_sha256(copy_path)
+            entry['seconds'] = round(time.monotonic() - started, 3)
+            manifest['databases'][name] = entry
+        with open(os.path.join(work_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(work_dir, os.path.join(backup_dir, stamp))
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    manifest['name'] = stamp
+    return manifest
+
+
+def list_snapshots(backup_dir):
+    """Complete snapshots, newest first, as their manifests plus their name"""
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(backup_dir), reverse=True):
+        manifest_path = os.path.join(backup_dir, name, MANIFEST)
+        if name.startswith('.') or not os.path.exists(manifest_path):
+            continue
+        with open(manifest_path) as f:
+            snapshots.append(dict(json.load(f), name=name))
+    return snapshots
+
+
+def prune(backup_dir, keep):
+    """Delete all but the newest `keep` snapshots, and work directories left by crashed runs. Returns the names deleted"""
+    deleted = [s['name'] for s in list_snapshots(backup_dir)[keep:]]
+    for name in deleted:
+        shutil.rmtree(os.path.join(backup_dir, name))
+    if os.path.isdir(backup_dir):
+        cutoff = time.time() - 86400
+        for name in os.listdir(backup_dir):
+            path = os.path.join(backup_dir, name)
+            if name.startswith('.') and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+    return deleted
+
+
+def restore_file(snapshot_dir, entry, dest_path):
+    """Write one database of a snapshot to dest_path, checking its checksum first"""
+    source = os.path.join(snapshot_dir, entry['file'])
+    if file_sha256(source) != entry['sha256']:
+        raise ValueError(f"{entry['file']}: checksum mismatch")
+    opener = gzip.open if source.endswith('.gz') else open
+    with opener(source, 'rb') as src, open(dest_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def verify(snapshot_dir):
+    """
+    Restore every database of a snapshot to a temporary file and check its
+    checksum, integrity and row counts against the manifest. Returns
+    {name: {'ok': bool, 'problems': [...]}}.
+    """
+    with open(os.path.join(snapshot_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    report = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, entry in manifest['databases'].items():
+            problems = []
+            restored = os.path.join(work_dir, f'{name}.db')
+            try:
+                restore_file(snapshot_dir, entry, restored)
+                ok, messages = integrity_check(restored)
+                if not ok:
+                    problems.extend(messages)
+                counts = table_counts(restored)
+                for table, expected in entry['tables'].items():
+                    if counts.get(table) != expected:
+                        problems.append(f"{table}: {counts.get(table)} rows, manifest says {expected}")
+            except (OSError, ValueError, sqlite3.DatabaseError) as e:
+                problems.append(str(e))
+            report[name] = {'ok': not problems, 'problems': problems}
+    return report
+
+
+def restore(snapshot_dir, dest_dir):
+    """
+    Verify a snapshot, then write its databases into dest_dir as <name>.db.
+    Refuses to overwrite existing files. Point DATABASE_URL (and SHARDS) at
+    the restored files, with the app stopped, to bring them into service.
+    """
+    report = verify(snapshot_dir)
+    failed = [name for name, result in report.items() if not result['ok']]
+    if failed:
+        raise ValueError(f"Snapshot failed verification: {', '.join(failed)}")
+    with open(os.path.join(snapshot_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    os.makedirs(dest_dir, exist_ok=True)
+    written = []
+    for name, entry in manifest['databases'].items():
+        dest_path = os.path.join(dest_dir, f'{name}.db')
+        if os.path.exists(dest_path):
+            raise FileExistsError(dest_path)
+        restore_file(snapshot_dir, entry, dest_path)
+        written.append(dest_path)
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app, db, sqlite_databases
+
+    parser = argparse.ArgumentParser(description="Online snapshots of the SQLite databases")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help="Take a snapshot and apply retention")
+    run_parser.add_argument('--every', type=float, help="Keep running, one snapshot every this many hours")
+    subparsers.add_parser('list', help="List snapshots")
+    verify_parser = subparsers.add_parser('verify', help="Restore a snapshot to a temporary path and check it")
+    verify_parser.add_argument('snapshot', nargs='?', help="Snapshot name (default: the newest)")
+    restore_parser = subparsers.add_parser('restore', help="Verify a snapshot and write its databases to a directory")
+    restore_parser.add_argument('snapshot')
+    restore_parser.add_argument('dest_dir')
+    args = parser.parse_args()
+
+    with app.app_context():
+        backup_dir = app.config['BACKUP_DIR']
+        if args.command == 'run':
+            while True:
+                manifest = snapshot(sqlite_databases(), backup_dir, compress=app.config['BACKUP_COMPRESS'])
+                deleted = prune(backup_dir, app.config['BACKUP_RETENTION'])
+                sizes = ', '.join(f"{name} {entry['size'] / 1e6:.1f} MB in {entry['seconds']}s"
+                                  for name, entry in manifest['databases'].items())
+                print(f"Snapshot {manifest['name']}: {sizes}; pruned {len(deleted)}")
+                if not args.every:
+                    break
+                # Don't hold pooled connections while sleeping
+                db.session.remove()
+                time.sleep(args.every * 3600)
+        elif args.command == 'list':
+            for s in list_snapshots(backup_dir):
+                tables = sum(sum(entry['tables'].values()) for entry in s['databases'].values())
+                print(f"{s['name']}  {', '.join(s['databases'])}  {tables} rows")
+        else:
+            name = args.snapshot or next((s['name'] for s in list_snapshots(backup_dir)), None)
+            if name is None:
+                print("No snapshots")
+                raise SystemExit(1)
+            snapshot_dir = os.path.join(backup_dir, name)
+            if args.command == 'verify':
+                report = verify(snapshot_dir)
+                for db_name, result in report.items():
+                    print(f"{name}/{db_name}: {'ok' if result['ok'] else 'FAILED'}")
+                    for problem in result['problems']:
+                        print(f"  {problem}")
+                raise SystemExit(0 if all(r['ok'] for r in report.values()) else 1)
+            for path in restore(snapshot_dir, args.dest_dir):
+                print(f"Restored {path}")
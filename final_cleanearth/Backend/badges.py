@@ -0,0 +1,162 @@
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+from sqlalchemy import text
+
+import sharding
+
+# Automatic badges. Each rule awards a badge once a per-user counter reaches a
+# threshold. Domain events only touch the counters they change, and only the
+# rules on those counters are evaluated. Awards are idempotent: a user holds at
+# most one badge per rule (unique user_id + rule).
+
+BadgeRule = namedtuple('BadgeRule', 'key name description icon counter threshold')
+
+BADGE_RULES = [
+    BadgeRule('first_report', 'First Report', 'Reported your first waste dump', '📍', 'requests_created', 1),
+    BadgeRule('watchdog', 'Watchdog', 'Reported 10 waste dumps', '🔎', 'requests_created', 10),
+    BadgeRule('pathfinder', 'Pathfinder', 'First to report a dump in a new pincode', '🧭', 'new_pincodes_reported', 1),
+    BadgeRule('first_camp', 'First Camp', 'Joined your first clean-up camp', '🌱', 'camps_joined', 1),
+    BadgeRule('camp_regular', 'Camp Regular', 'Completed 5 clean-up camps', '♻️', 'camps_completed', 5),
+    BadgeRule('earth_guardian', 'Earth Guardian', 'Completed 25 clean-up camps', '🌍', 'camps_completed', 25),
+    BadgeRule('organiser', 'Organiser', 'Led a clean-up camp to completion', '📣', 'camps_organised', 1),
+]
+
+RULES_BY_COUNTER = defaultdict(list)
+for _rule in BADGE_RULES:
+    RULES_BY_COUNTER[_rule.counter].append(_rule)
+
+# Set-based definitions of every counter, used by the backfill to recompute all
+# users at once. Each query returns (user_id, value).
+COUNTER_QUERIES = {
+    'requests_created': """
+        SELECT user_id, COUNT(*) FROM (
+            SELECT user_id FROM request UNION ALL SELECT user_id FROM archived_request
+        ) r
+        WHERE user_id IS NOT NULL GROUP BY user_id""",
+    'new_pincodes_reported': """
+        SELECT r.user_id, COUNT(*) FROM (
+            SELECT id, user_id, pincode FROM request UNION ALL SELECT id, user_id, pincode FROM archived_request
+        ) r
+        JOIN (SELECT MIN(id) AS id FROM (
+            SELECT id, pincode FROM request UNION ALL SELECT id, pincode FROM archived_request
+        ) GROUP BY pincode) firsts ON firsts.id = r.id
+        WHERE r.user_id IS NOT NULL GROUP BY r.user_id""",
+    'camps_joined': """
+        SELECT volunteer_id, COUNT(*) FROM (
+            SELECT volunteer_id FROM campaign_volunteer UNION ALL SELECT volunteer_id FROM archived_campaign_volunteer
+        ) cv
+        WHERE volunteer_id IS NOT NULL GROUP BY volunteer_id""",
+    'camps_completed': """
+        SELECT volunteer_id, COUNT(*) FROM (
+            SELECT cv.volunteer_id FROM campaign_volunteer cv
+            JOIN campaign c ON c.id = cv.campaign_id WHERE c.status = 'completed'
+            UNION ALL SELECT volunteer_id FROM archived_campaign_volunteer
+        ) cv
+        WHERE volunteer_id IS NOT NULL GROUP BY volunteer_id""",
+    'camps_organised': """
+        SELECT creator_id, COUNT(*) FROM (
+            SELECT creator_id FROM campaign WHERE status = 'completed'
+            UNION ALL SELECT creator_id FROM archived_campaign
+        ) c
+        WHERE creator_id IS NOT NULL GROUP BY creator_id""",
+    # Participations moved out of campaign_volunteer, added to the leaderboard
+    'camps_archived': """
+        SELECT volunteer_id, COUNT(*) FROM archived_campaign_volunteer
+        WHERE volunteer_id IS NOT NULL GROUP BY volunteer_id""",
+}
+
+
+def apply_counter_deltas(session, UserCounter, Badge, deltas):
+    """
+    Add `deltas` ({(user_id, counter): delta}) to the stored counters and award
+    any badges whose rule counter was touched. Does not commit.
+    Returns the list of newly awarded Badge rows.
+    """
+    touched = {}
+    for (user_id, counter), delta in deltas.items():
+        if not user_id or not delta:
+            continue
+        user_id = int(user_id)
+        row = session.query(UserCounter).get((user_id, counter))
+        if row is None:
+            row = UserCounter(user_id=user_id, counter=counter, value=0)
+            session.add(row)
+        row.value = max(0, (row.value or 0) + delta)
+        touched[(user_id, counter)] = row.value
+
+    awarded = []
+    for (user_id, counter), value in touched.items():
+        due = [rule for rule in RULES_BY_COUNTER.get(counter, []) if value >= rule.threshold]
+        if not due:
+            continue
+        held = {b.rule for b in session.query(Badge.rule).filter(
+            Badge.user_id == user_id,
+            Badge.rule.in_([rule.key for rule in due])
+        )}
+        for rule in due:
+            if rule.key in held:
+                continue
+            badge = Badge(name=rule.name, description=rule.description, icon=rule.icon, user_id=user_id, rule=rule.key)
+            session.add(badge)
+            awarded.append(badge)
+    return awarded
+
+
+def backfill(connection, region_engines=None):
+    """
+    Recompute every counter and award every due badge in one set-based pass.
+    `connection` is a SQLAlchemy connection inside a transaction. With
+    sharding, `region_engines` hold the request and campaign tables: each
+    region's counts are summed and written through `connection` to the
+    global database. Returns {rule key: number of badges awarded}.
+    """
+    connection.execute(text("DELETE FROM user_counter"))
+    if region_engines is None:
+        for counter, query in COUNTER_QUERIES.items():
+            connection.execute(text(
+                f"INSERT INTO user_counter (user_id, value, counter) SELECT q.*, :counter FROM ({query}) q"
+            ), {'counter': counter})
+    else:
+        # A pincode's requests and a campaign's volunteers are in one region,
+        # so each region's counts are complete for what it holds
+        totals = defaultdict(int)
+        for region in sharding.each_region(connection, region_engines):
+            for counter, query in COUNTER_QUERIES.items():
+                for user_id, value in region.execute(text(query)):
+                    totals[(user_id, counter)] += value
+        if totals:
+            connection.execute(text(
+                "INSERT INTO user_counter (user_id, value, counter) VALUES (:user_id, :value, :counter)"
+            ), [{'user_id': user_id, 'value': value, 'counter': counter}
+                for (user_id, counter), value in totals.items()])
+
+    awarded = {}
+    now = datetime.utcnow()
+    for rule in BADGE_RULES:
+        result = connection.execute(text("""
+            INSERT INTO badge (name, description, icon, user_id, rule, created_at)
+            SELECT :name, :description, :icon, uc.user_id, :rule, :now FROM user_counter uc
+            WHERE uc.counter = :counter AND uc.value >= :threshold
+              AND NOT EXISTS (SELECT 1 FROM badge b WHERE b.user_id = uc.user_id AND b.rule = :rule)"""),
+            {'name': rule.name, 'description': rule.description, 'icon': rule.icon, 'rule': rule.key,
+             'now': now, 'counter': rule.counter, 'threshold': rule.threshold}
+        )
+        awarded[rule.key] = result.rowcount
+    return awarded
+
+
+if __name__ == "__main__":
+    import sys
+    from app import app, db, region_engines
+
+    if sys.argv[1:] != ['backfill']:
+        print("Usage: python badges.py backfill")
+        sys.exit(1)
+
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            awarded = backfill(connection, list(region_engines().values()) if db.sharded else None)
+    for key, count in awarded.items():
+        print(f"{key}: {count} badge(s) awarded")
@@ -0,0 +1,98 @@
+"""
+Benchmark JSON encoding and compression of the large list endpoints.
+
+Seeds a throwaway SQLite database, then calls /api/managecamp and
+/api/admin/users with each JSON encoder and Accept-Encoding, reporting
+response bytes and CPU time per response.
+
+    python bench_json.py --users 5000 --campaigns 5000 --repeat 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument('--users', type=int, default=5000)
+parser.add_argument('--campaigns', type=int, default=5000)
+parser.add_argument('--repeat', type=int, default=5)
+args = parser.parse_args()
+
+db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import app, db, User, Request, Campaign  # noqa: E402
+import serialization  # noqa: E402
+
+
+def seed():
+    db.create_all()
+    users = [User(name=f'User {i}', email=f'user{i}@example.com', password='x', role='volunteer' if i % 3 else 'user',
+                  address=f'{i} Example Street, Sector {i % 50}', pincode=str(110001 + i % 200),
+                  latitude=28.6 + (i % 100) / 1000, longitude=77.2 + (i % 100) / 1000)
+             for i in range(args.users)]
+    users.append(User(name='Admin', email='admin@example.com', password='x', role='admin'))
+    db.session.bulk_save_objects(users)
+    requests = [Request(email='user1@example.com', pincode=str(110001 + i % 200), latitude=28.6, longitude=77.2,
+                        description=f'Garbage dump number {i} next to the market, mostly plastic and cardboard',
+                        address=f'Market Road {i}', user_id=1)
+                for i in range(args.campaigns)]
+    db.session.bulk_save_objects(requests)
+    campaigns = [Campaign(name=f'Clean-up drive {i}', request_id=i + 1, date=date(2024, 1, 1) + timedelta(days=i % 365),
+                          num_volunteers=20, timing='09:00', description='Bring gloves, bags and water.',
+                          status='planned' if i % 2 else 'completed', creator_id=1)
+                 for i in range(args.campaigns)]
+    db.session.bulk_save_objects(campaigns)
+    db.session.commit()
+    return User.query.filter_by(email='admin@example.com').first().id
+
+
+def time_per_call(func):
+    start = time.process_time()
+    for _ in range(args.repeat):
+        result = func()
+    return result, (time.process_time() - start) / args.repeat * 1000
+
+
+if __name__ == '__main__':
+    app.config['RATE_LIMITS'] = {}
+    with app.app_context():
+        admin_id = seed()
+        token = create_access_token(identity=str(admin_id))
+        # The same payloads the endpoints build, with real date/datetime values
+        payloads = {
+            '/api/managecamp': [c.to_dict() for c in Campaign.query.all()],
+            '/api/admin/users': [u.to_dict() for u in User.query.all()],
+        }
+
+    client = app.test_client()
+    encoders = ['std'] + (['orjson'] if serialization.orjson is not None else [])
+    encodings = ['identity', 'gzip'] + (['br'] if serialization.brotli is not None else [])
+
+    print("Serialization only (CPU ms per response)")
+    print(f"{'endpoint':<20} {'encoder':<8} {'encoding':<9} {'bytes':>10} {'encode':>8} {'compress':>9}")
+    for path, payload in payloads.items():
+        for encoder in encoders:
+            cls = serialization.get_json_encoder(encoder)
+            body, encode_ms = time_per_call(lambda: json.dumps(payload, cls=cls, sort_keys=True).encode('utf-8'))
+            for encoding in encodings:
+                if encoding == 'identity':
+                    size, compress_ms = len(body), 0.0
+                else:
+                    compressed, compress_ms = time_per_call(lambda: serialization.compress(body, encoding))
+                    size = len(compressed)
+                print(f"{path:<20} {encoder:<8} {encoding:<9} {size:>10} {encode_ms:>8.1f} {compress_ms:>9.1f}")
+
+    print()
+    print("Full request through the test client (CPU ms per response)")
+    for path in payloads:
+        for encoder in encoders:
+            app.json_encoder = serialization.get_json_encoder(encoder)
+            for encoding in encodings:
+                headers = {'Authorization': f'Bearer {token}', 'Accept-Encoding': encoding}
+                response, cpu_ms = time_per_call(lambda: client.get(path, headers=headers))
+                print(f"{path:<20} {encoder:<8} {encoding:<9} {len(response.get_data()):>10} {cpu_ms:>9.1f}")
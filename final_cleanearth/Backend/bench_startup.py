@@ -0,0 +1,117 @@
+"""
+Benchmark cold start and per-worker memory of the API.
+
+Each measurement runs in a fresh interpreter: the time to import the app and
+build it with create_app(), the first request, resident memory and module
+count; then N forked workers serving a few requests, with the app loaded in
+the parent before forking (--preload, as gunicorn.conf.py does) or in each
+worker. Memory is read from /proc/self/smaps_rollup (Linux only). USS is
+memory private to one worker, PSS counts shared pages in proportion.
+
+    python bench_startup.py --workers 4 --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PATH = '/api/leaderboard'
+
+
+def memory():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return {'rss_mb': values['Rss'], 'pss_mb': values['Pss'],
+            'uss_mb': values['Private_Clean'] + values['Private_Dirty']}
+
+
+def load_app():
+    from app import create_app
+    return create_app({'RATE_LIMITS': {}})
+
+
+def cold():
+    start = time.perf_counter()
+    app = load_app()
+    loaded = time.perf_counter()
+    app.test_client().get(PATH)
+    served = time.perf_counter()
+    return dict(memory(), startup_ms=(loaded - start) * 1000, first_request_ms=(served - loaded) * 1000,
+                modules=len(sys.modules))
+
+
+def forked(workers, preload):
+    if preload:
+        import wsgi
+        app = wsgi.app
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            if preload:
+                from app import reset_after_fork
+                reset_after_fork(app)
+            else:
+                app = load_app()
+            client = app.test_client()
+            for _ in range(20):
+                client.get(PATH)
+            os.write(write_fd, json.dumps(memory()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    results = []
+    for pid, read_fd in children:
+        os.waitpid(pid, 0)
+        results.append(json.loads(os.read(read_fd, 1000)))
+        os.close(read_fd)
+    return {key: statistics.mean(r[key] for r in results) for key in ('uss_mb', 'pss_mb')}
+
+
+def run(mode, args):
+    output = subprocess.check_output([sys.executable, __file__, '--mode', mode, '--workers', str(args.workers)])
+    return json.loads(output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--mode', choices=['cold', 'preload', 'no-preload'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        if args.mode == 'cold':
+            result = cold()
+        else:
+            result = forked(args.workers, args.mode == 'preload')
+        print(json.dumps(result))
+        sys.exit(0)
+
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+
+    runs = [run('cold', args) for _ in range(args.runs)]
+    print(f"Cold start (median of {args.runs})")
+    for key in ('startup_ms', 'first_request_ms', 'rss_mb', 'modules'):
+        print(f"  {key:<18} {statistics.median(r[key] for r in runs):>8.1f}")
+
+    print(f"Per worker memory, {args.workers} forked workers")
+    for mode in ('no-preload', 'preload'):
+        result = run(mode, args)
+        print(f"  {mode:<11} uss {result['uss_mb']:>6.1f} MB  pss {result['pss_mb']:>6.1f} MB")
@@ -0,0 +1,9 @@
+from blueprints import admin, auth, campaigns, changes, leaderboard, requests
+
+# One blueprint per area of the API; routes keep their full /api/... paths
+BLUEPRINTS = [auth.bp, requests.bp, campaigns.bp, admin.bp, leaderboard.bp, changes.bp]
+
+
+def register_blueprints(app):
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
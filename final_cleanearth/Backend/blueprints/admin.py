@@ -0,0 +1,728 @@
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from datetime import datetime
+import os
+import time
+import uuid
+
+from extensions import db
+from models import User, Request, Campaign, CampaignVolunteer, Badge, VolunteerProposal
+from services import (sparse_fields, project, record_change, refresh_volunteer_location, get_volunteer_locator,
+                      enqueue_job, enqueue_jobs, refresh_priority, queue_campaigns_completed,
+                      queue_campaigns_reopened)
+import backup
+import bulk
+import fieldsets
+import priority
+import search
+import sharding
+import tiles
+
+bp = Blueprint('admin', __name__)
+
+USER_FILTERS = ('role', 'pincode', 'email_domain', 'created_after', 'created_before')
+CAMPAIGN_FILTERS = ('status', 'date_from', 'date_to', 'pincode', 'creator_id')
+
+# Admin user management
+@bp.route('/api/admin/users', methods=['GET'])
+@jwt_required()
+def get_all_users():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    fields, error = sparse_fields(User)
+    if error:
+        return error
+    
+    users = project(User.query, User, fields).all()
+    return jsonify([fieldsets.serialize(u, fields) for u in users])
+
+# Block/unblock user
+@bp.route('/api/admin/toggle_block/<int:user_id>', methods=['POST'])
+@jwt_required()
+def toggle_user_block(user_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    user = User.query.get_or_404(user_id)
+    user.is_blocked = not user.is_blocked
+    db.session.commit()
+    refresh_volunteer_location(user)
+    
+    return jsonify({
+        "message": f"User {'blocked' if user.is_blocked else 'unblocked'} successfully",
+        "user": user.to_dict()
+    })
+
+# Admin view of requests linked as duplicates, grouped by canonical request
+@bp.route('/api/admin/duplicates', methods=['GET'])
+@jwt_required()
+def get_duplicate_requests():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    query = Request.query.filter(Request.duplicate_of.isnot(None))
+    if request.args.get('pincode'):
+        query = query.filter(Request.pincode == request.args['pincode'])
+    # Sharded storage returns each region's rows in turn, so order after gathering
+    duplicates = sorted(query.all(), key=lambda d: (d.duplicate_of, d.id))
+    
+    canonical_ids = {d.duplicate_of for d in duplicates}
+    canonicals = {r.id: r for r in Request.query.filter(Request.id.in_(canonical_ids)).all()} if canonical_ids else {}
+    
+    groups = {}
+    for duplicate in duplicates:
+        canonical = canonicals.get(duplicate.duplicate_of)
+        if not canonical:
+            continue
+        group = groups.setdefault(canonical.id, {"canonical": canonical.to_dict(), "duplicates": []})
+        group["duplicates"].append(duplicate.to_dict())
+    
+    return jsonify(list(groups.values()))
+
+# Merge duplicate requests into a canonical request
+@bp.route('/api/admin/duplicates/merge', methods=['POST'])
+@jwt_required()
+def merge_duplicate_requests():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    data = request.get_json()
+    if not data or not data.get('canonical_id') or not data.get('duplicate_ids'):
+        return jsonify({"error": "Missing required fields"}), 400
+    
+    canonical = Request.query.get_or_404(data['canonical_id'])
+    # A canonical request can't itself be a duplicate
+    if canonical.duplicate_of:
+        canonical = Request.query.get_or_404(canonical.duplicate_of)
+    duplicate_ids = [int(i) for i in data['duplicate_ids'] if int(i) != canonical.id]
+    if not duplicate_ids:
+        return jsonify({"error": "No duplicates to merge"}), 400
+    
+    # With sharded storage a campaign must stay in its request's region
+    if db.sharded:
+        regions = {sharding.region_of(r) for r in Request.query.filter(Request.id.in_(duplicate_ids))}
+        if regions - {sharding.region_of(canonical)}:
+            return jsonify({"error": "Requests in different regions can't be merged"}), 400
+    
+    try:
+        # Canonical requests the merged ones pointed at lose a duplicate
+        previous_canonical_ids = [row[0] for row in db.session.query(Request.duplicate_of).filter(
+            Request.id.in_(duplicate_ids), Request.duplicate_of.isnot(None))]
+        # Requests that pointed at a merged request now point at the canonical one
+        relinked_ids = [row[0] for row in db.session.query(Request.id).filter(Request.duplicate_of.in_(duplicate_ids))]
+        Request.query.filter(Request.duplicate_of.in_(duplicate_ids)).update(
+            {Request.duplicate_of: canonical.id}, synchronize_session=False)
+        merged = Request.query.filter(Request.id.in_(duplicate_ids)).update(
+            {Request.duplicate_of: canonical.id}, synchronize_session=False)
+        # Campaigns follow the canonical request
+        moved_campaign_ids = [row[0] for row in db.session.query(Campaign.id).filter(Campaign.request_id.in_(duplicate_ids))]
+        Campaign.query.filter(Campaign.request_id.in_(duplicate_ids)).update(
+            {Campaign.request_id: canonical.id}, synchronize_session=False)
+        # Change feed events carry the rows as they are after the merge
+        for waste_request in Request.query.filter(Request.id.in_(duplicate_ids + relinked_ids)).populate_existing():
+            record_change(waste_request, 'updated')
+        for campaign in Campaign.query.filter(Campaign.id.in_(moved_campaign_ids)).populate_existing():
+            record_change(campaign, 'updated')
+        refresh_priority([canonical.id] + duplicate_ids + previous_canonical_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error merging duplicates: {str(e)}")
+        return jsonify({"error": f"Failed to merge duplicates: {str(e)}"}), 500
+    
+    return jsonify({
+        "message": f"Merged {merged} request(s) into request {canonical.id}",
+        "canonical_id": canonical.id,
+        "merged": merged
+    })
+
+# Unlink a request that was wrongly flagged as a duplicate
+@bp.route('/api/admin/duplicates/<int:request_id>/unlink', methods=['POST'])
+@jwt_required()
+def unlink_duplicate_request(request_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    waste_request = Request.query.get_or_404(request_id)
+    previous_canonical_id = waste_request.duplicate_of
+    waste_request.duplicate_of = None
+    record_change(waste_request, 'updated')
+    refresh_priority([previous_canonical_id])
+    db.session.commit()
+    
+    return jsonify({
+        "message": "Request unlinked successfully",
+        "request": waste_request.to_dict()
+    })
+
+# Pending requests, most urgent first: the top of the priority index for a
+# pincode, a region or everything, without loading the backlog
+@bp.route('/api/admin/triage', methods=['GET'])
+@jwt_required()
+def get_triage_queue():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    fields, error = sparse_fields(Request)
+    if error:
+        return error
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+    if not 1 <= limit <= 100:
+        return jsonify({"error": "limit must be between 1 and 100"}), 400
+    
+    # Duplicates are counted into their canonical request's score instead
+    query = project(Request.query, Request, fields).add_columns(
+        Request.priority, Request.duplicate_count, Request.cluster_size
+    ).filter(Request.status == 'pending', Request.duplicate_of.is_(None))
+    if request.args.get('pincode'):
+        query = query.filter(Request.pincode == request.args['pincode'])
+    if request.args.get('region'):
+        if not db.sharded or request.args['region'] not in db.router.regions:
+            return jsonify({"error": "Unknown region"}), 400
+        query = sharding.on_region(query, request.args['region'])
+    rows = query.order_by(Request.priority.desc(), Request.id).limit(limit).all()
+    # Sharded storage returns each region's top rows in turn
+    rows = sorted(rows, key=lambda row: (-(row.priority or 0.0), row[0].id))[:limit]
+    
+    now = datetime.utcnow()
+    return jsonify({"requests": [
+        dict(fieldsets.serialize(waste_request, fields),
+             priority=round(priority.effective(score, now), 1) if score is not None else None,
+             duplicate_count=duplicate_count or 0,
+             cluster_size=cluster_size or 0)
+        for waste_request, score, duplicate_count, cluster_size in rows
+    ]})
+
+# Full-text search over requests and campaigns (admin only)
+@bp.route('/api/search', methods=['GET'])
+@jwt_required()
+def search_records():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({"error": "Search is only available on SQLite databases"}), 501
+    
+    match = search.build_match_query(request.args.get('q'))
+    if not match:
+        return jsonify({"error": "Missing search query"}), 400
+    
+    kind = request.args.get('type', 'all')
+    if kind not in ('all', 'request', 'campaign'):
+        return jsonify({"error": "type must be one of all, request, campaign"}), 400
+    
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+    except ValueError:
+        return jsonify({"error": "page and per_page must be numbers"}), 400
+    
+    pincode = request.args.get('pincode')
+    status = request.args.get('status')
+    
+    # Fetch one extra row to know if there is a next page without counting every match
+    statement = db.text(search.search_statement(kind, pincode, status))
+    params = {'q': match, 'pincode': pincode, 'status': status}
+    if not db.sharded:
+        rows = db.session.execute(statement, dict(params, limit=per_page + 1, offset=(page - 1) * per_page)).fetchall()
+    else:
+        # Each region ranks its own rows and the first pages are merged
+        shards = [db.router.shard_for_pincode(pincode)] if pincode else db.router.regions
+        partials = [
+            db.session.execute(statement, dict(params, limit=page * per_page + 1, offset=0),
+                               bind_arguments={'shard_id': shard}).fetchall()
+            for shard in shards
+        ]
+        rows = sharding.gather_sorted(partials, lambda r: (r.rank, r.id), (page - 1) * per_page, per_page + 1)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    # Load the matching rows in two queries and keep the ranked order
+    request_ids = [r.id for r in rows if r.type == 'request']
+    campaign_ids = [r.id for r in rows if r.type == 'campaign']
+    records = {}
+    if request_ids:
+        records.update({('request', r.id): r for r in Request.query.filter(Request.id.in_(request_ids)).all()})
+    if campaign_ids:
+        records.update({('campaign', c.id): c for c in Campaign.query.filter(Campaign.id.in_(campaign_ids)).all()})
+    
+    results = []
+    for row in rows:
+        record = records.get((row.type, row.id))
+        if not record:
+            continue
+        results.append({
+            "type": row.type,
+            "score": round(-row.rank, 4),
+            "snippet": row.snippet,
+            "item": record.to_dict()
+        })
+    
+    return jsonify({
+        "results": results,
+        "page": page,
+        "per_page": per_page,
+        "has_more": has_more
+    })
+
+# Admin award badge to user
+@bp.route('/api/admin/award_badge', methods=['POST'])
+@jwt_required()
+def award_badge():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    data = request.get_json()
+    
+    if not data or not data.get('user_id') or not data.get('name'):
+        return jsonify({"error": "Missing required fields"}), 400
+    
+    user = User.query.get_or_404(data['user_id'])
+    
+    badge = Badge(
+        name=data['name'],
+        description=data.get('description', ''),
+        icon=data.get('icon', '🏆'),
+        user_id=user.id
+    )
+    
+    db.session.add(badge)
+    db.session.commit()
+    
+    return jsonify({
+        "message": "Badge awarded successfully",
+        "badge": badge.to_dict()
+    })
+
+# Bulk admin operations (see bulk.py): id lists or filters, one set-based
+# statement per table in one transaction, and a result per item
+def bulk_targets(query, id_column, ids):
+    """Rows for an id list, or the first BULK_MAX_ITEMS filter matches and whether there are more"""
+    if ids is not None:
+        return query.filter(id_column.in_(ids)).all(), False
+    max_items = current_app.config['BULK_MAX_ITEMS']
+    # Sorted here too, as sharded storage returns each region's rows in turn
+    rows = sorted(query.order_by(id_column).limit(max_items + 1).all(), key=lambda row: row.id)
+    return rows[:max_items], len(rows) > max_items
+
+def filter_users(query, filters):
+    if 'role' in filters:
+        query = query.filter(User.role == filters['role'])
+    if 'pincode' in filters:
+        query = query.filter(User.pincode == filters['pincode'])
+    if 'email_domain' in filters:
+        query = query.filter(User.email.like('%@' + filters['email_domain']))
+    if 'created_after' in filters:
+        query = query.filter(User.created_at >= bulk.parse_date(filters['created_after'], 'created_after'))
+    if 'created_before' in filters:
+        query = query.filter(User.created_at < bulk.parse_date(filters['created_before'], 'created_before'))
+    # Filters never select admins
+    return query.filter(User.role != 'admin')
+
+def filter_campaigns(query, filters):
+    if 'status' in filters:
+        query = query.filter(Campaign.status == filters['status'])
+    if 'date_from' in filters:
+        query = query.filter(Campaign.date >= bulk.parse_date(filters['date_from'], 'date_from').date())
+    if 'date_to' in filters:
+        query = query.filter(Campaign.date <= bulk.parse_date(filters['date_to'], 'date_to').date())
+    if 'creator_id' in filters:
+        query = query.filter(Campaign.creator_id == int(filters['creator_id']))
+    if 'pincode' in filters:
+        query = query.join(Request, Campaign.request_id == Request.id).filter(Request.pincode == filters['pincode'])
+    return query
+
+@bp.route('/api/admin/users/bulk_block', methods=['POST'])
+@jwt_required()
+def bulk_block_users():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    data = request.get_json(silent=True)
+    try:
+        ids, filters = bulk.parse_targets(data, USER_FILTERS, current_app.config['BULK_MAX_ITEMS'])
+        blocked = data.get('blocked', True)
+        if not isinstance(blocked, bool):
+            raise ValueError("blocked must be true or false")
+        query = db.session.query(User.id, User.role, User.is_blocked, User.latitude, User.longitude)
+        if filters is not None:
+            # Only users that still need the change, so repeated calls work through a large match
+            query = filter_users(query, filters).filter(db.func.coalesce(User.is_blocked, False) != blocked)
+        rows, has_more = bulk_targets(query, User.id, ids)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    outcomes = {}
+    for row in rows:
+        if row.id == current_user.id:
+            outcomes[row.id] = bulk.SKIPPED
+        else:
+            outcomes[row.id] = bulk.UPDATED if bool(row.is_blocked) != blocked else bulk.UNCHANGED
+    changed = [row for row in rows if outcomes[row.id] == bulk.UPDATED]
+    dry_run = bool(data.get('dry_run'))
+    
+    if changed and not dry_run:
+        User.query.filter(User.id.in_([row.id for row in changed])).update(
+            {User.is_blocked: blocked}, synchronize_session=False)
+        db.session.commit()
+        # Keep the volunteer coordinate cache in step
+        volunteer_locator = get_volunteer_locator()
+        for row in changed:
+            if row.role == 'volunteer' and not blocked:
+                volunteer_locator.upsert(row.id, row.latitude, row.longitude)
+            else:
+                volunteer_locator.remove(row.id)
+    
+    return jsonify(bulk.report(ids, outcomes, dry_run, has_more))
+
+@bp.route('/api/admin/badges/bulk_award', methods=['POST'])
+@jwt_required()
+def bulk_award_badge():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    data = request.get_json(silent=True)
+    try:
+        ids, filters = bulk.parse_targets(data, USER_FILTERS, current_app.config['BULK_MAX_ITEMS'])
+        if not data.get('name'):
+            raise ValueError("Missing required field: name")
+        # Users already holding a manual badge of this name are left alone
+        holders = db.session.query(Badge.user_id).filter(Badge.name == data['name'], Badge.rule.is_(None))
+        query = db.session.query(User.id)
+        if filters is not None:
+            query = filter_users(query, filters).filter(~User.id.in_(holders))
+        rows, has_more = bulk_targets(query, User.id, ids)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    found = [row.id for row in rows]
+    held = {row[0] for row in holders.filter(Badge.user_id.in_(found))} if found else set()
+    outcomes = {user_id: bulk.UNCHANGED if user_id in held else bulk.AWARDED for user_id in found}
+    award_ids = [user_id for user_id in found if user_id not in held]
+    dry_run = bool(data.get('dry_run'))
+    
+    if award_ids and not dry_run:
+        badge = Badge.__table__
+        db.session.execute(badge.insert().from_select(
+            ['name', 'description', 'icon', 'user_id', 'created_at'],
+            db.select(
+                db.literal(data['name']),
+                db.literal(data.get('description', '')),
+                db.literal(data.get('icon', '🏆')),
+                User.id,
+                db.literal(datetime.utcnow())
+            ).where(User.id.in_(award_ids))
+        ))
+        db.session.commit()
+    
+    return jsonify(bulk.report(ids, outcomes, dry_run, has_more))
+
+@bp.route('/api/admin/campaigns/bulk_status', methods=['POST'])
+@jwt_required()
+def bulk_campaign_status():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    data = request.get_json(silent=True)
+    try:
+        ids, filters = bulk.parse_targets(data, CAMPAIGN_FILTERS, current_app.config['BULK_MAX_ITEMS'])
+        status = data.get('status')
+        if status not in ('planned', 'in-progress', 'completed'):
+            raise ValueError("status must be one of planned, in-progress, completed")
+        query = db.session.query(Campaign.id, Campaign.status, Campaign.request_id, Campaign.completed_at)
+        if filters is not None:
+            query = filter_campaigns(query, filters).filter(db.func.coalesce(Campaign.status, '') != status)
+        rows, has_more = bulk_targets(query, Campaign.id, ids)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    outcomes = {row.id: bulk.UPDATED if row.status != status else bulk.UNCHANGED for row in rows}
+    changed_ids = [row.id for row in rows if outcomes[row.id] == bulk.UPDATED]
+    dry_run = bool(data.get('dry_run'))
+    
+    if changed_ids and not dry_run:
+        now = datetime.utcnow()
+        changed = [row for row in rows if outcomes[row.id] == bulk.UPDATED]
+        values = {Campaign.status: status}
+        if status == 'completed':
+            values[Campaign.completed_at] = db.func.coalesce(Campaign.completed_at, now)
+        else:
+            # Reopened campaigns leave the rollups and badge counters
+            queue_campaigns_reopened([(row.id, row.completed_at) for row in changed if row.status == 'completed'])
+            values[Campaign.completed_at] = None
+        Campaign.query.filter(Campaign.id.in_(changed_ids)).update(values, synchronize_session=False)
+        
+        if status == 'completed':
+            # As for a single completion: the requests are done too, and the
+            # rollup and badge updates run on the job queue
+            request_ids = {row.request_id for row in rows if row.id in changed_ids and row.request_id}
+            open_requests = Request.query.filter(
+                Request.id.in_(request_ids), db.func.coalesce(Request.status, '') != 'completed'
+            ).all() if request_ids else []
+            tile_changes = []
+            for waste_request in open_requests:
+                if waste_request.status:
+                    tile_changes += tiles.count_changes(waste_request.latitude, waste_request.longitude, waste_request.status, -1)
+                tile_changes += tiles.count_changes(waste_request.latitude, waste_request.longitude, 'completed', 1)
+            tiles.apply_changes(db.session, tile_changes)
+            Request.query.filter(Request.id.in_([r.id for r in open_requests])).update(
+                {Request.status: 'completed'}, synchronize_session=False)
+            for waste_request in Request.query.filter(Request.id.in_([r.id for r in open_requests])).populate_existing():
+                record_change(waste_request, 'status_changed')
+            queue_campaigns_completed([(row.id, row.completed_at or now) for row in changed])
+        
+        campaigns = project(Campaign.query.filter(Campaign.id.in_(changed_ids)), Campaign, None).populate_existing()
+        for campaign in campaigns:
+            record_change(campaign, 'completed' if status == 'completed' else 'updated')
+        db.session.commit()
+    
+    return jsonify(bulk.report(ids, outcomes, dry_run, has_more))
+
+@bp.route('/api/admin/campaigns/bulk_delete', methods=['POST'])
+@jwt_required()
+def bulk_delete_campaigns():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    data = request.get_json(silent=True)
+    try:
+        ids, filters = bulk.parse_targets(data, CAMPAIGN_FILTERS, current_app.config['BULK_MAX_ITEMS'])
+        query = Campaign.query.options(db.joinedload(Campaign.request).load_only(Request.pincode))
+        if filters is not None:
+            query = filter_campaigns(query, filters)
+        campaigns, has_more = bulk_targets(query, Campaign.id, ids)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    outcomes = {campaign.id: bulk.DELETED for campaign in campaigns}
+    dry_run = bool(data.get('dry_run'))
+    
+    if campaigns and not dry_run:
+        campaign_ids = [campaign.id for campaign in campaigns]
+        for campaign in campaigns:
+            record_change(campaign, 'deleted')
+        queue_campaigns_reopened([(campaign.id, campaign.completed_at) for campaign in campaigns
+                                  if campaign.status == 'completed'])
+        # Participations lose their campaign, as when one campaign is deleted
+        CampaignVolunteer.query.filter(CampaignVolunteer.campaign_id.in_(campaign_ids)).update(
+            {CampaignVolunteer.campaign_id: None}, synchronize_session=False)
+        Campaign.query.filter(Campaign.id.in_(campaign_ids)).delete(synchronize_session=False)
+        refresh_priority({campaign.request_id for campaign in campaigns})
+        db.session.commit()
+    
+    return jsonify(bulk.report(ids, outcomes, dry_run, has_more))
+
+# Online backups (see backup.py). Snapshots are taken by the worker, so a
+# large database doesn't tie up a web worker; listing and verifying only
+# read the snapshot files.
+@bp.route('/api/admin/backups', methods=['GET'])
+@jwt_required()
+def list_backups():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    return jsonify({"backups": backup.list_snapshots(current_app.config['BACKUP_DIR'])})
+
+@bp.route('/api/admin/backups', methods=['POST'])
+@jwt_required()
+def create_backup():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    # One snapshot per minute however often this is called
+    job = enqueue_job('backup_snapshot', key=f"backup_snapshot:{datetime.utcnow().strftime('%Y%m%d%H%M')}")
+    db.session.commit()
+    return jsonify({"message": "Backup queued", "job_id": job.id, "status": job.status}), 202
+
+@bp.route('/api/admin/backups/<name>/verify', methods=['POST'])
+@jwt_required()
+def verify_backup(name):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    backup_dir = current_app.config['BACKUP_DIR']
+    # Only names of existing snapshots, never a path from the client
+    if name not in {s['name'] for s in backup.list_snapshots(backup_dir)}:
+        return jsonify({"error": "Backup not found"}), 404
+    
+    report = backup.verify(os.path.join(backup_dir, name))
+    return jsonify({"name": name, "ok": all(r['ok'] for r in report.values()), "databases": report})
+
+# Day scheduler: spread the free volunteers of a day over all its planned
+# camps at once, filling as many open spots as possible with the least total
+# travel (see scheduling.py). Writes proposals for volunteers to accept, or
+# with "mode": "assign" the participations themselves. Running it again for
+# the same camps replaces the proposals still unanswered.
+@bp.route('/api/admin/schedule', methods=['POST'])
+@jwt_required()
+def schedule_volunteers():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is admin
+    if current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        day = bulk.parse_date(data.get('date'), 'date').date()
+        campaign_ids = data.get('campaign_ids')
+        if campaign_ids is not None and (not isinstance(campaign_ids, list)
+                                         or not all(isinstance(i, int) for i in campaign_ids)):
+            raise ValueError("campaign_ids must be a list of ids")
+        max_km = float(data.get('max_km', current_app.config['SCHEDULE_MAX_KM']))
+        if not 0 < max_km <= 200:
+            raise ValueError("max_km must be between 0 and 200")
+        mode = data.get('mode', 'propose')
+        if mode not in ('propose', 'assign'):
+            raise ValueError("mode must be propose or assign")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    dry_run = bool(data.get('dry_run'))
+    
+    # Planned camps of the day, their location and open spots
+    query = db.session.query(Campaign.id, Campaign.num_volunteers, Request.latitude, Request.longitude).join(
+        Request, Campaign.request_id == Request.id
+    ).filter(Campaign.date == day, Campaign.status == 'planned')
+    if campaign_ids is not None:
+        query = query.filter(Campaign.id.in_(campaign_ids))
+    camps = query.all()
+    camp_ids = [camp.id for camp in camps]
+    taken = {}
+    if camp_ids:
+        for campaign_id, count in db.session.query(
+            CampaignVolunteer.campaign_id, db.func.count(CampaignVolunteer.id)
+        ).filter(CampaignVolunteer.campaign_id.in_(camp_ids)).group_by(CampaignVolunteer.campaign_id):
+            taken[campaign_id] = taken.get(campaign_id, 0) + count
+    spots = {camp.id: max((camp.num_volunteers or 0) - taken.get(camp.id, 0), 0) for camp in camps}
+    
+    # Volunteers already in a camp that day, or proposed one outside this run, are not free
+    busy = {row[0] for row in db.session.query(CampaignVolunteer.volunteer_id).join(
+        Campaign, CampaignVolunteer.campaign_id == Campaign.id
+    ).filter(Campaign.date == day)}
+    busy.update(row[0] for row in db.session.query(VolunteerProposal.volunteer_id).filter(
+        VolunteerProposal.date == day, VolunteerProposal.status == 'proposed',
+        ~VolunteerProposal.campaign_id.in_(camp_ids)))
+    declined = [tuple(row) for row in db.session.query(VolunteerProposal.volunteer_id, VolunteerProposal.campaign_id).filter(
+        VolunteerProposal.campaign_id.in_(camp_ids), VolunteerProposal.status == 'declined')] if camp_ids else []
+    volunteers = [row for row in db.session.query(User.id, User.latitude, User.longitude).filter(
+        User.role == 'volunteer', User.is_blocked.isnot(True)) if row.id not in busy]
+    
+    # numpy-backed, imported on first use like matching
+    import scheduling
+    started = time.monotonic()
+    plan = scheduling.plan(volunteers, [(camp.id, camp.latitude, camp.longitude, spots[camp.id]) for camp in camps],
+                           max_km, excluded=declined, per_volunteer=current_app.config['SCHEDULE_CANDIDATES'])
+    seconds = time.monotonic() - started
+    
+    if camp_ids and not dry_run:
+        VolunteerProposal.query.filter(
+            VolunteerProposal.campaign_id.in_(camp_ids), VolunteerProposal.status == 'proposed'
+        ).delete(synchronize_session=False)
+        if plan and mode == 'propose':
+            run, now = uuid.uuid4().hex, datetime.utcnow()
+            db.session.execute(VolunteerProposal.__table__.insert(), [
+                {'volunteer_id': volunteer_id, 'campaign_id': campaign_id, 'date': day, 'distance_km': km,
+                 'status': 'proposed', 'run': run, 'created_at': now}
+                for volunteer_id, campaign_id, km in plan
+            ])
+        elif plan:
+            # The camps and volunteers the change feed events read, loaded in two queries
+            campaigns = {campaign.id: campaign for campaign in Campaign.query.options(
+                db.joinedload(Campaign.request).load_only(Request.pincode)
+            ).filter(Campaign.id.in_(camp_ids))}
+            users = {user.id: user for user in User.query.filter(User.id.in_([v for v, _, _ in plan]))}
+            participations = [CampaignVolunteer(campaign=campaigns[campaign_id], volunteer=users[volunteer_id],
+                                                status='joined')
+                              for volunteer_id, campaign_id, _ in plan]
+            db.session.add_all(participations)
+            db.session.flush()
+            for participation in participations:
+                record_change(participation, 'joined')
+            enqueue_jobs('volunteer_joined', [({'volunteer_id': p.volunteer_id}, None) for p in participations])
+        db.session.commit()
+    
+    filled = {}
+    for _, campaign_id, _ in plan:
+        filled[campaign_id] = filled.get(campaign_id, 0) + 1
+    total_km = sum(km for _, _, km in plan)
+    return jsonify({
+        "date": day.isoformat(),
+        "mode": mode,
+        "dry_run": dry_run,
+        "camps": len(camps),
+        "volunteers": len(volunteers),
+        "open_spots": sum(spots.values()),
+        "assigned": len(plan),
+        "total_km": round(total_km, 2),
+        "mean_km": round(total_km / len(plan), 2) if plan else None,
+        "seconds": round(seconds, 3),
+        "unfilled": {str(camp_id): spots[camp_id] - filled.get(camp_id, 0)
+                     for camp_id in camp_ids if spots[camp_id] > filled.get(camp_id, 0)},
+        "assignments": [{"campaign_id": campaign_id, "volunteer_id": volunteer_id, "distance_km": round(km, 2)}
+                        for volunteer_id, campaign_id, km in plan]
+    })
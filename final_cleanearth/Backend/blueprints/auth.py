@@ -0,0 +1,218 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, get_jwt
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from extensions import db, jwt_blacklist
+from models import User
+from services import sparse_fields, project, refresh_volunteer_location, fill_user_location
+import fieldsets
+
+bp = Blueprint('auth', __name__)
+
+# Basic routes
+@bp.route('/')
+def index():
+    return jsonify({"message": "Welcome to CleanEarth API"})
+
+# Authentication routes
+@bp.route('/api/register', methods=['POST'])
+def register():
+    data = request.get_json()
+    
+    # Validate input
+    if not data or not data.get('email') or not data.get('password') or not data.get('name'):
+        return jsonify({"error": "Missing required fields"}), 400
+    
+    # Check if user already exists
+    if User.query.filter_by(email=data['email']).first():
+        return jsonify({"error": "User already exists"}), 409
+    
+    # Create new user
+    hashed_password = generate_password_hash(data['password'])
+    user = User(
+        name=data['name'],
+        email=data['email'],
+        password=hashed_password,
+        address=data.get('address', ''),
+        pincode=data.get('pincode', ''),
+        latitude=data.get('latitude', 0.0),
+        longitude=data.get('longitude', 0.0),
+        role=data.get('role', 'user')
+    )
+    fill_user_location(user)
+    
+    db.session.add(user)
+    db.session.commit()
+    refresh_volunteer_location(user)
+    
+    # Create access token for immediate login after registration - ensure user_id is a string
+    user_id_str = str(user.id)
+    access_token = create_access_token(identity=user_id_str)
+    
+    print(f"Registration: Generated token for user {user_id_str}")
+    
+    return jsonify({
+        "message": "User registered successfully",
+        "user_id": user.id,
+        "access_token": access_token,
+        "user": user.to_dict()
+    }), 201
+
+@bp.route('/api/login', methods=['POST'])
+def login():
+    data = request.get_json()
+    
+    if not data or not data.get('email') or not data.get('password'):
+        return jsonify({"error": "Missing email or password"}), 400
+    
+    user = User.query.filter_by(email=data['email']).first()
+    
+    if not user or not check_password_hash(user.password, data['password']):
+        return jsonify({"error": "Invalid credentials"}), 401
+    
+    # Check if user has specified role if provided
+    if data.get('role') and user.role != data.get('role'):
+        return jsonify({"error": f"User is not a {data.get('role')}"}), 403
+    
+    # Check if user is blocked
+    if user.is_blocked:
+        return jsonify({"error": "Your account has been blocked"}), 403
+    
+    # Create access token - ensure user_id is a string
+    user_id_str = str(user.id)
+    
+    # Debugging output
+    print(f"User ID type: {type(user_id_str)}, value: {user_id_str}")
+    
+    # Additional claims for the token
+    additional_claims = {
+        "user_email": user.email,
+        "user_role": user.role
+    }
+    
+    access_token = create_access_token(
+        identity=user_id_str,
+        additional_claims=additional_claims
+    )
+    
+    print(f"Generated token for user {user_id_str}")
+    
+    return jsonify({
+        "message": "Login successful",
+        "access_token": access_token,
+        "user": user.to_dict()
+    })
+
+@bp.route('/api/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    try:
+        jti = get_jwt()["jti"]
+        jwt_blacklist.add(jti)
+        return jsonify({"message": "Successfully logged out"}), 200
+    except Exception as e:
+        print(f"Error in logout: {str(e)}")
+        return jsonify({"error": "Failed to logout"}), 500
+
+# Get user profile
+@bp.route('/api/profile', methods=['GET'])
+@jwt_required()
+def get_profile():
+    current_user_id = get_jwt_identity()
+    fields, error = sparse_fields(User)
+    if error:
+        return error
+    
+    user = project(User.query, User, fields).get_or_404(current_user_id)
+    
+    return jsonify(fieldsets.serialize(user, fields))
+
+# Update user profile
+@bp.route('/api/profile', methods=['PUT'])
+@jwt_required()
+def update_profile():
+    current_user_id = get_jwt_identity()
+    user = User.query.get_or_404(current_user_id)
+    
+    data = request.get_json()
+    
+    # Update allowed fields
+    pincode_changed = False
+    if 'name' in data:
+        user.name = data['name']
+    if 'address' in data:
+        user.address = data['address']
+    if 'pincode' in data:
+        pincode_changed = data['pincode'] != user.pincode
+        user.pincode = data['pincode']
+    if 'latitude' in data:
+        user.latitude = float(data['latitude'])
+    if 'longitude' in data:
+        user.longitude = float(data['longitude'])
+    # Coordinates follow a new pincode unless the client sent its own
+    fill_user_location(user, pincode_changed and 'latitude' not in data and 'longitude' not in data)
+        
+    db.session.commit()
+    refresh_volunteer_location(user)
+    
+    return jsonify({
+        "message": "Profile updated successfully",
+        "user": user.to_dict()
+    })
+
+# Add route to check authorization status and get user info
+@bp.route('/api/auth-check', methods=['GET', 'OPTIONS'])
+@jwt_required(optional=True)
+def auth_check():
+    # Handle OPTIONS requests for CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'OK'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Methods', 'GET,OPTIONS')
+        return response
+    
+    try:
+        # Get raw token for debugging
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        print(f"Auth check token: {token}")
+        
+        if not token:
+            return jsonify({
+                "authenticated": False, 
+                "error": "No token provided"
+            }), 401
+        
+        try:
+            current_user_id = get_jwt_identity()
+            print(f"Auth check user ID: {current_user_id}")
+        except Exception as e:
+            print(f"JWT identity error in auth-check: {str(e)}")
+            return jsonify({
+                "authenticated": False,
+                "error": f"Invalid token: {str(e)}"
+            }), 401
+        
+        if not current_user_id:
+            return jsonify({
+                "authenticated": False,
+                "error": "No user ID in token"
+            }), 401
+        
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({
+                "authenticated": False,
+                "error": "User not found"
+            }), 404
+            
+        return jsonify({
+            "authenticated": True,
+            "user": user.to_dict()
+        })
+    except Exception as e:
+        print(f"Auth check error: {str(e)}")
+        return jsonify({
+            "authenticated": False,
+            "error": str(e)
+        }), 401
@@ -0,0 +1,798 @@
+from flask import Blueprint, current_app, request, jsonify, abort
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import User, Request, Campaign, CampaignVolunteer, VolunteerProposal
+from services import (sparse_fields, project, get_with_archive, enqueue_job, record_change, set_request_status,
+                      get_volunteer_locator, spatial_index_available, idempotent, notify_volunteers,
+                      refresh_priority, queue_campaigns_completed, queue_campaigns_reopened)
+import fieldsets
+import metrics
+import sharding
+import spatial
+
+bp = Blueprint('campaigns', __name__)
+
+# Camp management routes
+@bp.route('/api/camp_register', methods=['POST'])
+@jwt_required()
+@idempotent
+def register_camp():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Only volunteers and admins can create camps
+    if current_user.role not in ['volunteer', 'admin']:
+        return jsonify({"error": "Not authorized to create camps"}), 403
+    
+    data = request.get_json()
+    
+    # Validate required fields
+    required_fields = ['requestId', 'campName', 'dateOfCamp', 'timeOfCamp', 'numberOfVolunteers', 'description'
+    ]
+    for field in required_fields:
+        if field not in data:
+            return jsonify({"error": f"Missing required field: {field}"}), 400
+    
+    # Parse date
+    try:
+        campaign_date = datetime.strptime(data['dateOfCamp'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    
+    new_campaign = Campaign(
+        name=data['campName'],
+        request_id=data['requestId'],
+        date=campaign_date,
+        num_volunteers=int(data['numberOfVolunteers']),
+        timing=data['timeOfCamp'],
+        description=data['description'],
+        status='planned',
+        creator_id=current_user_id
+    )
+    
+    db.session.add(new_campaign)
+    record_change(new_campaign, 'created')
+    notify_volunteers('campaign_scheduled', new_campaign)
+    refresh_priority([new_campaign.request_id])
+    db.session.commit()
+    
+    return jsonify({
+        "message": "Campaign created successfully", 
+        "id": new_campaign.id,
+        "campaign": new_campaign.to_dict()
+    }), 201
+
+# Campaign management routes
+@bp.route('/api/managecamp', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@jwt_required()
+def manage_campaign():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # GET: Fetch single campaign or all campaigns
+    if request.method == 'GET':
+        fields, error = sparse_fields(Campaign)
+        if error:
+            return error
+        
+        camp_id = request.args.get('id')
+        if camp_id:
+            # Show single campaign (archived campaigns included)
+            campaign = get_with_archive(Campaign, camp_id, fields)
+            if campaign is None:
+                abort(404)
+            return jsonify(fieldsets.serialize(campaign, fields))
+        else:
+            # List all campaigns
+            campaigns = project(Campaign.query, Campaign, fields).all()
+            return jsonify([fieldsets.serialize(c, fields) for c in campaigns])
+    
+    # POST: Create new campaign
+    elif request.method == 'POST':
+        data = request.get_json()
+        
+        # Validate required fields
+        required_fields = ['request_id', 'date', 'num_volunteers', 'timing', 'name']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+        
+        # Check if the request exists
+        waste_request = Request.query.get(data['request_id'])
+        if not waste_request:
+            return jsonify({"error": "Referenced waste request does not exist"}), 400
+        
+        # Parse date
+        try:
+            campaign_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+        
+        new_campaign = Campaign(
+            name=data['name'],
+            request_id=data['request_id'],
+            date=campaign_date,
+            num_volunteers=int(data['num_volunteers']),
+            timing=data['timing'],
+            description=data.get('description', ''),
+            status='planned',
+            creator_id=current_user_id
+        )
+        
+        db.session.add(new_campaign)
+        record_change(new_campaign, 'created')
+        notify_volunteers('campaign_scheduled', new_campaign)
+        refresh_priority([new_campaign.request_id])
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Campaign created successfully", 
+            "id": new_campaign.id,
+            "campaign": new_campaign.to_dict()
+        }, 201)
+    
+    # PUT: Update campaign
+    elif request.method == 'PUT':
+        camp_id = request.args.get('id')
+        if not camp_id:
+            return jsonify({"error": "No campaign ID provided"}), 400
+        
+        campaign = Campaign.query.get_or_404(camp_id)
+        
+        # Check permissions (only creator or admin can update)
+        if campaign.creator_id != current_user_id and current_user.role != 'admin':
+            return jsonify({"error": "Not authorized to update this campaign"}), 403
+        
+        data = request.get_json()
+        
+        # Update fields if provided
+        if 'name' in data:
+            campaign.name = data['name']
+        if 'request_id' in data:
+            # Verify the request exists
+            target_request = Request.query.get(data['request_id'])
+            if not target_request:
+                return jsonify({"error": "Referenced waste request does not exist"}), 400
+            # With sharded storage a campaign must stay in its request's region
+            if db.sharded and sharding.region_of(target_request) != sharding.region_of(campaign):
+                return jsonify({"error": "A campaign can't be moved to a request in another region"}), 400
+            previous_request_id = campaign.request_id
+            campaign.request_id = data['request_id']
+            refresh_priority([previous_request_id, campaign.request_id])
+        if 'date' in data:
+            try:
+                campaign.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+        if 'num_volunteers' in data:
+            campaign.num_volunteers = int(data['num_volunteers'])
+        if 'timing' in data:
+            campaign.timing = data['timing']
+        if 'description' in data:
+            campaign.description = data['description']
+        if 'status' in data and data['status'] != campaign.status:
+            # Completed campaigns count in the rollups and badge counters until reopened
+            if campaign.status == 'completed':
+                queue_campaigns_reopened([(campaign.id, campaign.completed_at)])
+                campaign.completed_at = None
+            campaign.status = data['status']
+            if campaign.status == 'completed':
+                campaign.completed_at = datetime.utcnow()
+                queue_campaigns_completed([(campaign.id, campaign.completed_at)])
+        
+        record_change(campaign, 'updated')
+        db.session.commit()
+        return jsonify({
+            "message": "Campaign updated successfully",
+            "campaign": campaign.to_dict()
+        })
+    
+    # DELETE: Delete campaign
+    elif request.method == 'DELETE':
+        camp_id = request.args.get('id')
+        if not camp_id:
+            return jsonify({"error": "No campaign ID provided"}), 400
+        
+        campaign = Campaign.query.get_or_404(camp_id)
+        
+        # Check permissions (only creator or admin can delete)
+        if campaign.creator_id != current_user_id and current_user.role != 'admin':
+            return jsonify({"error": "Not authorized to delete this campaign"}), 403
+        
+        record_change(campaign, 'deleted')
+        if campaign.status == 'completed':
+            queue_campaigns_reopened([(campaign.id, campaign.completed_at)])
+        db.session.delete(campaign)
+        refresh_priority([campaign.request_id])
+        db.session.commit()
+        return jsonify({"message": "Campaign deleted successfully"})
+
+# Campaign completion endpoint
+@bp.route('/api/complete-campaign/<int:campaign_id>', methods=['POST'])
+@jwt_required()
+def complete_campaign(campaign_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    campaign = Campaign.query.get_or_404(campaign_id)
+    
+    # Check if user is admin or campaign creator
+    if current_user.role == 'admin' or current_user_id == campaign.creator_id:
+        already_completed = campaign.status == 'completed'
+        campaign.status = 'completed'
+        campaign.completed_at = campaign.completed_at or datetime.utcnow()
+        
+        # Also update the associated request status
+        if campaign.request:
+            set_request_status(campaign.request, 'completed')
+        
+        # Follow-up work runs on the job queue, committed with the status change
+        record_change(campaign, 'completed')
+        if not already_completed:
+            queue_campaigns_completed([(campaign.id, campaign.completed_at)])
+        db.session.commit()
+            
+        return jsonify({
+            "message": "Campaign marked as completed",
+            "campaign": campaign.to_dict()
+        })
+    
+    return jsonify({"error": "Not authorized"}), 403
+
+# Campaign discovery by date range, area, status and free spots, with keyset
+# pagination in (date, id) order. Served by the (status, date, id) index on
+# campaign and, for areas, the request R*Tree (or lat/lon ranges without it)
+@bp.route('/api/campaigns/search', methods=['GET'])
+@jwt_required()
+def search_campaigns():
+    fields, error = sparse_fields(Campaign)
+    if error:
+        return error
+    
+    args = request.args
+    statuses = [s.strip() for s in args.get('status', 'planned').split(',') if s.strip()]
+    if not statuses or set(statuses) - {'planned', 'in-progress', 'completed'}:
+        return jsonify({"error": "status must be a comma separated list of planned, in-progress, completed"}), 400
+    try:
+        date_from = datetime.strptime(args['from'], '%Y-%m-%d').date() if args.get('from') else None
+        date_to = datetime.strptime(args['to'], '%Y-%m-%d').date() if args.get('to') else None
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    try:
+        limit = min(max(int(args.get('limit', 20)), 1), 100)
+        min_spots = int(args.get('min_spots', 1 if args.get('spots_available') in ('1', 'true') else 0))
+        box = spatial.parse_bbox(args['bbox']) if args.get('bbox') else None
+        center = None
+        if args.get('radius_km'):
+            center = (float(args['lat']), float(args['lon']), min(float(args['radius_km']), 500.0))
+            box = spatial.radius_box(*center)
+        after = None
+        if args.get('after'):
+            after_date, _, after_id = args['after'].partition(':')
+            after = (datetime.strptime(after_date, '%Y-%m-%d').date(), int(after_id))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid search parameters: {e}"}), 400
+    
+    taken = db.session.query(db.func.count(CampaignVolunteer.id)).filter(
+        CampaignVolunteer.campaign_id == Campaign.id
+    ).correlate(Campaign).scalar_subquery()
+    spots_left = db.func.coalesce(Campaign.num_volunteers, 0) - taken
+    
+    # The cursor needs the date of the last row, so load it with any fieldset
+    query = project(Campaign.query, Campaign, fields + ['date'] if fields else None)
+    query = query.add_columns(spots_left.label('spots_left'))
+    query = query.filter(Campaign.status.in_(statuses))
+    if date_from:
+        query = query.filter(Campaign.date >= date_from)
+    if date_to:
+        query = query.filter(Campaign.date <= date_to)
+    if min_spots > 0:
+        query = query.filter(spots_left >= min_spots)
+    if after:
+        query = query.filter(db.tuple_(Campaign.date, Campaign.id) > after)
+    
+    if box:
+        min_lat, max_lat, min_lon, max_lon = box
+        query = query.join(Request, Campaign.request_id == Request.id)
+        if spatial_index_available():
+            in_box = db.text(spatial.rtree_ids_sql()).bindparams(
+                min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon
+            ).columns(db.column('id'))
+            query = query.filter(Request.id.in_(in_box))
+        query = query.filter(Request.latitude.between(min_lat, max_lat), Request.longitude.between(min_lon, max_lon))
+    if center:
+        lat, lon, radius_km = center
+        distance = spatial.squared_distance_km(Request.latitude, Request.longitude, lat, lon)
+        query = query.filter(distance <= radius_km * radius_km).add_columns(distance.label('distance'))
+    
+    rows = query.order_by(Campaign.date, Campaign.id).limit(limit + 1).all()
+    # Sharded storage returns each region's first rows one after another
+    rows.sort(key=lambda row: (row[0].date, row[0].id))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    results = []
+    for row in rows:
+        item = fieldsets.serialize(row[0], fields)
+        item['spots_left'] = max(row.spots_left, 0)
+        if center:
+            item['distance_km'] = round(row.distance ** 0.5, 2)
+        results.append(item)
+    
+    last = rows[-1][0] if rows else None
+    return jsonify({
+        "campaigns": results,
+        "next": f"{last.date.isoformat()}:{last.id}" if has_more else None,
+        "has_more": has_more
+    })
+
+# Suggest nearby volunteers for a campaign
+@bp.route('/api/campaigns/<int:campaign_id>/suggested_volunteers', methods=['GET'])
+@jwt_required()
+def suggested_volunteers(campaign_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    campaign = Campaign.query.get_or_404(campaign_id)
+    
+    # Only the campaign creator or an admin can look for volunteers
+    if str(campaign.creator_id) != str(current_user_id) and current_user.role != 'admin':
+        return jsonify({"error": "Not authorized"}), 403
+    
+    if not campaign.request:
+        return jsonify({"error": "Campaign has no associated request location"}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 500)
+        max_km = float(request.args['max_km']) if 'max_km' in request.args else None
+    except ValueError:
+        return jsonify({"error": "limit and max_km must be numbers"}), 400
+    
+    # Skip volunteers already in this campaign or busy with another one on the same day
+    busy = db.session.query(CampaignVolunteer.volunteer_id).join(
+        Campaign, CampaignVolunteer.campaign_id == Campaign.id
+    ).filter(Campaign.date == campaign.date).distinct().all()
+    joined = db.session.query(CampaignVolunteer.volunteer_id).filter_by(campaign_id=campaign.id).all()
+    exclude = {row[0] for row in busy} | {row[0] for row in joined}
+    
+    # Recent participation counts, one grouped query
+    since = datetime.utcnow() - timedelta(days=current_app.config['VOLUNTEER_ACTIVITY_DAYS'])
+    activity = {}
+    for volunteer_id, count in db.session.query(
+        CampaignVolunteer.volunteer_id,
+        db.func.count(CampaignVolunteer.id)
+    ).filter(CampaignVolunteer.joined_at >= since).group_by(CampaignVolunteer.volunteer_id):
+        # Summed, as sharded storage returns one group per region
+        activity[volunteer_id] = activity.get(volunteer_id, 0) + count
+    
+    ranked = get_volunteer_locator().rank(
+        campaign.request.latitude,
+        campaign.request.longitude,
+        exclude=exclude,
+        activity=activity,
+        max_km=max_km,
+        limit=limit
+    )
+    
+    users = {u.id: u for u in User.query.filter(User.id.in_([r[0] for r in ranked])).all()} if ranked else {}
+    suggestions = []
+    for volunteer_id, distance_km, score in ranked:
+        volunteer = users.get(volunteer_id)
+        if not volunteer:
+            continue
+        suggestions.append({
+            "id": volunteer.id,
+            "name": volunteer.name,
+            "pincode": volunteer.pincode,
+            "distanceKm": round(distance_km, 2),
+            "recentCamps": activity.get(volunteer_id, 0),
+            "score": round(score, 3)
+        })
+    
+    return jsonify({
+        "campaign_id": campaign.id,
+        "date": campaign.date,
+        "suggestions": suggestions
+    })
+
+# Join campaign as a volunteer
+@bp.route('/api/join-campaign/<int:campaign_id>', methods=['POST'])
+@jwt_required()
+def join_campaign(campaign_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Check if user is a volunteer
+    if current_user.role != 'volunteer':
+        return jsonify({"error": "Only volunteers can join campaigns"}), 403
+    
+    campaign = Campaign.query.get_or_404(campaign_id)
+    
+    # Check if campaign is still open
+    if campaign.status not in ['planned', 'in-progress']:
+        return jsonify({"error": "Cannot join campaign that is not active"}), 400
+    
+    # Check if already joined
+    existing = CampaignVolunteer.query.filter_by(
+        campaign_id=campaign_id, 
+        volunteer_id=current_user_id
+    ).first()
+    
+    if existing:
+        return jsonify({"error": "Already joined this campaign"}), 400
+    
+    # Join the campaign
+    campaign_volunteer = CampaignVolunteer(
+        campaign_id=campaign_id,
+        volunteer_id=current_user_id,
+        status='joined'
+    )
+    
+    db.session.add(campaign_volunteer)
+    db.session.flush()
+    record_change(campaign_volunteer, 'joined')
+    enqueue_job('volunteer_joined', {'volunteer_id': campaign_volunteer.volunteer_id})
+    db.session.commit()
+    
+    return jsonify({
+        "message": "Successfully joined the campaign",
+        "campaign": campaign.to_dict()
+    })
+
+# Leave campaign
+@bp.route('/api/leave-campaign/<int:campaign_id>', methods=['POST'])
+@jwt_required()
+def leave_campaign(campaign_id):
+    current_user_id = get_jwt_identity()
+    
+    # Find the volunteer record
+    volunteer_record = CampaignVolunteer.query.filter_by(
+        campaign_id=campaign_id, 
+        volunteer_id=current_user_id
+    ).first_or_404()
+    
+    record_change(volunteer_record, 'left')
+    db.session.delete(volunteer_record)
+    enqueue_job('volunteer_left', {'volunteer_id': volunteer_record.volunteer_id})
+    db.session.commit()
+    
+    return jsonify({"message": "Successfully left the campaign"})
+
+# Camps proposed to the current volunteer by the day scheduler
+@bp.route('/api/volunteer_proposals', methods=['GET'])
+@jwt_required()
+def get_volunteer_proposals():
+    current_user_id = get_jwt_identity()
+    
+    proposals = VolunteerProposal.query.filter_by(volunteer_id=current_user_id, status='proposed').order_by(
+        VolunteerProposal.date, VolunteerProposal.id).all()
+    campaigns = {c.id: c for c in Campaign.query.filter(Campaign.id.in_([p.campaign_id for p in proposals]))} \
+        if proposals else {}
+    return jsonify([
+        dict(proposal.to_dict(), campaign=campaigns[proposal.campaign_id].to_dict())
+        for proposal in proposals if proposal.campaign_id in campaigns
+    ])
+
+@bp.route('/api/volunteer_proposals/<int:proposal_id>/<any(accept, decline):answer>', methods=['POST'])
+@jwt_required()
+def answer_volunteer_proposal(proposal_id, answer):
+    current_user_id = get_jwt_identity()
+    
+    proposal = VolunteerProposal.query.get_or_404(proposal_id)
+    if str(proposal.volunteer_id) != str(current_user_id):
+        return jsonify({"error": "Not authorized"}), 403
+    if proposal.status != 'proposed':
+        return jsonify({"error": f"Proposal already {proposal.status}"}), 400
+    
+    proposal.responded_at = datetime.utcnow()
+    if answer == 'decline':
+        # The scheduler won't propose this camp to the volunteer again
+        proposal.status = 'declined'
+        db.session.commit()
+        return jsonify({"message": "Proposal declined", "proposal": proposal.to_dict()})
+    
+    campaign = Campaign.query.get(proposal.campaign_id)
+    if campaign is None or campaign.status not in ['planned', 'in-progress']:
+        return jsonify({"error": "Cannot join campaign that is not active"}), 400
+    if CampaignVolunteer.query.filter_by(campaign_id=campaign.id, volunteer_id=proposal.volunteer_id).first():
+        return jsonify({"error": "Already joined this campaign"}), 400
+    if CampaignVolunteer.query.filter_by(campaign_id=campaign.id).count() >= (campaign.num_volunteers or 0):
+        return jsonify({"error": "This camp is already full"}), 400
+    
+    participation = CampaignVolunteer(campaign_id=campaign.id, volunteer_id=proposal.volunteer_id, status='joined')
+    db.session.add(participation)
+    db.session.flush()
+    record_change(participation, 'joined')
+    enqueue_job('volunteer_joined', {'volunteer_id': participation.volunteer_id})
+    proposal.status = 'accepted'
+    db.session.commit()
+    
+    return jsonify({
+        "message": "Successfully joined the campaign",
+        "proposal": proposal.to_dict(),
+        "campaign": campaign.to_dict()
+    })
+
+@bp.route('/api/user_camps', methods=['GET'])
+@jwt_required()
+def get_user_camps():
+    try:
+        # Extract JWT token and print it for debugging
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        print(f"Token in user_camps: {token}")
+        
+        # Get user ID from JWT token with better error handling
+        try:
+            current_user_id = get_jwt_identity()
+            print(f"User ID from token in user_camps: {current_user_id}")
+        except Exception as e:
+            print(f"JWT identity error in user_camps: {str(e)}")
+            return jsonify({"error": "Invalid token"}), 401
+            
+        if not current_user_id:
+            return jsonify({"error": "Invalid token - no user ID"}), 401
+            
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+            
+        # Check if pincode exists
+        if not user.pincode:
+            return jsonify({"error": "No pincode associated with your account"}), 400
+            
+        participation_fields = ('isParticipating', 'participationCount', 'spotsLeft')
+        fields, error = sparse_fields(Campaign, extra=participation_fields)
+        if error:
+            return error
+        wants_participation = fields is None or any(f in participation_fields for f in fields)
+        if fields is not None and wants_participation and 'num_volunteers' not in fields:
+            # spotsLeft is computed from num_volunteers
+            query_fields = fields + ['num_volunteers']
+        else:
+            query_fields = fields
+            
+        # Show all active camps in user's pincode
+        camps = project(
+            Campaign.query.filter_by(status='planned').join(Request, Campaign.request_id == Request.id).filter(Request.pincode == user.pincode),
+            Campaign,
+            query_fields
+        ).all()
+        
+        # Get current user's participation status and counts for all camps in two queries
+        joined_ids = set()
+        counts = {}
+        camp_ids = [camp.id for camp in camps]
+        if wants_participation and camp_ids:
+            joined_ids = {row[0] for row in db.session.query(CampaignVolunteer.campaign_id).filter(
+                CampaignVolunteer.campaign_id.in_(camp_ids),
+                CampaignVolunteer.volunteer_id == current_user_id
+            )}
+            counts = dict(db.session.query(
+                CampaignVolunteer.campaign_id,
+                db.func.count(CampaignVolunteer.id)
+            ).filter(CampaignVolunteer.campaign_id.in_(camp_ids)).group_by(CampaignVolunteer.campaign_id).all())
+        
+        camp_details = []
+        for camp in camps:
+            camp_data = fieldsets.serialize(camp, [f for f in fields if f not in participation_fields] if fields else None)
+            if wants_participation:
+                participation = {
+                    'isParticipating': camp.id in joined_ids,
+                    'participationCount': counts.get(camp.id, 0),
+                    'spotsLeft': max(0, camp.num_volunteers - counts.get(camp.id, 0))
+                }
+                for key, value in participation.items():
+                    if fields is None or key in fields:
+                        camp_data[key] = value
+            camp_details.append(camp_data)
+            
+        return jsonify(camp_details)
+    except Exception as e:
+        print(f"Error in user_camps: {str(e)}")
+        return jsonify({"error": "Failed to process request"}), 500
+
+@bp.route('/api/volunteer_camps', methods=['GET', 'OPTIONS'])
+@jwt_required(optional=True)
+def get_volunteer_camps():
+    # Handle OPTIONS requests for CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'OK'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
+        return response
+        
+    try:
+        # Extract JWT token and print it for debugging
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        print(f"Token in volunteer_camps: {token}")
+        
+        # Get user ID from JWT token with better error handling
+        try:
+            current_user_id = get_jwt_identity()
+            print(f"User ID from token in volunteer_camps: {current_user_id}")
+        except Exception as e:
+            print(f"JWT identity error in volunteer_camps: {str(e)}")
+            return jsonify({"error": "Invalid token: " + str(e)}), 401
+            
+        if not current_user_id:
+            return jsonify({"error": "Invalid token - no user ID"}), 401
+            
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+            
+        if user.role not in ['volunteer', 'admin']:
+            return jsonify({"error": "Not authorized"}), 403
+            
+        # Check if pincode exists
+        if not user.pincode:
+            return jsonify({"error": "No pincode associated with your account"}), 400
+            
+        fields, error = sparse_fields(Campaign)
+        if error:
+            return error
+            
+        # Show all active camps in volunteer's pincode
+        camps = project(
+            Campaign.query.filter_by(status='planned').join(Request, Campaign.request_id == Request.id).filter(Request.pincode == user.pincode),
+            Campaign,
+            fields
+        ).all()
+        return jsonify([fieldsets.serialize(c, fields) for c in camps])
+    except Exception as e:
+        print(f"Error in volunteer_camps: {str(e)}")
+        return jsonify({"error": "Failed to process request"}), 500
+
+@bp.route('/api/camp_participate/<int:camp_id>', methods=['POST'])
+@jwt_required()
+@idempotent
+def participate_camp(camp_id):
+    try:
+        # Extract JWT token and print it for debugging
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        print(f"Token in camp_participate: {token}")
+        
+        # Get user ID from JWT token with better error handling
+        try:
+            current_user_id = get_jwt_identity()
+            print(f"User ID from token in camp_participate: {current_user_id}")
+        except Exception as e:
+            print(f"JWT identity error in camp_participate: {str(e)}")
+            return jsonify({"error": "Invalid token"}), 401
+            
+        if not current_user_id:
+            return jsonify({"error": "Invalid token - no user ID"}), 401
+            
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+            
+        camp = Campaign.query.get_or_404(camp_id)
+        
+        # Check if already joined
+        from sqlalchemy import and_
+        existing = CampaignVolunteer.query.filter(and_(
+            CampaignVolunteer.campaign_id==camp_id, 
+            CampaignVolunteer.volunteer_id==current_user_id
+        )).first()
+        
+        if existing:
+            return jsonify({"error": "Already participating in this camp"}), 400
+            
+        # Get current participant count
+        current_participants = CampaignVolunteer.query.filter_by(campaign_id=camp_id).count()
+        
+        # Check if camp is full
+        if current_participants >= camp.num_volunteers:
+            return jsonify({"error": "This camp is already full"}), 400
+        
+        # Add participation
+        participation = CampaignVolunteer(
+            campaign_id=camp_id,
+            volunteer_id=current_user_id,
+            status='joined'
+        )
+        db.session.add(participation)
+        db.session.flush()
+        record_change(participation, 'joined')
+        enqueue_job('volunteer_joined', {'volunteer_id': participation.volunteer_id})
+        db.session.commit()
+        
+        # Get updated counts
+        new_count = CampaignVolunteer.query.filter_by(campaign_id=camp_id).count()
+        spots_left = max(0, camp.num_volunteers - new_count)
+        
+        return jsonify({
+            "message": "Successfully joined the campaign",
+            "participationCount": new_count,
+            "spotsLeft": spots_left,
+            "campDetails": camp.to_dict()
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in camp_participate: {str(e)}")
+        return jsonify({"error": f"Failed to process request: {str(e)}"}), 500
+
+@bp.route('/api/complete-camp/<int:campaign_id>', methods=['POST'])
+@jwt_required()
+def complete_camp_with_details(campaign_id):
+    try:
+        # Get user identity and validate permissions
+        current_user_id = get_jwt_identity()
+        current_user = User.query.get(current_user_id)
+        
+        if not current_user:
+            return jsonify({"error": "User not found"}), 404
+            
+        # Get the campaign
+        campaign = Campaign.query.get_or_404(campaign_id)
+        
+        # Check if user is the creator of the camp or an admin
+        if str(campaign.creator_id) != str(current_user_id) and current_user.role != 'admin':
+            return jsonify({"error": "Not authorized to complete this campaign"}), 403
+            
+        # Get form data
+        data = request.get_json()
+        print("Completion data received:", data)
+        
+        # Validate required fields
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+            
+        # Completing again replaces the previous completion's figures
+        if campaign.status == 'completed':
+            queue_campaigns_reopened([(campaign.id, campaign.completed_at)])
+        
+        # Update campaign with completion details
+        if 'actual_participants' in data:
+            campaign.actual_participants = int(data['actual_participants'])
+        
+        if 'waste_collected' in data:
+            campaign.waste_collected = data['waste_collected']
+        
+        # Structured quantity, parsed from the free-text field when not given
+        if data.get('waste_quantity') not in (None, ''):
+            try:
+                campaign.waste_quantity = float(data['waste_quantity'])
+            except (TypeError, ValueError):
+                return jsonify({"error": "waste_quantity must be a number"}), 400
+            campaign.waste_unit = metrics.normalize_unit(data.get('waste_unit') or 'kg')
+            if not campaign.waste_unit:
+                return jsonify({"error": f"Unknown waste_unit: {data.get('waste_unit')}"}), 400
+        elif 'waste_collected' in data:
+            campaign.waste_quantity, campaign.waste_unit = metrics.parse_waste(data['waste_collected'])
+        campaign.waste_kg = metrics.to_kg(campaign.waste_quantity, campaign.waste_unit)
+            
+        if 'image_link' in data:
+            campaign.image_link = data['image_link']
+            
+        if 'completion_notes' in data:
+            campaign.completion_notes = data['completion_notes']
+            
+        # Update status to completed and record completion time
+        campaign.status = 'completed'
+        campaign.completed_at = datetime.utcnow()
+        
+        # Update the associated request status to completed
+        if campaign.request:
+            set_request_status(campaign.request, 'completed')
+        
+        # Follow-up work runs on the job queue, committed with the status change
+        record_change(campaign, 'completed')
+        queue_campaigns_completed([(campaign.id, campaign.completed_at)])
+        db.session.commit()
+        
+        # Return the updated campaign data
+        return jsonify({
+            "message": "Campaign marked as completed successfully",
+            "campaign": campaign.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error completing campaign: {str(e)}")
+        return jsonify({"error": f"Failed to complete campaign: {str(e)}"}), 500
@@ -0,0 +1,35 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+
+from extensions import db
+from models import ChangeEvent
+from services import region_engines
+import changes
+
+bp = Blueprint('changes', __name__)
+
+# Incremental sync: changes to requests, campaigns and participations since a cursor
+@bp.route('/api/changes', methods=['GET'])
+@jwt_required()
+def get_changes():
+    try:
+        positions = changes.decode_cursor(request.args.get('since'))
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({"error": "Invalid since cursor or limit"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    
+    pincode = request.args.get('pincode')
+    engines = region_engines()
+    # A pincode's events all live in its region's database
+    if pincode and db.sharded:
+        region = db.router.shard_for_pincode(pincode)
+        engines = {region: engines[region]}
+    
+    events, positions, more = changes.read(engines, ChangeEvent, positions, pincode=pincode, limit=limit)
+    return jsonify({
+        "changes": events,
+        "cursor": changes.encode_cursor(positions),
+        "has_more": more
+    })
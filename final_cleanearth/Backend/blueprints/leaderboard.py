@@ -0,0 +1,146 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from datetime import datetime
+
+from extensions import db
+from models import User, Campaign, CampaignVolunteer, Badge, ImpactRollup, UserCounter
+from services import sparse_fields, project
+import archive
+import fieldsets
+
+bp = Blueprint('leaderboard', __name__)
+
+# Volunteer Leaderboard
+@bp.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    # Get top volunteers by camp participation
+    volunteers = User.query.filter_by(role='volunteer').all()
+    # Camps moved to the archive tables by archive.py (all of them completed)
+    archived_camps = dict(db.session.query(UserCounter.user_id, UserCounter.value).filter(
+        UserCounter.counter == archive.ARCHIVED_CAMPS_COUNTER
+    ).all())
+    
+    # Calculate volunteer stats
+    leaderboard = []
+    for volunteer in volunteers:
+        participations = CampaignVolunteer.query.filter_by(volunteer_id=volunteer.id).all()
+        completed_camps = [p for p in participations if Campaign.query.get(p.campaign_id).status == 'completed']
+        archived = archived_camps.get(volunteer.id, 0)
+        
+        # Calculate points (10 points per completed camp)
+        points = (len(completed_camps) + archived) * 10
+        badges = Badge.query.filter_by(user_id=volunteer.id).count()
+        
+        leaderboard.append({
+            "id": volunteer.id,
+            "name": volunteer.name,
+            "campsAttended": len(participations) + archived,
+            "campsCompleted": len(completed_camps) + archived,
+            "points": points,
+            "badges": badges
+        })
+    
+    # Sort by points (descending)
+    leaderboard.sort(key=lambda x: x["points"], reverse=True)
+    
+    return jsonify(leaderboard)
+
+# Badge management
+@bp.route('/api/badges', methods=['GET', 'OPTIONS'])
+@jwt_required(optional=True)
+def get_user_badges():
+    # Handle OPTIONS requests for CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'OK'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
+        return response
+        
+    try:
+        # Extract JWT token and print it for debugging
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        print(f"Token in badges: {token}")
+        
+        # Get user ID from JWT token with better error handling
+        try:
+            current_user_id = get_jwt_identity()
+            print(f"User ID from token in badges: {current_user_id}")
+        except Exception as e:
+            print(f"JWT identity error in badges: {str(e)}")
+            return jsonify({"error": "Invalid token: " + str(e)}), 401
+            
+        if not current_user_id:
+            return jsonify({"error": "Invalid token - no user ID"}), 401
+            
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+            
+        fields, error = sparse_fields(Badge)
+        if error:
+            return error
+            
+        badges = project(Badge.query.filter_by(user_id=current_user_id), Badge, fields).all()
+        return jsonify([fieldsets.serialize(b, fields) for b in badges])
+    except Exception as e:
+        print(f"Error in badges: {str(e)}")
+        return jsonify({"error": "Failed to process request"}), 500
+
+# Impact statistics from the daily per-pincode rollups
+@bp.route('/api/stats', methods=['GET'])
+def get_impact_stats():
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    
+    group_by = request.args.get('group_by', 'total')
+    if group_by not in ('total', 'day', 'month', 'pincode'):
+        return jsonify({"error": "group_by must be one of total, day, month, pincode"}), 400
+    
+    query = db.session.query(ImpactRollup)
+    if date_from:
+        query = query.filter(ImpactRollup.day >= date_from)
+    if date_to:
+        query = query.filter(ImpactRollup.day <= date_to)
+    # region is a pincode prefix, e.g. 11 for all of Delhi
+    if request.args.get('pincode'):
+        query = query.filter(ImpactRollup.pincode == request.args['pincode'])
+    elif request.args.get('region'):
+        query = query.filter(ImpactRollup.pincode.like(request.args['region'] + '%'))
+    
+    totals = [
+        db.func.sum(ImpactRollup.campaigns_completed),
+        db.func.sum(ImpactRollup.participants),
+        db.func.sum(ImpactRollup.waste_kg)
+    ]
+    if group_by == 'total':
+        rows = [(None,) + tuple(query.with_entities(*totals).one())]
+    else:
+        if group_by == 'day':
+            key = ImpactRollup.day
+        elif group_by == 'month':
+            key = db.func.substr(db.cast(ImpactRollup.day, db.String), 1, 7)
+        else:
+            key = ImpactRollup.pincode
+        rows = query.with_entities(key, *totals).group_by(key).order_by(key).all()
+    
+    stats = []
+    for key, campaigns, participants, waste_kg in rows:
+        item = {
+            "campaignsCompleted": campaigns or 0,
+            "participants": participants or 0,
+            "wasteKg": round(waste_kg or 0.0, 2)
+        }
+        if group_by != 'total':
+            item[group_by] = key
+        stats.append(item)
+    
+    return jsonify({
+        "from": date_from,
+        "to": date_to,
+        "group_by": group_by,
+        "stats": stats if group_by != 'total' else stats[0]
+    })
@@ -0,0 +1,355 @@
+from flask import Blueprint, current_app, request, jsonify, send_file, abort
+from flask_jwt_extended import get_jwt_identity, jwt_required
+import os
+
+from extensions import db
+from models import User, Request, Campaign, MediaAsset, RequestTile
+from services import (sparse_fields, project, get_with_archive, enqueue_job, index_request, update_request_tiles, get_media_store,
+                      record_change, check_request_location, idempotent, notify_volunteers,
+                      prioritize_request)
+import fieldsets
+import media
+import tiles
+
+bp = Blueprint('requests', __name__)
+
+# Fix Flask route for the bare endpoint without /api/ prefix
+@bp.route('/request_register', methods=['POST', 'OPTIONS'])
+def redirect_request_register():
+    # Handle OPTIONS requests for CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'OK'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', '*')
+        response.headers.add('Access-Control-Allow-Methods', '*')
+        return response
+    # For POST requests, redirect to the proper API endpoint
+    return register_request()
+
+# Request management routes
+@bp.route('/api/request_register', methods=['POST'])
+@idempotent
+def register_request():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+            
+        print("Request data received:", data)
+        
+        # Find user by email instead of relying on JWT
+        user = User.query.filter_by(email=data['email']).first()
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+            
+        # Use user.id directly instead of the User object
+        current_user_id = user.id
+        
+        # Validate required fields
+        required_fields = ['email', 'pincode', 'latitude', 'longitude', 'description', 'address']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+        
+        # Type validation for numeric fields
+        try:
+            latitude = float(data['latitude'])
+            longitude = float(data['longitude'])
+        except ValueError:
+            return jsonify({"error": "Latitude and longitude must be valid numbers"}), 422
+        
+        # Coordinates must match the pincode (when the gazetteer knows it)
+        location_error = check_request_location(data['pincode'], latitude, longitude)
+        if location_error:
+            return jsonify({"error": location_error}), 422
+        
+        # Create and save the request
+        new_request = Request(
+            email=data['email'],
+            pincode=data['pincode'],
+            latitude=latitude,
+            longitude=longitude,
+            description=data['description'],
+            address=data['address'],
+            link=data.get('link', ''),  # Link is optional
+            user_id=current_user_id,
+            status='pending'
+        )
+        
+        db.session.add(new_request)
+        db.session.flush()
+        duplicate_of, similarity = index_request(new_request)
+        prioritize_request(new_request)
+        update_request_tiles(new_request, None, new_request.status)
+        record_change(new_request, 'created')
+        enqueue_job('request_created', {'request_id': new_request.id})
+        notify_volunteers('request_created', new_request)
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Request created successfully", 
+            "id": new_request.id,
+            "request": new_request.to_dict(),
+            "duplicate_of": duplicate_of,
+            "similarity": round(similarity, 3)
+        }), 201
+        
+    except Exception as e:
+        # Rollback the session in case of error
+        db.session.rollback()
+        print(f"Error in request_register: {str(e)}")
+        return jsonify({"error": f"Failed to process request: {str(e)}"}), 500
+
+# Get all requests for a user
+@bp.route('/api/user_requests', methods=['GET'])
+@jwt_required()
+def get_user_requests():
+    try:
+        # Extract JWT token and print it for debugging
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        print(f"Token in user_requests: {token}")
+        
+        # Get user ID from JWT token with better error handling
+        try:
+            current_user_id = get_jwt_identity()
+            print(f"User ID from token in user_requests: {current_user_id}")
+        except Exception as e:
+            print(f"JWT identity error in user_requests: {str(e)}")
+            return jsonify({"error": "Invalid token"}), 401
+            
+        if not current_user_id:
+            return jsonify({"error": "Invalid token - no user ID"}), 401
+            
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+            
+        fields, error = sparse_fields(Request)
+        if error:
+            return error
+            
+        user_requests = project(Request.query.filter_by(user_id=current_user_id), Request, fields).all()
+        return jsonify([fieldsets.serialize(r, fields) for r in user_requests])
+    except Exception as e:
+        print(f"Error in user_requests: {str(e)}")
+        return jsonify({"error": "Failed to process request"}), 500
+
+@bp.route('/api/volunteer_requests', methods=['GET', 'OPTIONS'])
+@jwt_required(optional=True)
+def get_volunteer_requests():
+    # Handle OPTIONS requests for CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'OK'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
+        return response
+        
+    try:
+        # Extract JWT token and print it for debugging
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        print(f"Token: {token}")
+        
+        # Get user ID from JWT token with better error handling
+        try:
+            current_user_id = get_jwt_identity()
+            print(f"User ID from token: {current_user_id}, type: {type(current_user_id)}")
+            
+            # Fix for "Subject must be a string" error - ensure user ID is a string
+            if current_user_id is not None and not isinstance(current_user_id, str):
+                current_user_id = str(current_user_id)
+                print(f"Converted user ID to string: {current_user_id}")
+                
+        except Exception as e:
+            print(f"JWT identity error: {str(e)}")
+            return jsonify({"error": "Invalid token: " + str(e)}), 401
+            
+        if not current_user_id:
+            return jsonify({"error": "Authentication required"}), 401
+            
+        current_user = User.query.get(current_user_id)
+        if not current_user:
+            return jsonify({"error": "User not found"}), 404
+            
+        # Allow both volunteers and admins to access
+        if current_user.role not in ['volunteer', 'admin']:
+            return jsonify({"error": "Not authorized"}), 403
+            
+        # Check if pincode exists
+        if not current_user.pincode:
+            return jsonify({"error": "No pincode associated with your account"}), 400
+            
+        fields, error = sparse_fields(Request)
+        if error:
+            return error
+            
+        volunteer_requests = project(Request.query.filter_by(pincode=current_user.pincode), Request, fields).all()
+        return jsonify([fieldsets.serialize(r, fields) for r in volunteer_requests])
+    except Exception as e:
+        print(f"Error in volunteer_requests: {str(e)}")
+        return jsonify({"error": "Failed to process request"}), 500
+
+# Get specific request details for camp registration
+@bp.route('/api/request/<int:request_id>', methods=['GET', 'OPTIONS'])
+@jwt_required(optional=True)
+def get_request_by_id(request_id):
+    # Handle OPTIONS requests for CORS preflight
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'OK'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Methods', 'GET,OPTIONS')
+        return response
+        
+    try:
+        # Extract JWT token for debugging
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        print(f"Token in get_request_by_id: {token}")
+        
+        fields, error = sparse_fields(Request)
+        if error:
+            return error
+            
+        # Find the request, falling back to the archive for old completed ones
+        waste_request = get_with_archive(Request, request_id, fields)
+        if not waste_request:
+            return jsonify({"error": "Request not found"}), 404
+            
+        # Return request details
+        return jsonify(fieldsets.serialize(waste_request, fields))
+    except Exception as e:
+        print(f"Error in get_request_by_id: {str(e)}")
+        return jsonify({"error": f"Failed to process request: {str(e)}"}), 500
+
+# Request density for the map, read from the pre-aggregated tile counts
+@bp.route('/api/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_request_tile(z, x, y):
+    if z > tiles.MAX_TILE_ZOOM:
+        return jsonify({"error": f"Zoom must be at most {tiles.MAX_TILE_ZOOM}; fetch requests directly beyond that"}), 400
+    if x >= 1 << z or y >= 1 << z:
+        return jsonify({"error": "Tile out of range"}), 404
+    
+    # Binary by default at low zoom, where a tile covers the most cells
+    fmt = request.args.get('format') or ('bin' if z <= current_app.config['TILE_BINARY_MAX_ZOOM'] else 'json')
+    if fmt not in ('bin', 'json'):
+        return jsonify({"error": "format must be bin or json"}), 400
+    
+    level, (x_min, x_max), (y_min, y_max) = tiles.tile_bounds(z, x, y)
+    rows = db.session.query(RequestTile.x, RequestTile.y, RequestTile.status, RequestTile.count).filter(
+        RequestTile.zoom == level,
+        RequestTile.x >= x_min, RequestTile.x < x_max,
+        RequestTile.y >= y_min, RequestTile.y < y_max,
+        RequestTile.count > 0
+    ).all()
+    
+    if fmt == 'bin':
+        response = current_app.response_class(tiles.encode_binary(z, x, y, rows), mimetype='application/octet-stream')
+    else:
+        response = jsonify(tiles.encode_json(z, x, y, rows))
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['TILE_CACHE_SECONDS']}"
+    response.add_etag()
+    return response.make_conditional(request)
+
+# Image upload, streamed to content-addressed storage
+@bp.route('/api/uploads', methods=['POST'])
+@jwt_required()
+def upload_image():
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    if not current_user:
+        return jsonify({"error": "User not found"}), 404
+    
+    max_bytes = current_app.config['MAX_UPLOAD_BYTES']
+    if request.content_length and request.content_length > max_bytes:
+        return jsonify({"error": f"File is larger than {max_bytes} bytes"}), 413
+    
+    # The image to attach it to, checked before reading the body
+    campaign = waste_request = None
+    if request.args.get('campaign_id'):
+        campaign = Campaign.query.get_or_404(request.args['campaign_id'])
+        if str(campaign.creator_id) != str(current_user_id) and current_user.role != 'admin':
+            return jsonify({"error": "Not authorized to update this campaign"}), 403
+    elif request.args.get('request_id'):
+        waste_request = Request.query.get_or_404(request.args['request_id'])
+        if str(waste_request.user_id) != str(current_user_id) and current_user.role != 'admin':
+            return jsonify({"error": "Not authorized to update this request"}), 403
+    
+    # Raw image body, or a multipart "file" field (spooled to disk by werkzeug)
+    if request.mimetype == 'multipart/form-data':
+        if 'file' not in request.files:
+            return jsonify({"error": "Missing file"}), 400
+        stream = request.files['file'].stream
+    else:
+        stream = request.stream
+    
+    store = get_media_store()
+    try:
+        digest, ext, content_type, size, created = store.save_stream(stream, max_bytes)
+    except media.UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    asset = MediaAsset.query.get(digest)
+    if not asset:
+        asset = MediaAsset(sha256=digest, ext=ext, content_type=content_type, size=size, uploader_id=current_user.id)
+        db.session.add(asset)
+    
+    url = f'/api/media/{asset.filename}'
+    if campaign and campaign.image_link != url:
+        campaign.image_link = url
+        record_change(campaign, 'updated')
+    elif waste_request and waste_request.link != url:
+        waste_request.link = url
+        record_change(waste_request, 'updated')
+    db.session.commit()
+    
+    if created:
+        media.schedule_thumbnail(
+            store.path_for(digest, ext),
+            store.thumbnail_path_for(digest),
+            current_app.config['THUMBNAIL_SIZE'],
+            current_app.config['THUMBNAIL_WORKERS']
+        )
+    
+    return jsonify({
+        "message": "Image uploaded successfully",
+        "asset": asset.to_dict()
+    }), 201 if created else 200
+
+# Serve stored images; content never changes for a given name, so cache forever
+# (a thumbnail that isn't generated yet gets the original with a short max-age)
+@bp.route('/api/media/<string:filename>', methods=['GET'])
+def get_media(filename):
+    digest, _, ext = filename.partition('.')
+    if len(digest) != 64 or ext not in media.CONTENT_TYPES or not all(ch in '0123456789abcdef' for ch in digest):
+        abort(404)
+    
+    store = get_media_store()
+    path = store.path_for(digest, ext)
+    mimetype = media.CONTENT_TYPES[ext]
+    if not os.path.exists(path):
+        abort(404)
+    
+    max_age = 31536000
+    cache_control = f'public, max-age={max_age}, immutable'
+    if request.args.get('size') == 'thumb':
+        thumbnail_path = store.thumbnail_path_for(digest)
+        if os.path.exists(thumbnail_path):
+            path = thumbnail_path
+            mimetype = 'image/jpeg'
+        else:
+            # Not generated yet (or lost): serve the original briefly so the
+            # thumbnail URL isn't cached as the full image, and (re)generate it
+            media.schedule_thumbnail(
+                path,
+                thumbnail_path,
+                current_app.config['THUMBNAIL_SIZE'],
+                current_app.config['THUMBNAIL_WORKERS']
+            )
+            max_age = 60
+            cache_control = f'public, max-age={max_age}, must-revalidate'
+    
+    # conditional=True gives ETag/304 and Range support; the file is handed to
+    # the WSGI server's file wrapper (sendfile) instead of being read here
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=max_age)
+    response.headers['Cache-Control'] = cache_control
+    return response
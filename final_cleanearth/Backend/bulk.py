@@ -0,0 +1,63 @@
+from datetime import datetime
+
+# Bulk admin operations. A call names its targets either as an id list
+# ({"ids": [...]}) or as filters ({"filter": {...}}). The targets are read
+# with one SELECT and changed with one UPDATE/INSERT/DELETE per table, all in
+# one transaction, and the response reports what happened to each item.
+# With "dry_run": true nothing is written and the results say what would be.
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+AWARDED = 'awarded'
+DELETED = 'deleted'
+SKIPPED = 'skipped'
+NOT_FOUND = 'not_found'
+
+
+def parse_targets(data, allowed_filters, max_items):
+    """
+    (ids, filters) from a request body; exactly one of them is set.
+    Raises ValueError for a malformed body.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    ids, filters = data.get('ids'), data.get('filter')
+    if (ids is None) == (filters is None):
+        raise ValueError("Send either ids or filter")
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise ValueError("ids must be a non-empty list")
+        if len(ids) > max_items:
+            raise ValueError(f"At most {max_items} ids per call")
+        try:
+            ids = list(dict.fromkeys(int(i) for i in ids))
+        except (TypeError, ValueError):
+            raise ValueError("ids must be integers")
+        return ids, None
+    if not isinstance(filters, dict) or not filters:
+        raise ValueError("filter must be a non-empty object")
+    unknown = set(filters) - set(allowed_filters)
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}; use {', '.join(allowed_filters)}")
+    return None, filters
+
+
+def parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+
+def report(ids, outcomes, dry_run=False, has_more=False):
+    """
+    Response body: one result per item (in request order for ids, else id
+    order), counts per result, and whether a filter matched more than one
+    call handles. `outcomes` maps the ids found to their result.
+    """
+    order = ids if ids is not None else sorted(outcomes)
+    results = [{"id": item_id, "result": outcomes.get(item_id, NOT_FOUND)} for item_id in order]
+    counts = {}
+    for item in results:
+        counts[item['result']] = counts.get(item['result'], 0) + 1
+    return {"results": results, "counts": counts, "dry_run": dry_run, "has_more": has_more}
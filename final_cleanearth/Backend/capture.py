@@ -0,0 +1,98 @@
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+
+# Request trace capture for load testing (see replay.py). When
+# TRACE_CAPTURE_PATH is set, a sample of requests is appended to that file as
+# JSON lines: view name, method, path, query arguments, JSON body, status,
+# response size and duration. Traces are sanitized as they are written:
+# values of personal fields are replaced by placeholders of the same length
+# (so replayed payloads keep their size), coordinates are rounded to ~1 km
+# and users appear only as a keyed pseudonym plus their role.
+
+REDACTED_KEYS = ('password', 'email', 'name', 'phone', 'address', 'token', 'secret')
+COORDINATE_KEYS = ('latitude', 'longitude', 'lat', 'lon')
+MAX_BODY_BYTES = 64 * 1024
+
+
+def sanitize(value, key=''):
+    """Copy of a JSON value with personal fields masked"""
+    key = str(key).lower()
+    if isinstance(value, dict):
+        return {k: sanitize(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize(v, key) for v in value]
+    if isinstance(value, str) and any(part in key for part in REDACTED_KEYS):
+        return 'x' * len(value)
+    if key in COORDINATE_KEYS:
+        try:
+            return round(float(value), 2)
+        except (TypeError, ValueError):
+            return value
+    return value
+
+
+def pseudonym(user_id, salt):
+    """Stable, non-reversible stand-in for a user id within one salt"""
+    if user_id is None:
+        return None
+    return hmac.new(salt.encode(), str(user_id).encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def trace_record(request, started, status, size, user_id, role, salt):
+    """The trace line for a finished request"""
+    endpoint = request.endpoint.rsplit('.', 1)[-1] if request.endpoint else None
+    record = {
+        'ts': round(started, 3),
+        'method': request.method,
+        'endpoint': endpoint,
+        'path': request.path,
+        'args': sanitize(request.args.to_dict(flat=False)),
+        'body': None,
+        'user': pseudonym(user_id, salt),
+        'role': role,
+        'status': status,
+        'bytes': size,
+        'ms': round((time.time() - started) * 1000, 2),
+    }
+    if request.is_json and (request.content_length or 0) <= MAX_BODY_BYTES:
+        record['body'] = sanitize(request.get_json(silent=True))
+    elif request.content_length:
+        # Uploads and oversized bodies are not kept; replay skips these
+        record['upload'] = True
+    return record
+
+
+class TraceWriter:
+    """
+    Appends trace lines to a file shared by all workers. Each line is one
+    write() on an O_APPEND descriptor, so lines from different processes
+    don't interleave.
+    """
+
+    def __init__(self, path, sample_rate=1.0, salt=''):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.sample_rate = sample_rate
+        self.salt = salt
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def write(self, record):
+        os.write(self._fd, (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode())
+
+    def close(self):
+        os.close(self._fd)
+
+
+def read_traces(path):
+    """Trace records from a capture file, oldest first"""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda record: record['ts'])
+    return records
@@ -0,0 +1,110 @@
+import json
+from datetime import date, datetime
+
+from sqlalchemy import exists, select
+
+import sharding
+
+# Append-only change feed. Mutations of requests, campaigns and participations
+# add a ChangeEvent row in the same transaction, carrying the row as to_dict()
+# returned it (None for deletions), so clients can apply /api/changes deltas
+# instead of re-downloading whole lists. The ChangeEvent model lives in
+# models.py; functions here take it and engines.
+#
+# Events live next to the rows they describe (SHARD_BY pincode), so with
+# sharded storage each region has its own id sequence and a cursor holds the
+# last id read from each region: "42" unsharded, "north:1000000042,south:..."
+# sharded. SQLite serialises writers, so ids become visible in id order and
+# reading "id > cursor" never skips an event.
+#
+# Compaction drops events superseded by a newer event for the same row. Every
+# kept event is a full snapshot or a deletion, so a client at any cursor still
+# ends up with the latest state of each row; deletions are never dropped.
+
+ENTITY_ACTIONS = {
+    'request': ('created', 'updated', 'status_changed'),
+    'campaign': ('created', 'updated', 'completed', 'deleted'),
+    'participation': ('joined', 'left'),
+}
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dump_data(data):
+    return json.dumps(data, default=_json_default) if data is not None else None
+
+
+def encode_cursor(positions):
+    """{region: last id} -> cursor string"""
+    if set(positions) <= {sharding.GLOBAL}:
+        return str(positions.get(sharding.GLOBAL, 0))
+    return ','.join(f'{region}:{last_id}' for region, last_id in sorted(positions.items()))
+
+
+def decode_cursor(cursor):
+    """Cursor string -> {region: last id}. Raises ValueError for a malformed cursor"""
+    positions = {}
+    for part in filter(None, (cursor or '').split(',')):
+        region, _, last_id = part.rpartition(':')
+        positions[region or sharding.GLOBAL] = int(last_id)
+    return positions
+
+
+def read(engines, Event, positions, pincode=None, limit=100):
+    """
+    Events after `positions` from each engine ({region: engine}), oldest
+    first. Returns (events as dicts, new positions, whether more are waiting).
+    """
+    table = Event.__table__
+    partials = []
+    more = False
+    for region, engine in engines.items():
+        query = table.select().where(table.c.id > positions.get(region, 0))
+        if pincode:
+            query = query.where(table.c.pincode == pincode)
+        with engine.connect() as connection:
+            rows = connection.execute(query.order_by(table.c.id).limit(limit + 1)).mappings().all()
+        more = more or len(rows) > limit
+        partials.append([(region, dict(row)) for row in rows[:limit]])
+
+    events = sharding.gather_sorted(partials, lambda item: (item[1]['created_at'], item[1]['id']), 0, limit)
+    more = more or len(events) < sum(len(p) for p in partials)
+    positions = dict(positions)
+    for region, event in events:
+        positions[region] = max(positions.get(region, 0), event['id'])
+        event['data'] = json.loads(event['data']) if event['data'] else None
+    return [event for _, event in events], positions, more
+
+
+def compact(engine, Event, before):
+    """Delete events older than `before` that a newer event for the same row supersedes. Returns the count"""
+    table = Event.__table__
+    newer = table.alias('newer')
+    superseded = select(newer.c.id).where(
+        newer.c.entity == table.c.entity,
+        newer.c.entity_id == table.c.entity_id,
+        newer.c.id > table.c.id
+    )
+    with engine.begin() as connection:
+        return connection.execute(table.delete().where(table.c.created_at < before, exists(superseded))).rowcount
+
+
+if __name__ == "__main__":
+    import sys
+    from datetime import timedelta
+    from app import app, db, ChangeEvent, region_engines
+
+    if sys.argv[1:] != ['compact']:
+        print("Usage: python changes.py compact")
+        sys.exit(1)
+
+    with app.app_context():
+        db.create_all()
+        before = datetime.utcnow() - timedelta(days=app.config['CHANGES_COMPACT_AFTER_DAYS'])
+        for name, engine in region_engines().items():
+            deleted = compact(engine, ChangeEvent, before)
+            print(f"{name}: compacted {deleted} superseded change event(s) from before {before:%Y-%m-%d}")
@@ -0,0 +1,120 @@
+from datetime import timedelta
+import os
+
+import querybudget
+import sharding
+
+
+def configure(app, overrides=None):
+    """Load settings from the environment, then apply `overrides` (e.g. in tests)"""
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-for-testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///cleanearth.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
+    app.config['JWT_BLACKLIST_ENABLED'] = True  # Enable JWT blacklist
+    app.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access']  # Check access tokens against blacklist
+    # Volunteer matching: seconds before the in-memory coordinate cache is reloaded,
+    # and how far back CampaignVolunteer rows count as "recent activity"
+    app.config['VOLUNTEER_INDEX_TTL'] = int(os.environ.get('VOLUNTEER_INDEX_TTL', 300))
+    app.config['VOLUNTEER_ACTIVITY_DAYS'] = int(os.environ.get('VOLUNTEER_ACTIVITY_DAYS', 90))
+    # Duplicate request detection: grid cell size in degrees (~550m), max distance
+    # between two reports of the same dump and minimum description similarity
+    app.config['DUPLICATE_CELL_DEG'] = float(os.environ.get('DUPLICATE_CELL_DEG', 0.005))
+    app.config['DUPLICATE_RADIUS_M'] = float(os.environ.get('DUPLICATE_RADIUS_M', 300))
+    app.config['DUPLICATE_MIN_SIMILARITY'] = float(os.environ.get('DUPLICATE_MIN_SIMILARITY', 0.4))
+    # Image uploads: content-addressed storage folder, size limit and thumbnails
+    app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(app.root_path, 'uploads'))
+    app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+    app.config['THUMBNAIL_SIZE'] = int(os.environ.get('THUMBNAIL_SIZE', 320))
+    app.config['THUMBNAIL_WORKERS'] = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+    # Admission control: per-route token buckets keyed by user id (or IP when
+    # anonymous), optionally shared through Redis, and a cap on requests in flight
+    app.config['RATE_LIMITS'] = {
+        'login': '10/minute',
+        'register': '5/minute',
+        'register_request': '20/minute',
+        'participate_camp': '30/minute',
+    }
+    app.config['RATELIMIT_STORAGE_URL'] = os.environ.get('RATELIMIT_STORAGE_URL')  # e.g. redis://localhost:6379/0
+    # Number of reverse proxies in front of the app that append to X-Forwarded-For
+    app.config['RATELIMIT_TRUST_PROXY'] = int(os.environ.get('RATELIMIT_TRUST_PROXY', 0))
+    app.config['MAX_CONCURRENT_REQUESTS'] = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 64))
+    app.config['CONCURRENCY_QUEUE_TIMEOUT'] = float(os.environ.get('CONCURRENCY_QUEUE_TIMEOUT', 0.5))
+    # Query time budgets (querybudget.py): seconds a request to these views may
+    # spend before its SQLite queries are interrupted and it gets a 503, keyed
+    # by view name like RATE_LIMITS. QUERY_BUDGETS="view=seconds,..." adds or
+    # overrides entries; QUERY_BUDGET_DEFAULT applies to every other view (0 for none)
+    app.config['QUERY_BUDGETS'] = {
+        'get_leaderboard': 2.0,
+        'get_impact_stats': 2.0,
+        'manage_campaign': 2.0,
+        'get_all_users': 2.0,
+        'get_duplicate_requests': 3.0,
+        'search_records': 2.0,
+        **querybudget.parse_budgets(os.environ.get('QUERY_BUDGETS', '')),
+    }
+    app.config['QUERY_BUDGET_DEFAULT'] = float(os.environ.get('QUERY_BUDGET_DEFAULT', 0))
+    # Idempotency-Key header on retried POSTs: how long responses are kept, how
+    # long a concurrent repeat waits for the first request, and after how long
+    # a claim left pending by a dead worker can be taken over
+    app.config['IDEMPOTENCY_TTL'] = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))
+    app.config['IDEMPOTENCY_WAIT'] = float(os.environ.get('IDEMPOTENCY_WAIT', 10))
+    app.config['IDEMPOTENCY_LOCK_TIMEOUT'] = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    # JSON encoder ('orjson' when installed, or 'std') and gzip/brotli compression
+    # of JSON responses of at least COMPRESS_MIN_SIZE bytes
+    app.config['JSON_ENCODER'] = os.environ.get('JSON_ENCODER', 'orjson')
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    app.config['COMPRESS_GZIP_LEVEL'] = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    # Map density tiles: binary responses up to TILE_BINARY_MAX_ZOOM, JSON above
+    app.config['TILE_BINARY_MAX_ZOOM'] = int(os.environ.get('TILE_BINARY_MAX_ZOOM', 8))
+    app.config['TILE_CACHE_SECONDS'] = int(os.environ.get('TILE_CACHE_SECONDS', 60))
+    # Archival (archive.py): completed requests and campaigns older than
+    # ARCHIVE_AFTER_DAYS move to the archive tables, ARCHIVE_BATCH_SIZE per transaction
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 200))
+    # Change feed (/api/changes): superseded events older than this are compacted away
+    app.config['CHANGES_COMPACT_AFTER_DAYS'] = int(os.environ.get('CHANGES_COMPACT_AFTER_DAYS', 30))
+    # Pincode gazetteer (gazetteer.py): centroids fill unset profile coordinates,
+    # and request coordinates must lie within GAZETTEER_MARGIN_KM of their pincode
+    app.config['PINCODE_GAZETTEER'] = os.environ.get('PINCODE_GAZETTEER', os.path.join(app.root_path, 'data', 'pincodes.npy'))
+    app.config['GAZETTEER_MARGIN_KM'] = float(os.environ.get('GAZETTEER_MARGIN_KM', 5))
+    # Triage priority (priority.py): reports within this distance count as one cluster
+    app.config['PRIORITY_CLUSTER_RADIUS_M'] = float(os.environ.get('PRIORITY_CLUSTER_RADIUS_M', 500))
+    # Day scheduler (scheduling.py): volunteers are matched to camps at most
+    # SCHEDULE_MAX_KM away, among their SCHEDULE_CANDIDATES nearest camps
+    app.config['SCHEDULE_MAX_KM'] = float(os.environ.get('SCHEDULE_MAX_KM', 15))
+    app.config['SCHEDULE_CANDIDATES'] = int(os.environ.get('SCHEDULE_CANDIDATES', 8))
+    # Bulk admin operations: most items one call changes
+    app.config['BULK_MAX_ITEMS'] = int(os.environ.get('BULK_MAX_ITEMS', 1000))
+    # Volunteer notifications (notify.py): SMTP server (printed to the log when
+    # unset), messages per recipient coalesced over NOTIFY_COALESCE_SECONDS,
+    # and a send rate limit per channel
+    app.config['SMTP_HOST'] = os.environ.get('SMTP_HOST')
+    app.config['SMTP_PORT'] = int(os.environ.get('SMTP_PORT', 25))
+    app.config['SMTP_USERNAME'] = os.environ.get('SMTP_USERNAME')
+    app.config['SMTP_PASSWORD'] = os.environ.get('SMTP_PASSWORD')
+    app.config['SMTP_STARTTLS'] = os.environ.get('SMTP_STARTTLS') == '1'
+    app.config['SMTP_POOL_SIZE'] = int(os.environ.get('SMTP_POOL_SIZE', 2))
+    app.config['NOTIFY_FROM'] = os.environ.get('NOTIFY_FROM', 'CleanEarth <noreply@cleanearth.local>')
+    app.config['NOTIFY_COALESCE_SECONDS'] = int(os.environ.get('NOTIFY_COALESCE_SECONDS', 300))
+    app.config['NOTIFY_BATCH_RECIPIENTS'] = int(os.environ.get('NOTIFY_BATCH_RECIPIENTS', 100))
+    app.config['NOTIFY_MAX_ATTEMPTS'] = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', 5))
+    app.config['NOTIFY_RATE_LIMITS'] = {'email': os.environ.get('NOTIFY_EMAIL_RATE', '300/minute')}
+    # Request trace capture for replay load tests (capture.py, replay.py): off
+    # unless TRACE_CAPTURE_PATH is set; TRACE_SALT keys the user pseudonyms
+    # (SECRET_KEY when unset)
+    app.config['TRACE_CAPTURE_PATH'] = os.environ.get('TRACE_CAPTURE_PATH')
+    app.config['TRACE_SAMPLE_RATE'] = float(os.environ.get('TRACE_SAMPLE_RATE', 1.0))
+    app.config['TRACE_SALT'] = os.environ.get('TRACE_SALT')
+    # Online backups (backup.py): snapshots under BACKUP_DIR, the newest
+    # BACKUP_RETENTION kept, gzipped unless BACKUP_COMPRESS=0
+    app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR', os.path.join(app.root_path, 'backups'))
+    app.config['BACKUP_RETENTION'] = int(os.environ.get('BACKUP_RETENTION', 7))
+    app.config['BACKUP_COMPRESS'] = os.environ.get('BACKUP_COMPRESS', '1') != '0'
+    # Optional region sharding of requests and campaigns by pincode prefix, e.g.
+    # "north=1,2:sqlite:///shard_north.db;south=5,6,*:sqlite:///shard_south.db" (see sharding.py)
+    app.config['SHARDS'] = sharding.parse_shards(os.environ.get('SHARDS', ''))
+    if overrides:
+        app.config.update(overrides)
@@ -0,0 +1,90 @@
+import math
+import re
+import zlib
+
+import numpy as np
+
+# MinHash parameters: NUM_BANDS * ROWS_PER_BAND permutations. Two descriptions
+# share at least one band key with probability ~0.94 at Jaccard 0.4, candidates
+# are then confirmed with an exact Jaccard check.
+NUM_BANDS = 16
+ROWS_PER_BAND = 2
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+SHINGLE_SIZE = 5
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(20241125)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+_non_word = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    return _non_word.sub(' ', (text or '').lower()).strip()
+
+
+def shingles(text, k=SHINGLE_SIZE):
+    """Character k-grams of the normalized text; short texts become one shingle."""
+    text = normalize(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(shingle_set):
+    """MinHash signature as a uint64 array of length NUM_PERM."""
+    if not shingle_set:
+        return np.zeros(NUM_PERM, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    # (a * h + b) mod p for every permutation at once; crc32 and a, b < 2**32 keep this below 2**64
+    permuted = (np.outer(hashes, _A) + _B) % np.uint64(_PRIME)
+    return permuted.min(axis=0)
+
+
+def band_hashes(signature):
+    """One short hash per LSH band of the signature."""
+    bands = signature.reshape(NUM_BANDS, ROWS_PER_BAND)
+    return ['%08x' % zlib.crc32(band.tobytes()) for band in bands]
+
+
+def geo_cell(latitude, longitude, cell_deg):
+    return int(math.floor(latitude / cell_deg)), int(math.floor(longitude / cell_deg))
+
+
+def neighbour_cells(latitude, longitude, cell_deg):
+    row, col = geo_cell(latitude, longitude, cell_deg)
+    return [(row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)]
+
+
+def index_keys(cell, bands):
+    """Index keys combine the spatial cell with each band hash."""
+    return ['%d:%d:%d:%s' % (cell[0], cell[1], i, band) for i, band in enumerate(bands)]
+
+
+def lookup_keys(latitude, longitude, description, cell_deg):
+    """
+    Keys to store for a request and keys to search for its candidates.
+    Returns (own_keys, search_keys).
+    """
+    bands = band_hashes(minhash(shingles(description)))
+    own_keys = index_keys(geo_cell(latitude, longitude, cell_deg), bands)
+    search_keys = []
+    for cell in neighbour_cells(latitude, longitude, cell_deg):
+        search_keys.extend(index_keys(cell, bands))
+    return own_keys, search_keys
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Haversine distance in metres between two points."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371008.8 * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,51 @@
+from flask import jsonify
+from flask_jwt_extended import JWTManager
+
+import sharding
+
+# Extensions are created unbound and attached to each app in create_app(),
+# so models and blueprints can import them without building an app.
+# Plain Flask-SQLAlchemy unless the app sets SHARDS.
+db = sharding.ShardedSQLAlchemy()
+jwt = JWTManager()
+
+# Initialize token blacklist set for storing revoked tokens
+jwt_blacklist = set()
+
+@jwt.token_in_blocklist_loader
+def check_if_token_in_blacklist(jwt_header, jwt_payload):
+    jti = jwt_payload["jti"]
+    return jti in jwt_blacklist
+
+# Simplify jwt error handling with standard decorators
+# Note: Newer versions have @jwt.jwt_error_loader but we'll use what's compatible
+
+# Add error handler for expired or invalid tokens
+@jwt.invalid_token_loader
+def invalid_token_callback(error):
+    print(f"Invalid token error: {error}")
+    return jsonify({
+        'error': 'Invalid token',
+        'message': str(error)
+    }), 401
+
+@jwt.expired_token_loader
+def expired_token_callback(jwt_header, jwt_payload):
+    return jsonify({
+        'error': 'Token has expired',
+        'message': 'Please log in again'
+    }), 401
+
+@jwt.unauthorized_loader
+def missing_token_callback(error):
+    return jsonify({
+        'error': 'Authorization required',
+        'message': str(error)
+    }), 401
+
+@jwt.revoked_token_loader
+def revoked_token_callback(jwt_header, jwt_payload):
+    return jsonify({
+        'error': 'Token has been revoked',
+        'message': 'Please log in again'
+    }), 401
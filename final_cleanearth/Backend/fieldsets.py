@@ -0,0 +1,58 @@
+from sqlalchemy.orm import load_only
+
+# Sparse fieldsets: ?fields=id,latitude,longitude limits both the JSON keys of
+# a response and the columns SELECTed for it. Models list the keys clients may
+# ask for in API_FIELDS; keys that aren't plain columns (e.g. a campaign's
+# volunteer_count) come with the columns and relationship loads they need.
+
+
+def parse_fields(raw, allowed):
+    """
+    Parse a comma separated ?fields= value. Returns None when absent (meaning
+    every field) or the requested fields in order. Raises ValueError for
+    fields not in `allowed`.
+    """
+    if not raw:
+        return None
+    fields = []
+    for field in raw.split(','):
+        field = field.strip()
+        if field and field not in fields:
+            fields.append(field)
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields or None
+
+
+def project(query, model, fields, loaders=None):
+    """
+    Restrict `query` to what serializing `fields` needs. `loaders` maps a
+    computed field to (extra columns, loader options). With fields=None every
+    column is loaded, but relationship loads are still batched instead of
+    issued per row.
+    """
+    loaders = loaders or {}
+    options = []
+    if fields is None:
+        for _, field_options in loaders.values():
+            options.extend(field_options)
+        return query.options(*options) if options else query
+
+    table_columns = model.__table__.columns
+    columns = [getattr(model, c.key) for c in model.__table__.primary_key.columns]
+    for field in fields:
+        if field in loaders:
+            extra_columns, field_options = loaders[field]
+            columns.extend(extra_columns)
+            options.extend(field_options)
+        elif field in table_columns:
+            columns.append(getattr(model, field))
+    return query.options(load_only(*columns), *options)
+
+
+def serialize(obj, fields):
+    """The full to_dict(), or only the requested keys without touching other columns"""
+    if fields is None:
+        return obj.to_dict()
+    return {field: getattr(obj, field) for field in fields}
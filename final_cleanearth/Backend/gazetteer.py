@@ -0,0 +1,170 @@
+import csv
+import math
+import os
+
+# Offline pincode gazetteer: centroid and bounding box of every pincode, used
+# to fill in profile coordinates that were never set and to check that a
+# request's coordinates lie in its pincode. The data file is a .npy array of
+# fixed-size records sorted by pincode, built once from a post office CSV
+# (`python gazetteer.py build`). It is opened with mmap_mode='r', so lookups
+# read pages from the OS page cache and every worker on the host shares them
+# instead of holding its own copy.
+
+RECORD_DTYPE = [
+    ('pincode', '<u4'),
+    ('lat', '<f4'), ('lon', '<f4'),
+    ('min_lat', '<f4'), ('max_lat', '<f4'),
+    ('min_lon', '<f4'), ('max_lon', '<f4'),
+]
+
+KM_PER_DEGREE = 111.32
+
+
+def pincode_key(pincode):
+    """Six digit pincode as an int, or None when it isn't one"""
+    pincode = str(pincode or '').replace(' ', '')
+    if len(pincode) != 6 or not pincode.isdigit():
+        return None
+    return int(pincode)
+
+
+def missing_location(latitude, longitude):
+    """Profiles default to (0.0, 0.0), which counts as "no location set" (as in matching.py)"""
+    return latitude is None or longitude is None or (latitude == 0.0 and longitude == 0.0)
+
+
+class Gazetteer:
+    """Read-only pincode lookups over a memory-mapped record array"""
+
+    def __init__(self, path):
+        import numpy as np
+        self.path = path
+        self.records = np.load(path, mmap_mode='r')
+        self._keys = self.records['pincode']
+
+    def __len__(self):
+        return len(self.records)
+
+    def _record(self, pincode):
+        key = pincode_key(pincode)
+        if key is None:
+            return None
+        index = int(self._keys.searchsorted(key))
+        if index < len(self._keys) and self._keys[index] == key:
+            return self.records[index]
+        return None
+
+    def centroid(self, pincode):
+        """(latitude, longitude) of a pincode, or None when unknown"""
+        record = self._record(pincode)
+        if record is None:
+            return None
+        # float32 holds ~1 m of precision; don't report digits beyond it
+        return (round(float(record['lat']), 5), round(float(record['lon']), 5))
+
+    def contains(self, pincode, latitude, longitude, margin_km=0.0):
+        """
+        Whether a point lies in the pincode's bounding box grown by margin_km.
+        None when the pincode is unknown, so callers can let it through.
+        """
+        record = self._record(pincode)
+        if record is None:
+            return None
+        margin_lat = margin_km / KM_PER_DEGREE
+        margin_lon = margin_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        return bool(record['min_lat'] - margin_lat <= latitude <= record['max_lat'] + margin_lat
+                    and record['min_lon'] - margin_lon <= longitude <= record['max_lon'] + margin_lon)
+
+
+def open_gazetteer(path):
+    """The gazetteer at `path`, or None when the data file hasn't been built"""
+    if not path or not os.path.exists(path):
+        return None
+    return Gazetteer(path)
+
+
+def build(csv_path, out_path):
+    """
+    Build the data file from a CSV with pincode, latitude and longitude
+    columns (e.g. the India Post "All India Pincode Directory", one row per
+    post office). Each pincode gets the mean of its offices as centroid and
+    their extent as bounding box. Returns the number of pincodes written.
+    """
+    import numpy as np
+    offices = {}
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        columns = {name.strip().lower(): name for name in reader.fieldnames or []}
+        if not {'pincode', 'latitude', 'longitude'} <= set(columns):
+            raise ValueError("CSV needs pincode, latitude and longitude columns")
+        for row in reader:
+            key = pincode_key(row[columns['pincode']])
+            try:
+                latitude = float(row[columns['latitude']])
+                longitude = float(row[columns['longitude']])
+            except (TypeError, ValueError):
+                continue
+            if key is None or missing_location(latitude, longitude) or abs(latitude) > 90 or abs(longitude) > 180:
+                continue
+            offices.setdefault(key, []).append((latitude, longitude))
+
+    records = np.zeros(len(offices), dtype=RECORD_DTYPE)
+    for i, key in enumerate(sorted(offices)):
+        points = np.array(offices[key])
+        lats, lons = points[:, 0], points[:, 1]
+        records[i] = (key, lats.mean(), lons.mean(), lats.min(), lats.max(), lons.min(), lons.max())
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    # Write next to the target and rename, so running workers never map a half-written file
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, records)
+    os.replace(tmp_path, out_path)
+    return len(records)
+
+
+def backfill_users(session, User, gazetteer, batch_size=500):
+    """
+    Set the coordinates of users who never set them to their pincode's
+    centroid, committing every batch. Returns (filled, left without a known pincode).
+    """
+    filled = skipped = 0
+    last_id = 0
+    while True:
+        users = session.query(User).filter(
+            User.id > last_id,
+            ((User.latitude == 0.0) & (User.longitude == 0.0)) | User.latitude.is_(None) | User.longitude.is_(None)
+        ).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        for user in users:
+            centroid = gazetteer.centroid(user.pincode)
+            if centroid:
+                user.latitude, user.longitude = centroid
+                filled += 1
+            else:
+                skipped += 1
+        last_id = users[-1].id
+        session.commit()
+    return filled, skipped
+
+
+if __name__ == "__main__":
+    import sys
+    from app import app, db, User
+
+    if sys.argv[1:2] == ['build'] and len(sys.argv) == 3:
+        with app.app_context():
+            out_path = app.config['PINCODE_GAZETTEER']
+        count = build(sys.argv[2], out_path)
+        print(f"Wrote {count} pincode(s) to {out_path}")
+    elif sys.argv[1:] == ['backfill']:
+        with app.app_context():
+            gazetteer = open_gazetteer(app.config['PINCODE_GAZETTEER'])
+            if gazetteer is None:
+                print(f"No gazetteer at {app.config['PINCODE_GAZETTEER']}; run `python gazetteer.py build <csv>` first")
+                sys.exit(1)
+            filled, skipped = backfill_users(db.session, User, gazetteer)
+        print(f"Filled coordinates of {filled} user(s); {skipped} have no known pincode")
+    else:
+        print("Usage: python gazetteer.py build <pincodes.csv> | backfill")
+        sys.exit(1)
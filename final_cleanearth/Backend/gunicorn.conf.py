@@ -0,0 +1,17 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+# Load the app in the master before forking so workers share its memory
+# pages and start serving immediately
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Pooled connections opened in the master must not be shared with workers
+    from app import reset_after_fork
+    reset_after_fork(worker.app.wsgi())
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+# Idempotency keys for POST endpoints that clients retry. The first request
+# with a key claims a row (status 'pending'), runs, then stores its response
+# in the row; repeats of the key within the TTL get that response back from
+# one primary key lookup instead of running again. A repeat that arrives while
+# the first request is still running waits for its response. The
+# IdempotencyKey model lives in models.py; functions here take it and an
+# engine, and use their own short transactions so a claim is visible to other
+# workers at once.
+
+PENDING = 'pending'
+DONE = 'done'
+
+StoredResponse = namedtuple('StoredResponse', 'status fingerprint status_code content_type body')
+
+
+def fingerprint(view_args, body):
+    """Hash of the URL arguments and body, to reject a key reused for a different request"""
+    digest = hashlib.sha256(json.dumps(view_args or {}, sort_keys=True, default=str).encode())
+    digest.update(b'\0')
+    digest.update(body or b'')
+    return digest.hexdigest()
+
+
+def lookup(engine, Key, scope, key, now=None):
+    """The live row for a key as a StoredResponse, or None"""
+    table = Key.__table__
+    with engine.connect() as connection:
+        row = connection.execute(
+            table.select().where(table.c.scope == scope, table.c.key == key, table.c.expires_at > (now or datetime.utcnow()))
+        ).mappings().first()
+    if row is None:
+        return None
+    return StoredResponse(row['status'], row['fingerprint'], row['status_code'], row['content_type'], row['body'])
+
+
+def claim(engine, Key, scope, key, request_fingerprint, ttl, lock_timeout, now=None):
+    """
+    Try to become the request that runs for this key. Expired rows, and
+    claims left pending for lock_timeout seconds by a worker that died, are
+    taken over. Returns True when claimed.
+    """
+    table = Key.__table__
+    now = now or datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(table.delete().where(
+            table.c.scope == scope,
+            table.c.key == key,
+            (table.c.expires_at <= now) | (
+                (table.c.status == PENDING) & (table.c.created_at <= now - timedelta(seconds=lock_timeout)))
+        ))
+    try:
+        with engine.begin() as connection:
+            connection.execute(table.insert().values(
+                scope=scope,
+                key=key,
+                fingerprint=request_fingerprint,
+                status=PENDING,
+                created_at=now,
+                expires_at=now + timedelta(seconds=ttl)
+            ))
+    except IntegrityError:
+        return False
+    return True
+
+
+def complete(engine, Key, scope, key, status_code, content_type, body):
+    """Store the response of a claimed key"""
+    table = Key.__table__
+    with engine.begin() as connection:
+        connection.execute(table.update().where(table.c.scope == scope, table.c.key == key).values(
+            status=DONE, status_code=status_code, content_type=content_type, body=body))
+
+
+def release(engine, Key, scope, key):
+    """Drop a claim whose request failed, so a retry runs again"""
+    table = Key.__table__
+    with engine.begin() as connection:
+        connection.execute(table.delete().where(table.c.scope == scope, table.c.key == key, table.c.status == PENDING))
+
+
+def wait_for(engine, Key, scope, key, timeout, interval=0.05):
+    """
+    Poll until the request holding a key stores its response. Returns the
+    stored response, or None on timeout or when the claim was released.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        stored = lookup(engine, Key, scope, key)
+        if stored is None or stored.status == DONE:
+            return stored
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(interval)
+        interval = min(interval * 2, 0.5)
+
+
+def purge_expired(engine, Key, now=None):
+    """Delete expired keys. Returns the number of rows deleted"""
+    table = Key.__table__
+    with engine.begin() as connection:
+        return connection.execute(table.delete().where(table.c.expires_at <= (now or datetime.utcnow()))).rowcount
+
+
+if __name__ == "__main__":
+    import sys
+    from app import app, db, IdempotencyKey
+
+    if sys.argv[1:] != ['purge']:
+        print("Usage: python idempotency.py purge")
+        sys.exit(1)
+
+    with app.app_context():
+        db.create_all()
+        deleted = purge_expired(db.engine, IdempotencyKey)
+    print(f"Deleted {deleted} expired idempotency key(s)")
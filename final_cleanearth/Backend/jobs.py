@@ -0,0 +1,172 @@
+import json
+import random
+import traceback
+from datetime import datetime, timedelta
+
+# Durable background jobs. The Job model lives in models.py; this module holds the
+# handler registry and the claim/run/retry logic used by worker.py.
+
+JOB_HANDLERS = {}
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_CAP_SECONDS = 3600
+# A running job whose worker hasn't finished it in this long is assumed dead
+LOCK_TIMEOUT_SECONDS = 600
+
+
+def job_handler(kind):
+    """Register a function as the handler for a job kind: handler(payload)"""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def backoff_seconds(attempts, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_CAP_SECONDS):
+    """Exponential backoff with jitter for the given number of failed attempts"""
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def enqueue(session, Job, kind, payload=None, key=None, delay=0, max_attempts=5):
+    """
+    Add a job to the session without committing, so it is stored in the same
+    transaction as the write that caused it. A job with the same key is only
+    queued once; the existing job is returned instead.
+    """
+    if key:
+        existing = session.query(Job).filter_by(key=key).first()
+        if existing:
+            return existing
+        # Also catch a job with the same key added earlier in this transaction
+        for pending in session.new:
+            if isinstance(pending, Job) and pending.key == key:
+                return pending
+    job = Job(
+        kind=kind,
+        key=key,
+        payload=json.dumps(payload or {}),
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    session.add(job)
+    return job
+
+
+def enqueue_many(session, Job, kind, items, max_attempts=5):
+    """
+    Queue jobs of one kind for a bulk write: one lookup of the existing keys
+    and one batched INSERT at flush. `items` are (payload, key) pairs; keys
+    already queued are skipped. Does not commit. Returns the new Job rows.
+    """
+    keys = [key for _, key in items if key]
+    seen = {row[0] for row in session.query(Job.key).filter(Job.key.in_(keys))} if keys else set()
+    now = datetime.utcnow()
+    new_jobs = []
+    for payload, key in items:
+        if key:
+            if key in seen:
+                continue
+            seen.add(key)
+        new_jobs.append(Job(
+            kind=kind,
+            key=key,
+            payload=json.dumps(payload or {}),
+            status='queued',
+            attempts=0,
+            max_attempts=max_attempts,
+            run_at=now
+        ))
+    session.add_all(new_jobs)
+    return new_jobs
+
+
+def claim_next(session, Job, worker_id):
+    """
+    Atomically claim the next due job for this worker. The conditional UPDATE
+    only succeeds for one worker even if several pick the same candidate.
+    Returns the claimed job or None.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+    due = session.query(Job.id).filter(
+        ((Job.status == 'queued') & (Job.run_at <= now)) |
+        ((Job.status == 'running') & (Job.locked_at < stale))
+    ).order_by(Job.run_at, Job.id).limit(5).all()
+
+    for (job_id,) in due:
+        claimed = session.query(Job).filter(
+            Job.id == job_id,
+            ((Job.status == 'queued') | ((Job.status == 'running') & (Job.locked_at < stale)))
+        ).update({
+            Job.status: 'running',
+            Job.locked_by: worker_id,
+            Job.locked_at: now,
+            Job.attempts: Job.attempts + 1
+        }, synchronize_session=False)
+        session.commit()
+        if claimed:
+            return session.query(Job).get(job_id)
+    return None
+
+
+def settle(session, job, lock, values):
+    """
+    Store a job's outcome, and commit it with the handler's writes still in
+    the session, with an UPDATE that only matches while `lock` (the
+    (locked_by, locked_at) of our claim) still holds the job. Returns False,
+    discarding the writes, when the job was reclaimed or cancelled meanwhile.
+    """
+    Job = type(job)
+    locked_by, locked_at = lock
+    updated = session.query(Job).filter(
+        Job.id == job.id,
+        Job.status == 'running',
+        Job.locked_by == locked_by,
+        Job.locked_at == locked_at
+    ).update(values, synchronize_session=False)
+    if not updated:
+        session.rollback()
+        print(f"Job {job.id} ({job.kind}) is no longer held by {locked_by}, its outcome was discarded")
+        return False
+    session.commit()
+    return True
+
+
+def run(session, job):
+    """
+    Run a claimed job and record success, a scheduled retry or failure.
+    Handlers leave their writes uncommitted: they are committed together
+    with status 'done', so a job that is run again (its worker died, or it
+    was reclaimed after LOCK_TIMEOUT_SECONDS) never applies them twice. A
+    handler may add to its payload dict, e.g. to record what it applied;
+    the payload is stored with the outcome.
+    """
+    handler = JOB_HANDLERS.get(job.kind)
+    Job = type(job)
+    lock = (job.locked_by, job.locked_at)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job.kind}'")
+        payload = json.loads(job.payload or '{}')
+        handler(payload)
+        return settle(session, job, lock, {
+            Job.payload: json.dumps(payload),
+            Job.status: 'done',
+            Job.finished_at: datetime.utcnow(),
+            Job.last_error: None
+        })
+    except Exception:
+        session.rollback()
+        error = traceback.format_exc(limit=5)
+        print(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}: {error.splitlines()[-1]}")
+        values = {Job.last_error: error[-2000:], Job.locked_by: None}
+        if job.attempts >= job.max_attempts:
+            values.update({Job.status: 'failed', Job.finished_at: datetime.utcnow()})
+        else:
+            values.update({Job.status: 'queued',
+                           Job.run_at: datetime.utcnow() + timedelta(seconds=backoff_seconds(job.attempts))})
+        settle(session, job, lock, values)
+        return False
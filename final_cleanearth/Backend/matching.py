@@ -0,0 +1,142 @@
+import threading
+import time
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lon, lats, lons):
+    """
+    Great-circle distance in km from one point to arrays of points.
+    All coordinates are in degrees; lats/lons may be numpy arrays.
+    """
+    lat1 = np.radians(lat)
+    lon1 = np.radians(lon)
+    lat2 = np.radians(lats)
+    lon2 = np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def has_location(lat, lon):
+    """Profiles default to (0.0, 0.0), which we treat as "no location set"."""
+    return lat is not None and lon is not None and not (lat == 0.0 and lon == 0.0)
+
+
+class VolunteerLocator:
+    """
+    In-memory cache of volunteer coordinates kept as parallel numpy arrays
+    so a campaign can be ranked against every volunteer in one vectorized pass.
+
+    The cache is filled lazily from a loader callable returning
+    (id, latitude, longitude) rows, patched in place on profile updates and
+    fully reloaded after `ttl` seconds to pick up writes from other workers.
+    """
+
+    def __init__(self, loader, ttl=300):
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._lats = np.empty(0, dtype=np.float64)
+        self._lons = np.empty(0, dtype=np.float64)
+        self._active = np.empty(0, dtype=bool)
+        self._positions = {}
+
+    def __len__(self):
+        return int(self._active.sum())
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self._ttl:
+            return
+        rows = [r for r in self._loader() if has_location(r[1], r[2])]
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        lats = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+        lons = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        self._ids, self._lats, self._lons = ids, lats, lons
+        self._active = np.ones(len(rows), dtype=bool)
+        self._positions = {int(v): i for i, v in enumerate(ids)}
+        self._loaded_at = time.monotonic()
+
+    def upsert(self, volunteer_id, lat, lon):
+        """Add or move a volunteer; a missing location removes them instead."""
+        if not has_location(lat, lon):
+            self.remove(volunteer_id)
+            return
+        with self._lock:
+            if self._loaded_at is None:
+                # Nothing cached yet, the next query loads fresh rows anyway
+                return
+            # Copy on write: rank() reads the arrays and positions it took
+            # under the lock after releasing it, so they are never changed
+            pos = self._positions.get(int(volunteer_id))
+            if pos is None:
+                positions = dict(self._positions)
+                positions[int(volunteer_id)] = len(self._ids)
+                self._ids = np.append(self._ids, np.int64(volunteer_id))
+                self._lats = np.append(self._lats, float(lat))
+                self._lons = np.append(self._lons, float(lon))
+                self._active = np.append(self._active, True)
+                self._positions = positions
+            else:
+                lats, lons = self._lats.copy(), self._lons.copy()
+                lats[pos] = float(lat)
+                lons[pos] = float(lon)
+                self._lats, self._lons = lats, lons
+                self._active[pos] = True
+
+    def remove(self, volunteer_id):
+        with self._lock:
+            pos = self._positions.get(int(volunteer_id))
+            if pos is not None:
+                self._active[pos] = False
+
+    def rank(self, lat, lon, exclude=(), activity=None, activity_weight=0.5, max_km=None, limit=20):
+        """
+        Rank cached volunteers around (lat, lon).
+
+        `activity` maps volunteer id -> recent participation count; each
+        recent camp shrinks the effective distance by `activity_weight`.
+        Returns a list of (volunteer_id, distance_km, score) sorted by score.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            ids, lats, lons, active = self._ids, self._lats, self._lons, self._active.copy()
+            positions = self._positions
+
+        if len(ids) == 0:
+            return []
+
+        for volunteer_id in exclude:
+            pos = positions.get(int(volunteer_id))
+            if pos is not None:
+                active[pos] = False
+
+        distances = haversine_km(lat, lon, lats, lons)
+        if max_km is not None:
+            active &= distances <= max_km
+
+        scores = distances
+        if activity:
+            # Only volunteers with recent camps are touched, the rest stay at 0
+            recent = np.zeros(len(ids), dtype=np.float64)
+            for volunteer_id, count in activity.items():
+                pos = positions.get(int(volunteer_id))
+                if pos is not None:
+                    recent[pos] = count
+            scores = distances / (1.0 + activity_weight * recent)
+
+        candidates = np.flatnonzero(active)
+        if len(candidates) == 0:
+            return []
+        if limit is not None and len(candidates) > limit:
+            top = np.argpartition(scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        order = candidates[np.argsort(scores[candidates], kind='stable')]
+        return [(int(ids[i]), float(distances[i]), float(scores[i])) for i in order]
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Content-addressed image storage. Uploads are streamed to disk in chunks while
+# being hashed, then renamed to <root>/<ab>/<cd>/<sha256>.<ext>, so the same
+# photo uploaded twice is stored once. Thumbnails are generated in a process
+# pool next to the original as <sha256>.thumb.jpg.
+
+CHUNK_SIZE = 64 * 1024
+
+# Magic bytes -> (extension, content type)
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', ('jpg', 'image/jpeg')),
+    (b'\x89PNG\r\n\x1a\n', ('png', 'image/png')),
+    (b'GIF87a', ('gif', 'image/gif')),
+    (b'GIF89a', ('gif', 'image/gif')),
+]
+
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+
+
+class UploadError(ValueError):
+    """Raised for uploads that are too large or not a supported image"""
+
+
+def sniff_image(head):
+    """Detect the image type from the first bytes. Returns (ext, content_type) or None."""
+    for signature, kind in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return None
+
+
+class MediaStore:
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, digest, ext):
+        return os.path.join(self.root, digest[:2], digest[2:4], f'{digest}.{ext}')
+
+    def thumbnail_path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], f'{digest}.thumb.jpg')
+
+    def save_stream(self, stream, max_bytes):
+        """
+        Copy a file-like stream to storage without holding it in memory.
+        Returns (digest, ext, content_type, size, created) where created is
+        False if the same content was already stored.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadError(f'File is larger than {max_bytes} bytes')
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            kind = sniff_image(head)
+            if not kind:
+                raise UploadError('Only JPEG, PNG, GIF and WebP images are supported')
+            ext, content_type = kind
+
+            hexdigest = digest.hexdigest()
+            final_path = self.path_for(hexdigest, ext)
+            created = not os.path.exists(final_path)
+            if created:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+            else:
+                os.remove(tmp_path)
+            return hexdigest, ext, content_type, size, created
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def make_thumbnail(source, target, size):
+    """Runs in a worker process. Writes a JPEG thumbnail at most size x size."""
+    from PIL import Image
+
+    # A temporary file of its own, as another process may be writing the same thumbnail
+    fd, tmp_target = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out, Image.open(source) as img:
+            img.thumbnail((size, size))
+            img.convert('RGB').save(out, 'JPEG', quality=80, optimize=True)
+        os.replace(tmp_target, target)
+    except BaseException:
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+        raise
+    return target
+
+
+# A failed thumbnail isn't tried again by this process for this long
+THUMBNAIL_RETRY_SECONDS = 600
+
+_executor = None
+# target -> future of the thumbnails being generated by this process
+_scheduled = {}
+# target -> time.monotonic() of its last failure
+_failed = {}
+
+
+def thumbnail_executor(workers, replace_broken=False):
+    global _executor
+    if replace_broken and _executor is not None:
+        # A worker process died (e.g. a crash in Pillow); the pool takes no new work
+        _executor.shutdown(wait=False)
+        _executor = None
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def schedule_thumbnail(source, target, size, workers=2):
+    """
+    Generate a thumbnail in the background; failures are only logged. A
+    target that is still being generated, or failed in the last
+    THUMBNAIL_RETRY_SECONDS, isn't scheduled again by this process.
+    """
+    now = time.monotonic()
+    for failed_target, failed_at in list(_failed.items()):
+        if now - failed_at >= THUMBNAIL_RETRY_SECONDS:
+            _failed.pop(failed_target, None)
+    if target in _failed:
+        return None
+    scheduled = _scheduled.get(target)
+    if scheduled is not None:
+        return scheduled
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Pillow is not installed, skipping thumbnail generation")
+        return None
+
+    try:
+        future = thumbnail_executor(workers).submit(make_thumbnail, source, target, size)
+    except BrokenProcessPool:
+        future = thumbnail_executor(workers, replace_broken=True).submit(make_thumbnail, source, target, size)
+    _scheduled[target] = future
+
+    def finished(f):
+        _scheduled.pop(target, None)
+        if f.exception():
+            _failed[target] = time.monotonic()
+            print(f"Thumbnail generation failed for {source}: {f.exception()}")
+
+    future.add_done_callback(finished)
+    return future
@@ -0,0 +1,103 @@
+import re
+
+from sqlalchemy import text
+
+import sharding
+
+# Waste quantities reported when a campaign is completed. Free text such as
+# "about 25 kg" or "1.5 tonnes" is parsed into (quantity, unit), and weights are
+# normalised to kg so they can be summed in the impact rollups.
+
+UNIT_ALIASES = {
+    'kg': 'kg', 'kgs': 'kg', 'kilo': 'kg', 'kilos': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'g': 'g', 'gm': 'g', 'gms': 'g', 'gram': 'g', 'grams': 'g',
+    't': 'tonne', 'ton': 'tonne', 'tons': 'tonne', 'tonne': 'tonne', 'tonnes': 'tonne',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'bag': 'bags', 'bags': 'bags', 'sack': 'bags', 'sacks': 'bags',
+}
+
+KG_PER_UNIT = {'kg': 1.0, 'g': 0.001, 'tonne': 1000.0, 'lb': 0.45359237}
+
+_quantity = re.compile(r'(\d+(?:[.,]\d+)*)\s*([a-zA-Z]+)?')
+
+
+def normalize_unit(unit):
+    if not unit:
+        return None
+    return UNIT_ALIASES.get(unit.strip().lower().rstrip('.'))
+
+
+def parse_waste(value):
+    """
+    Parse free text like "25kg", "about 1.5 tonnes of plastic" or "30 bags".
+    Returns (quantity, unit) or (None, None) if no quantity is found. A bare
+    number is taken to be kg; unrecognised units are kept as written.
+    """
+    if not value:
+        return None, None
+    for match in _quantity.finditer(str(value)):
+        number, unit = match.groups()
+        # "2,500" is a thousands separator, "2,5" a decimal comma
+        if ',' in number and '.' not in number and len(number.split(',')[-1]) != 3:
+            number = number.replace(',', '.')
+        try:
+            quantity = float(number.replace(',', ''))
+        except ValueError:
+            continue
+        if not unit:
+            return quantity, 'kg'
+        return quantity, normalize_unit(unit) or unit.lower()[:10]
+    return None, None
+
+
+def to_kg(quantity, unit):
+    """Weight in kg, or None for units that aren't weights (e.g. bags)"""
+    if quantity is None:
+        return None
+    factor = KG_PER_UNIT.get(unit)
+    return quantity * factor if factor is not None else None
+
+
+# Daily per-pincode rollups of completed campaigns. The campaign_completed job
+# adds each campaign once; rebuild_rollups recomputes everything in one pass.
+
+ROLLUP_SELECT = """
+    SELECT DATE(COALESCE(c.completed_at, c.date)), COALESCE(r.pincode, ''),
+           COUNT(*), SUM(COALESCE(c.actual_participants, 0)), SUM(COALESCE(c.waste_kg, 0))
+    FROM (
+        SELECT request_id, completed_at, date, actual_participants, waste_kg FROM campaign WHERE status = 'completed'
+        UNION ALL
+        SELECT request_id, completed_at, date, actual_participants, waste_kg FROM archived_campaign
+    ) c LEFT JOIN (
+        SELECT id, pincode FROM request UNION ALL SELECT id, pincode FROM archived_request
+    ) r ON r.id = c.request_id
+    GROUP BY DATE(COALESCE(c.completed_at, c.date)), COALESCE(r.pincode, '')"""
+
+ROLLUP_COLUMNS = "impact_rollup (day, pincode, campaigns_completed, participants, waste_kg)"
+
+
+def rebuild_rollups(connection, region_engines=None):
+    """
+    Recompute every rollup row from the campaign and archived_campaign tables.
+    With sharding, `region_engines` hold those tables: each region is
+    aggregated on its own and the sums are written through `connection` to
+    the global database. Returns the row count.
+    """
+    connection.execute(text("DELETE FROM impact_rollup"))
+    if region_engines is None:
+        return connection.execute(text(f"INSERT INTO {ROLLUP_COLUMNS} {ROLLUP_SELECT}")).rowcount
+
+    # Campaigns without a request (pincode '') can be in any region
+    totals = {}
+    for region in sharding.each_region(connection, region_engines):
+        for day, pincode, campaigns, participants, waste_kg in region.execute(text(ROLLUP_SELECT)):
+            total = totals.setdefault((day, pincode), [0, 0, 0.0])
+            total[0] += campaigns
+            total[1] += participants or 0
+            total[2] += waste_kg or 0.0
+    rows = [{'day': day, 'pincode': pincode, 'campaigns': t[0], 'participants': t[1], 'waste_kg': t[2]}
+            for (day, pincode), t in totals.items()]
+    if rows:
+        connection.execute(text(
+            f"INSERT INTO {ROLLUP_COLUMNS} VALUES (:day, :pincode, :campaigns, :participants, :waste_kg)"), rows)
+    return len(rows)
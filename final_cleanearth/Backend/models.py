@@ -0,0 +1,455 @@
+from datetime import datetime
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from extensions import db
+
+# Database Models
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(100), unique=True, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+    role = db.Column(db.String(20), default='user')  # user, volunteer, admin
+    address = db.Column(db.String(255))
+    pincode = db.Column(db.String(10))
+    latitude = db.Column(db.Float, default=0.0)
+    longitude = db.Column(db.Float, default=0.0)
+    is_blocked = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    requests = db.relationship('Request', backref='user', lazy=True)
+    
+    # Keys clients can pick with ?fields= (never the password hash)
+    API_FIELDS = ('id', 'name', 'email', 'role', 'address', 'pincode', 'latitude', 'longitude', 'is_blocked', 'created_at')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'email': self.email,
+            'role': self.role,
+            'address': self.address,
+            'pincode': self.pincode,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'is_blocked': self.is_blocked,
+            'created_at': self.created_at
+        }
+
+class Request(db.Model):
+    # The admin triage queue reads pending requests in priority order (see priority.py)
+    __table_args__ = (
+        db.Index('ix_request_triage', 'status', 'priority'),
+        db.Index('ix_request_triage_pincode', 'status', 'pincode', 'priority'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(100), nullable=False)
+    pincode = db.Column(db.String(10), nullable=False, index=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    address = db.Column(db.String(255))
+    link = db.Column(db.String(255))
+    status = db.Column(db.String(20), default='pending')  # pending, in-progress, completed
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Canonical request this one was reported as a duplicate of
+    duplicate_of = db.Column(db.Integer, db.ForeignKey('request.id'), index=True)
+    # Triage score and the counts behind it, kept current by priority.py
+    priority = db.Column(db.Float, default=0.0)
+    duplicate_count = db.Column(db.Integer, default=0)
+    cluster_size = db.Column(db.Integer, default=0)
+    
+    SHARD_BY = 'pincode'
+    API_FIELDS = ('id', 'email', 'pincode', 'latitude', 'longitude', 'description', 'address', 'link',
+                  'status', 'user_id', 'created_at', 'duplicate_of')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'pincode': self.pincode,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'description': self.description,
+            'address': self.address,
+            'link': self.link,
+            'status': self.status,
+            'user_id': self.user_id,
+            'created_at': self.created_at,
+            'duplicate_of': self.duplicate_of
+        }
+
+class RequestSignature(db.Model):
+    # Spatial cell + MinHash band keys used to find duplicate requests by index
+    id = db.Column(db.Integer, primary_key=True)
+    request_id = db.Column(db.Integer, db.ForeignKey('request.id'), nullable=False, index=True)
+    key = db.Column(db.String(64), nullable=False, index=True)
+    
+    request = db.relationship('Request')
+    
+    SHARD_BY = 'request'
+
+class Campaign(db.Model):
+    # Discovery (/api/campaigns/search) filters by status and walks dates in (date, id) order
+    __table_args__ = (db.Index('ix_campaign_status_date', 'status', 'date', 'id'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100))
+    request_id = db.Column(db.Integer, db.ForeignKey('request.id'), index=True)
+    date = db.Column(db.Date, nullable=False)
+    num_volunteers = db.Column(db.Integer, default=0)
+    timing = db.Column(db.String(50))
+    description = db.Column(db.Text)
+    status = db.Column(db.String(20), default='planned')  # planned, in-progress, completed
+    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Completion details
+    actual_participants = db.Column(db.Integer, default=0)
+    waste_collected = db.Column(db.String(255))
+    waste_quantity = db.Column(db.Float)
+    waste_unit = db.Column(db.String(10))  # kg, g, tonne, lb, bags
+    waste_kg = db.Column(db.Float)  # waste_quantity normalised to kg when the unit is a weight
+    image_link = db.Column(db.String(255))
+    completion_notes = db.Column(db.Text)
+    completed_at = db.Column(db.DateTime)
+
+    request = db.relationship('Request', backref='campaigns')
+    creator = db.relationship('User')
+    volunteers = db.relationship('CampaignVolunteer', backref='campaign', lazy=True)
+    
+    SHARD_BY = 'request'
+    API_FIELDS = ('id', 'name', 'request_id', 'date', 'num_volunteers', 'timing', 'description', 'status',
+                  'creator_id', 'volunteer_count', 'created_at', 'actual_participants', 'waste_collected',
+                  'waste_quantity', 'waste_unit', 'waste_kg', 'image_link', 'completion_notes', 'completed_at',
+                  'location')
+    
+    @property
+    def volunteer_count(self):
+        return len(self.volunteers)
+    
+    @property
+    def location(self):
+        return self.request.address if self.request else None
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'request_id': self.request_id,
+            'date': self.date,
+            'num_volunteers': self.num_volunteers,
+            'timing': self.timing,
+            'description': self.description,
+            'status': self.status,
+            'creator_id': self.creator_id,
+            'volunteer_count': self.volunteer_count,
+            'created_at': self.created_at,
+            'actual_participants': self.actual_participants,
+            'waste_collected': self.waste_collected,
+            'waste_quantity': self.waste_quantity,
+            'waste_unit': self.waste_unit,
+            'waste_kg': self.waste_kg,
+            'image_link': self.image_link,
+            'completion_notes': self.completion_notes,
+            'completed_at': self.completed_at,
+            'location': self.location
+        }
+
+class CampaignVolunteer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), index=True)
+    volunteer_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    status = db.Column(db.String(20), default='joined')  # joined, confirmed, declined
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    volunteer = db.relationship('User')
+    
+    SHARD_BY = 'campaign'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'campaign_id': self.campaign_id,
+            'volunteer_id': self.volunteer_id,
+            'volunteer_name': self.volunteer.name,
+            'status': self.status,
+            'joined_at': self.joined_at
+        }
+
+# Archive tables: completed rows moved out of the hot tables by archive.py,
+# with the same columns plus archived_at. Reads by id fall back to them.
+class ArchivedRequest(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    email = db.Column(db.String(100), nullable=False)
+    pincode = db.Column(db.String(10), nullable=False, index=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    address = db.Column(db.String(255))
+    link = db.Column(db.String(255))
+    status = db.Column(db.String(20))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime)
+    duplicate_of = db.Column(db.Integer)
+    priority = db.Column(db.Float)
+    duplicate_count = db.Column(db.Integer)
+    cluster_size = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime)
+    
+    SHARD_BY = 'pincode'
+    API_FIELDS = Request.API_FIELDS
+    
+    to_dict = Request.to_dict
+
+class ArchivedCampaign(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100))
+    request_id = db.Column(db.Integer, db.ForeignKey('archived_request.id'), index=True)
+    date = db.Column(db.Date, nullable=False)
+    num_volunteers = db.Column(db.Integer)
+    timing = db.Column(db.String(50))
+    description = db.Column(db.Text)
+    status = db.Column(db.String(20))
+    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime)
+    actual_participants = db.Column(db.Integer)
+    waste_collected = db.Column(db.String(255))
+    waste_quantity = db.Column(db.Float)
+    waste_unit = db.Column(db.String(10))
+    waste_kg = db.Column(db.Float)
+    image_link = db.Column(db.String(255))
+    completion_notes = db.Column(db.Text)
+    completed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime)
+    
+    request = db.relationship('ArchivedRequest')
+    creator = db.relationship('User')
+    volunteers = db.relationship('ArchivedCampaignVolunteer', backref='campaign', lazy=True)
+    
+    SHARD_BY = 'request'
+    API_FIELDS = Campaign.API_FIELDS
+    
+    volunteer_count = Campaign.volunteer_count
+    location = Campaign.location
+    to_dict = Campaign.to_dict
+
+class ArchivedCampaignVolunteer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('archived_campaign.id'), index=True)
+    volunteer_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    status = db.Column(db.String(20))
+    joined_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime)
+    
+    volunteer = db.relationship('User')
+    
+    SHARD_BY = 'campaign'
+    
+    to_dict = CampaignVolunteer.to_dict
+
+class Badge(db.Model):
+    # One automatic badge per rule per user; manually awarded badges have no rule
+    __table_args__ = (db.UniqueConstraint('user_id', 'rule', name='ux_badge_user_rule'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.String(255))
+    icon = db.Column(db.String(100))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    rule = db.Column(db.String(50))  # key of the badge rule that awarded it, see badges.py
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = db.relationship('User', backref='badges')
+    
+    API_FIELDS = ('id', 'name', 'description', 'icon', 'user_id', 'rule', 'created_at')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'icon': self.icon,
+            'user_id': self.user_id,
+            'rule': self.rule,
+            'created_at': self.created_at
+        }
+
+class ImpactRollup(db.Model):
+    # Completed campaigns aggregated per day and pincode, read by /api/stats
+    __table_args__ = (db.Index('ix_impact_rollup_pincode_day', 'pincode', 'day'),)
+    
+    day = db.Column(db.Date, primary_key=True)
+    pincode = db.Column(db.String(10), primary_key=True)
+    campaigns_completed = db.Column(db.Integer, default=0, nullable=False)
+    participants = db.Column(db.Integer, default=0, nullable=False)
+    waste_kg = db.Column(db.Float, default=0.0, nullable=False)
+
+class MediaAsset(db.Model):
+    # Uploaded image, stored on disk under its sha256
+    sha256 = db.Column(db.String(64), primary_key=True)
+    ext = db.Column(db.String(10), nullable=False)
+    content_type = db.Column(db.String(50), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def filename(self):
+        return f'{self.sha256}.{self.ext}'
+    
+    def to_dict(self):
+        return {
+            'sha256': self.sha256,
+            'content_type': self.content_type,
+            'size': self.size,
+            'url': f'/api/media/{self.filename}',
+            'thumbnail_url': f'/api/media/{self.filename}?size=thumb',
+            'created_at': self.created_at
+        }
+
+class UserCounter(db.Model):
+    # Per-user activity counters that drive automatic badges
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    counter = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+
+class RequestTile(db.Model):
+    # Request counts per status on the multi-resolution map grid (see tiles.py)
+    zoom = db.Column(db.Integer, primary_key=True)
+    x = db.Column(db.Integer, primary_key=True)
+    y = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+class Job(db.Model):
+    # Durable background job, drained by worker.py
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(100), unique=True)  # idempotency key, one job per key
+    payload = db.Column(db.Text)
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=5)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'key': self.key,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at,
+            'last_error': self.last_error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+class IdempotencyKey(db.Model):
+    # First response of a POST sent with an Idempotency-Key header (see idempotency.py)
+    scope = db.Column(db.String(150), primary_key=True)  # view name and client
+    key = db.Column(db.String(100), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, done
+    status_code = db.Column(db.Integer)
+    content_type = db.Column(db.String(100))
+    body = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class ChangeEvent(db.Model):
+    # Append-only feed of request, campaign and participation changes (see changes.py)
+    __table_args__ = (
+        db.Index('ix_change_event_pincode_id', 'pincode', 'id'),
+        db.Index('ix_change_event_entity', 'entity', 'entity_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # request, campaign, participation
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(20), nullable=False)  # created, updated, status_changed, completed, deleted, joined, left
+    pincode = db.Column(db.String(10), nullable=False, default='')
+    data = db.Column(db.Text)  # JSON of the row's to_dict(), null for deletions
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    SHARD_BY = 'pincode'
+
+class Notification(db.Model):
+    # Per recipient notification outbox, filled by fan-out jobs and drained by delivery jobs (see notify.py)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'kind', 'entity_id', 'entity_created_at', 'channel', name='ux_notification_item'),
+        db.Index('ix_notification_channel_status_user', 'channel', 'status', 'user_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    channel = db.Column(db.String(20), nullable=False, default='email')
+    kind = db.Column(db.String(30), nullable=False)  # request_created, campaign_scheduled
+    entity_id = db.Column(db.Integer, nullable=False)
+    # The item's created_at: SQLite gives a new item the id of a deleted newest one
+    entity_created_at = db.Column(db.DateTime)
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed, dropped
+    batch = db.Column(db.String(32), index=True)  # delivery batch that claimed it
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+
+class VolunteerProposal(db.Model):
+    # A camp proposed to a volunteer by the day scheduler (see scheduling.py).
+    # campaign_id has no foreign key, as campaigns may live in a region database
+    __table_args__ = (
+        db.UniqueConstraint('volunteer_id', 'campaign_id', name='ux_volunteer_proposal'),
+        db.Index('ix_volunteer_proposal_volunteer_status', 'volunteer_id', 'status'),
+        db.Index('ix_volunteer_proposal_date_status', 'date', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    volunteer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    campaign_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)  # the campaign's day
+    distance_km = db.Column(db.Float)
+    status = db.Column(db.String(20), default='proposed')  # proposed, accepted, declined
+    run = db.Column(db.String(32))  # scheduler run that wrote it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    responded_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'volunteer_id': self.volunteer_id,
+            'campaign_id': self.campaign_id,
+            'date': self.date,
+            'distance_km': round(self.distance_km, 2) if self.distance_km is not None else None,
+            'status': self.status,
+            'created_at': self.created_at,
+            'responded_at': self.responded_at
+        }
+
+# Columns and relationship loads behind the computed to_dict() keys, so
+# ?fields= projections and full lists load them in batches, not per row
+FIELD_LOADERS = {
+    Campaign: {
+        'volunteer_count': ([], [selectinload(Campaign.volunteers).load_only(CampaignVolunteer.id)]),
+        'location': ([Campaign.request_id], [joinedload(Campaign.request).load_only(Request.address)]),
+    },
+    ArchivedCampaign: {
+        'volunteer_count': ([], [selectinload(ArchivedCampaign.volunteers).load_only(ArchivedCampaignVolunteer.id)]),
+        'location': ([ArchivedCampaign.request_id], [joinedload(ArchivedCampaign.request).load_only(ArchivedRequest.address)]),
+    },
+}
+
+# Archive table of each hot model that archive.py moves rows out of
+ARCHIVE_MODELS = {Request: ArchivedRequest, Campaign: ArchivedCampaign}
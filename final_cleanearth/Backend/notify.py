@@ -0,0 +1,215 @@
+import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from queue import Empty, LifoQueue
+
+from sqlalchemy import and_, exists, insert, literal, select
+
+import ratelimit
+
+# Notifications to volunteers about new requests and camps in their pincode.
+#
+# The write that causes a notification queues a job in its own transaction
+# (the job table is the transactional outbox), so nothing is sent for a
+# rolled back write and nothing slow runs in the request. The fan-out job
+# resolves every recipient with one INSERT ... SELECT into the notification
+# table, one pending row per recipient and item. Delivery jobs then claim
+# pending rows a batch of recipients at a time, coalesce each recipient's
+# rows into one digest message, and send them over pooled SMTP connections
+# at no more than the channel's rate limit. The Notification model lives in
+# models.py; functions here take it and a session.
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+DROPPED = 'dropped'  # the item was gone by delivery time
+
+# A batch left in SENDING this long belongs to a worker that died
+CLAIM_TIMEOUT_SECONDS = 600
+
+
+def fan_out(session, Notification, User, kind, entity_id, entity_created_at, pincode, exclude_user_id=None,
+            channel='email'):
+    """
+    Queue a notification about an item for every active volunteer in its
+    pincode, with one INSERT ... SELECT. An item is identified by its id and
+    created_at, as a deleted item's id can be handed out again. Recipients
+    that already have this notification are skipped, so a retried job doesn't
+    notify twice. Returns the number of notifications queued.
+    """
+    user = User.__table__
+    table = Notification.__table__
+    already = exists().where(and_(
+        table.c.user_id == user.c.id,
+        table.c.kind == kind,
+        table.c.entity_id == entity_id,
+        table.c.entity_created_at == entity_created_at,
+        table.c.channel == channel
+    ))
+    recipients = select(
+        user.c.id, literal(channel), literal(kind), literal(entity_id), literal(entity_created_at), literal(PENDING),
+        literal(0), literal(datetime.utcnow())
+    ).where(
+        user.c.role == 'volunteer',
+        user.c.pincode == pincode,
+        user.c.is_blocked.isnot(True),
+        user.c.email.isnot(None),
+        ~already
+    )
+    if exclude_user_id is not None:
+        recipients = recipients.where(user.c.id != exclude_user_id)
+    statement = insert(table).from_select(
+        ['user_id', 'channel', 'kind', 'entity_id', 'entity_created_at', 'status', 'attempts', 'created_at'], recipients)
+    return session.execute(statement).rowcount
+
+
+def claim_batch(session, Notification, channel, max_recipients):
+    """
+    Claim the pending notifications of up to `max_recipients` recipients in
+    one conditional UPDATE, so concurrent delivery jobs never claim the same
+    rows. Commits the claim. Returns (batch id, claimed rows).
+    """
+    stale = datetime.utcnow() - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)
+    claimable = (Notification.status == PENDING) | (
+        (Notification.status == SENDING) & (Notification.claimed_at < stale))
+    recipients = [row[0] for row in session.query(Notification.user_id).filter(
+        Notification.channel == channel, claimable
+    ).distinct().order_by(Notification.user_id).limit(max_recipients)]
+    if not recipients:
+        return None, []
+
+    batch = uuid.uuid4().hex
+    session.query(Notification).filter(
+        Notification.channel == channel, Notification.user_id.in_(recipients), claimable
+    ).update({
+        Notification.status: SENDING,
+        Notification.batch: batch,
+        Notification.claimed_at: datetime.utcnow()
+    }, synchronize_session=False)
+    session.commit()
+    rows = session.query(Notification).filter_by(batch=batch).order_by(Notification.user_id, Notification.id).all()
+    return batch, rows
+
+
+def group_by_recipient(rows):
+    """{user_id: [notification rows]} in claim order"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.user_id, []).append(row)
+    return groups
+
+
+def digest(name, lines):
+    """(subject, body) of one recipient's coalesced message"""
+    if len(lines) == 1:
+        subject = lines[0]
+    else:
+        subject = f"{len(lines)} new clean-up updates near you"
+    body = f"Hi {name or 'there'},\n\n" + "\n".join(f"- {line}" for line in lines)
+    body += "\n\nOpen CleanEarth to see the details and join in.\n"
+    return subject, body
+
+
+class SmtpPool:
+    """
+    A small pool of open SMTP connections shared by the worker threads of a
+    process. A connection is taken for a whole batch and returned afterwards;
+    one the server has dropped is reopened once.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=False, size=2, timeout=30):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._idle = LifoQueue(maxsize=size)
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            return self._connect()
+
+    def _release(self, connection):
+        if self._idle.full():
+            connection.quit()
+        else:
+            self._idle.put_nowait(connection)
+
+    def send(self, messages, on_sent=None):
+        """Send EmailMessages over one pooled connection, calling on_sent(message) after each"""
+        connection = self._acquire()
+        try:
+            for message in messages:
+                try:
+                    connection.send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    connection = self._connect()
+                    connection.send_message(message)
+                if on_sent:
+                    on_sent(message)
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+            raise
+        self._release(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().quit()
+            except Empty:
+                return
+            except Exception:
+                pass
+
+
+class ConsoleSender:
+    """Prints messages instead of sending them, when no SMTP server is configured"""
+
+    def send(self, messages, on_sent=None):
+        for message in messages:
+            print(f"Notification to {message['To']}: {message['Subject']}")
+            if on_sent:
+                on_sent(message)
+
+
+class ChannelLimiter:
+    """Per channel token bucket shared by the worker threads of a process"""
+
+    def __init__(self, limits):
+        self._limits = {channel: ratelimit.parse_limit(limit) for channel, limit in limits.items()}
+        self._buckets = ratelimit.LocalBuckets()
+
+    def wait(self, channel):
+        """Block until the channel may send one more message"""
+        if channel not in self._limits:
+            return
+        rate, burst = self._limits[channel]
+        while True:
+            allowed, retry_after = self._buckets.take(channel, rate, burst)
+            if allowed:
+                return
+            time.sleep(retry_after)
+
+
+def build_message(sender, to, subject, body):
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(body)
+    return message
@@ -0,0 +1,162 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import case, func
+
+import spatial
+
+# Triage priority of requests, stored in request.priority so the admin queue
+# is an indexed top-K read. The score adds up:
+#   - DUPLICATE_WEIGHT per duplicate report linked to the request (capped),
+#   - CLUSTER_WEIGHT per other report within the cluster radius (capped),
+#   - NO_CAMPAIGN_WEIGHT while no campaign has been organised for it,
+#   - URGENT_WEIGHT when the description mentions a sensitive place or a
+#     large or hazardous dump,
+#   - AGE_WEIGHT per day it has been waiting.
+# The age term is stored as -AGE_WEIGHT * (days from EPOCH to creation).
+# Every request ages at the same rate, so ordering by the stored value is
+# ordering by the full score at any moment, and the column never needs an
+# age refresh; effective() adds the current age back for display. The other
+# terms change only on events (a new report nearby, a duplicate linked, a
+# campaign organised), which update the column incrementally.
+
+EPOCH = datetime(2020, 1, 1)
+
+AGE_WEIGHT = 1.0  # per day waiting
+DUPLICATE_WEIGHT = 5.0
+DUPLICATE_CAP = 10
+CLUSTER_WEIGHT = 2.0
+CLUSTER_CAP = 10
+NO_CAMPAIGN_WEIGHT = 10.0
+URGENT_WEIGHT = 15.0
+
+URGENT_TERMS = (
+    'school', 'college', 'hospital', 'clinic', 'anganwadi', 'playground', 'park', 'temple', 'market',
+    'huge', 'large', 'overflowing', 'burning', 'fire', 'smoke', 'toxic', 'chemical', 'medical',
+    'syringe', 'sewage', 'dead animal', 'carcass',
+)
+_URGENT_PATTERN = re.compile(r'\b(' + '|'.join(re.escape(term) for term in URGENT_TERMS) + r')', re.IGNORECASE)
+
+
+def days_since_epoch(moment):
+    return (moment - EPOCH).total_seconds() / 86400
+
+
+def is_urgent(description):
+    return bool(_URGENT_PATTERN.search(description or ''))
+
+
+def score(created_at, duplicate_count, cluster_size, has_campaign, urgent):
+    """Stored priority of a request"""
+    return (
+        DUPLICATE_WEIGHT * min(duplicate_count or 0, DUPLICATE_CAP)
+        + CLUSTER_WEIGHT * min(cluster_size or 0, CLUSTER_CAP)
+        + (0.0 if has_campaign else NO_CAMPAIGN_WEIGHT)
+        + (URGENT_WEIGHT if urgent else 0.0)
+        - AGE_WEIGHT * days_since_epoch(created_at or datetime.utcnow())
+    )
+
+
+def effective(priority, now=None):
+    """Full score, age included, of a stored priority"""
+    return priority + AGE_WEIGHT * days_since_epoch(now or datetime.utcnow())
+
+
+def neighbours_query(session, Request, latitude, longitude, radius_m):
+    """Ids of requests within radius_m of a point (a lat/lon box, then the exact distance)"""
+    radius_km = radius_m / 1000
+    min_lat, max_lat, min_lon, max_lon = spatial.radius_box(latitude, longitude, radius_km)
+    return session.query(Request.id).filter(
+        Request.latitude.between(min_lat, max_lat),
+        Request.longitude.between(min_lon, max_lon),
+        spatial.squared_distance_km(Request.latitude, Request.longitude, latitude, longitude) <= radius_km ** 2
+    )
+
+
+def increment(session, Request, column, cap, weight, ids):
+    """
+    Add one to a count column of the given requests and raise their priority
+    by `weight` where the count is still under its cap, in one UPDATE
+    """
+    if not ids:
+        return
+    # Both SET expressions read the row as it was before the UPDATE
+    session.query(Request).filter(Request.id.in_(ids)).update({
+        Request.priority: Request.priority + case((column < cap, weight), else_=0.0),
+        column: column + 1
+    }, synchronize_session=False)
+
+
+def add_request(session, Request, waste_request, radius_m):
+    """
+    Score a freshly flushed request and count it into the scores of the
+    request it duplicates and of the reports around it
+    """
+    neighbour_ids = [row[0] for row in neighbours_query(
+        session, Request, waste_request.latitude, waste_request.longitude, radius_m
+    ).filter(Request.id != waste_request.id)]
+    waste_request.duplicate_count = 0
+    waste_request.cluster_size = len(neighbour_ids)
+    waste_request.priority = score(waste_request.created_at, 0, len(neighbour_ids), False,
+                                   is_urgent(waste_request.description))
+    session.flush()
+    increment(session, Request, Request.cluster_size, CLUSTER_CAP, CLUSTER_WEIGHT, neighbour_ids)
+    if waste_request.duplicate_of:
+        increment(session, Request, Request.duplicate_count, DUPLICATE_CAP, DUPLICATE_WEIGHT,
+                  [waste_request.duplicate_of])
+
+
+def refresh(session, Request, Campaign, requests, radius_m):
+    """
+    Recompute every term of the given loaded requests: duplicates and
+    campaigns with one grouped query each, the cluster with one count per
+    request. Does not commit.
+    """
+    if not requests:
+        return
+    ids = [r.id for r in requests]
+    duplicates = {}
+    # Summed, as sharded storage returns one group per region
+    for canonical_id, count in session.query(Request.duplicate_of, func.count(Request.id)).filter(
+            Request.duplicate_of.in_(ids)).group_by(Request.duplicate_of):
+        duplicates[canonical_id] = duplicates.get(canonical_id, 0) + count
+    with_campaign = {row[0] for row in session.query(Campaign.request_id).filter(Campaign.request_id.in_(ids))}
+    for waste_request in requests:
+        cluster = neighbours_query(
+            session, Request, waste_request.latitude, waste_request.longitude, radius_m
+        ).filter(Request.id != waste_request.id).count()
+        waste_request.duplicate_count = duplicates.get(waste_request.id, 0)
+        waste_request.cluster_size = cluster
+        waste_request.priority = score(waste_request.created_at, waste_request.duplicate_count, cluster,
+                                       waste_request.id in with_campaign, is_urgent(waste_request.description))
+
+
+def rebuild(session, Request, Campaign, radius_m, batch_size=500):
+    """Recompute the priority of every request, committing every batch. Returns the count"""
+    count = 0
+    last_id = 0
+    while True:
+        batch = session.query(Request).filter(Request.id > last_id).order_by(Request.id).limit(batch_size).all()
+        # Sharded storage returns each region's batch in turn
+        batch = sorted(batch, key=lambda r: r.id)[:batch_size]
+        if not batch:
+            break
+        refresh(session, Request, Campaign, batch, radius_m)
+        count += len(batch)
+        last_id = batch[-1].id
+        session.commit()
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+    from app import app, db, Request, Campaign
+
+    if sys.argv[1:] != ['rebuild']:
+        print("Usage: python priority.py rebuild")
+        sys.exit(1)
+
+    with app.app_context():
+        db.create_all()
+        count = rebuild(db.session, Request, Campaign, app.config['PRIORITY_CLUSTER_RADIUS_M'])
+    print(f"Recomputed the priority of {count} request(s)")
@@ -0,0 +1,93 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request time budgets enforced inside SQLite. A request with a budget
+# gets a QueryBudget holding its deadline; while it runs, every SQLite
+# connection it executes on has a progress handler that SQLite calls every
+# PROGRESS_INTERVAL virtual machine instructions, including while rows are
+# being fetched. Once the deadline passes the handler returns non-zero,
+# SQLite abandons the statement with "interrupted", and the error is raised
+# as QueryBudgetExceeded carrying the statement that was cut off. Other
+# databases are left alone (use their own statement timeout).
+
+PROGRESS_INTERVAL = 2000
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, budget):
+        super().__init__(f"Query budget of {budget.seconds}s exceeded")
+        self.budget = budget
+
+
+class QueryBudget:
+    def __init__(self, seconds, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.deadline = clock() + seconds
+        self.statement = None  # last statement started
+        self.exceeded_statement = None
+
+    @property
+    def exceeded(self):
+        return self.exceeded_statement is not None
+
+    def check(self):
+        """Progress handler: non-zero interrupts the running statement"""
+        if self.clock() < self.deadline:
+            return 0
+        if self.exceeded_statement is None:
+            self.exceeded_statement = self.statement
+        return 1
+
+
+def parse_budgets(spec):
+    """"get_leaderboard=2,manage_campaign=1.5" -> {'get_leaderboard': 2.0, 'manage_campaign': 1.5}"""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        route, _, seconds = item.partition('=')
+        try:
+            budgets[route.strip()] = float(seconds)
+        except ValueError:
+            raise ValueError(f"Invalid query budget: {item!r}")
+    return budgets
+
+
+_current_budget = None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if conn.dialect.name != 'sqlite':
+        return
+    budget = _current_budget()
+    if budget is None:
+        # A pooled connection may still carry the handler of an earlier request
+        cursor.connection.set_progress_handler(None, 0)
+        return
+    budget.statement = statement
+    cursor.connection.set_progress_handler(budget.check, PROGRESS_INTERVAL)
+
+
+def _handle_error(context):
+    budget = _current_budget()
+    if budget is not None and budget.exceeded:
+        return QueryBudgetExceeded(budget)
+
+
+def _checkin(dbapi_connection, connection_record):
+    if hasattr(dbapi_connection, 'set_progress_handler'):
+        dbapi_connection.set_progress_handler(None, 0)
+
+
+def install(current_budget):
+    """
+    Enforce budgets on every engine. `current_budget()` returns the budget of
+    the running request, or None outside requests and for unbudgeted routes.
+    """
+    global _current_budget
+    _current_budget = current_budget
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        event.listen(Engine, 'checkin', _checkin)
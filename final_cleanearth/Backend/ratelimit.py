@@ -0,0 +1,137 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Admission control: token buckets per (route, user or IP) and a global cap on
+# requests in flight. Buckets live in process memory by default; set a Redis
+# URL to share them between workers and hosts.
+
+UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# After a Redis error, use the local buckets this long before trying Redis again
+REDIS_RETRY_SECONDS = 5
+
+
+def parse_limit(limit):
+    """
+    "10/minute" -> (rate in tokens per second, burst). The burst is the full
+    count, so a client may use its whole allowance at once then has to wait.
+    """
+    count, _, unit = limit.partition('/')
+    count = int(count)
+    seconds = UNITS[unit.strip().rstrip('s')]
+    return count / seconds, count
+
+
+class LocalBuckets:
+    """Token buckets in this process, least recently used keys evicted first"""
+
+    def __init__(self, max_keys=100000):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key, rate, burst, now=None):
+        """Take one token. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                allowed, retry_after = True, 0.0
+            else:
+                allowed, retry_after = False, (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisBuckets:
+    """
+    Token buckets shared through Redis (needs the optional `redis` package).
+    Each take is one atomic script call. If Redis is unreachable the local
+    buckets are used so an outage doesn't take the API down with it, and
+    Redis isn't tried again for `retry_seconds`, so requests don't each wait
+    for the socket timeout.
+    """
+
+    def __init__(self, url, prefix='ratelimit:', retry_seconds=REDIS_RETRY_SECONDS):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.1)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+        self._prefix = prefix
+        self._fallback = LocalBuckets()
+        self._retry_seconds = retry_seconds
+        self._down_until = 0.0
+
+    def take(self, key, rate, burst, now=None):
+        if time.monotonic() < self._down_until:
+            return self._fallback.take(key, rate, burst)
+        now = time.time() if now is None else now
+        try:
+            allowed, retry_after = self._script(keys=[self._prefix + key], args=[rate, burst, now])
+            return bool(allowed), float(retry_after)
+        except Exception as e:
+            self._down_until = time.monotonic() + self._retry_seconds
+            print(f"Rate limit backend error, using local buckets for {self._retry_seconds}s: {str(e)}")
+            return self._fallback.take(key, rate, burst)
+
+
+class RateLimiter:
+    def __init__(self, limits, backend):
+        # route -> (rate, burst)
+        self.limits = {route: parse_limit(limit) for route, limit in limits.items()}
+        self.backend = backend
+
+    def check(self, route, client_key):
+        """Returns None if allowed, otherwise the whole seconds to wait."""
+        limit = self.limits.get(route)
+        if not limit:
+            return None
+        rate, burst = limit
+        allowed, retry_after = self.backend.take(f'{route}:{client_key}', rate, burst)
+        return None if allowed else max(1, math.ceil(retry_after))
+
+
+class ConcurrencyLimiter:
+    """
+    Caps requests in flight in this process. A request waits at most
+    `queue_timeout` seconds for a slot and is shed otherwise, so an overloaded
+    worker answers fast with 503 instead of letting latency pile up.
+    """
+
+    def __init__(self, max_concurrent, queue_timeout):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._queue_timeout = queue_timeout
+
+    def acquire(self):
+        return self._slots.acquire(timeout=self._queue_timeout)
+
+    def release(self):
+        self._slots.release()
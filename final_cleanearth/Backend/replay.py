@@ -0,0 +1,214 @@
+"""
+Replay captured request traces against a running instance and report
+latency percentiles and error rates per endpoint.
+
+Traces come from the capture middleware (TRACE_CAPTURE_PATH, see
+capture.py). `run` re-sends them with their original spacing divided by
+--speed (0 sends as fast as the workers allow) from --concurrency threads.
+Captured users are mapped onto local accounts of the same role, picked by
+pseudonym, and get tokens signed with the local JWT_SECRET_KEY, so run it
+with the target's environment (DATABASE_URL, JWT_SECRET_KEY) and against a
+copy of the data, never production: replayed writes are real writes.
+`stats` summarises the latencies recorded at capture time for comparison.
+
+    python replay.py stats traces.jsonl
+    python replay.py run traces.jsonl --target http://127.0.0.1:5000 --speed 4 --concurrency 32
+"""
+import argparse
+import http.client
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from capture import read_traces
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarise(results, elapsed):
+    """
+    Per endpoint and overall statistics from (endpoint, status, ms) tuples.
+    Status 0 is a request that got no response. Errors are 5xx and no
+    response; 4xx (including 429 from rate limits) are counted separately.
+    """
+    groups = {}
+    for endpoint, status, ms in results:
+        groups.setdefault(endpoint or '-', []).append((status, ms))
+        groups.setdefault('TOTAL', []).append((status, ms))
+    summary = {}
+    for endpoint, items in groups.items():
+        latencies = sorted(ms for _, ms in items)
+        errors = sum(1 for status, _ in items if status == 0 or status >= 500)
+        summary[endpoint] = {
+            'count': len(items),
+            'rps': len(items) / elapsed if elapsed else 0.0,
+            'client_errors': sum(1 for status, _ in items if 400 <= status < 500),
+            'errors': errors,
+            'error_rate': errors / len(items),
+            **{f'p{p}': percentile(latencies, p) for p in PERCENTILES},
+            'max': latencies[-1],
+        }
+    return summary
+
+
+def print_summary(summary, title):
+    print(title)
+    print(f"  {'endpoint':<30} {'count':>7} {'rps':>7} {'4xx':>5} {'err%':>6}"
+          + ''.join(f" {f'p{p}':>8}" for p in PERCENTILES) + f" {'max':>8}")
+    rows = sorted(summary.items(), key=lambda item: (item[0] == 'TOTAL', -item[1]['count']))
+    for endpoint, s in rows:
+        print(f"  {endpoint[:30]:<30} {s['count']:>7} {s['rps']:>7.1f} {s['client_errors']:>5} "
+              f"{s['error_rate'] * 100:>5.1f}%" + ''.join(f" {s[f'p{p}']:>8.1f}" for p in PERCENTILES)
+              + f" {s['max']:>8.1f}")
+    print("  (latencies in ms)")
+
+
+def local_tokens(traces):
+    """
+    Bearer token per captured pseudonym: each is mapped to a local user of
+    the same role, spread evenly by its hash. Pseudonyms whose role has no
+    local user replay without a token.
+    """
+    from flask_jwt_extended import create_access_token
+    from app import app, User
+
+    wanted = {(t['user'], t.get('role')) for t in traces if t.get('user')}
+    tokens = {}
+    with app.app_context():
+        by_role = {}
+        for user_id, email, role in User.query.with_entities(User.id, User.email, User.role).order_by(User.id):
+            by_role.setdefault(role, []).append((user_id, email, role))
+        for user, role in wanted:
+            candidates = by_role.get(role or 'user')
+            if not candidates:
+                continue
+            user_id, email, role = candidates[int(user, 16) % len(candidates)]
+            tokens[user] = create_access_token(
+                identity=str(user_id), additional_claims={'user_email': email, 'user_role': role})
+    return tokens
+
+
+class Replayer:
+    """Sends traces over one keep-alive connection per worker thread"""
+
+    def __init__(self, target, tokens, timeout):
+        parts = urlsplit(target)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.tokens = tokens
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self.connection_class(self.netloc, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def send(self, trace):
+        """(endpoint, status, ms) for one replayed request"""
+        path = trace['path']
+        if trace.get('args'):
+            path += '?' + urlencode(trace['args'], doseq=True)
+        headers = {'Accept-Encoding': 'gzip'}
+        body = None
+        if trace.get('body') is not None:
+            body = json.dumps(trace['body'])
+            headers['Content-Type'] = 'application/json'
+        token = self.tokens.get(trace.get('user'))
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        started = time.perf_counter()
+        try:
+            connection = self._connection()
+            connection.request(trace['method'], path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self._local.connection = None
+            status = 0
+        return trace['endpoint'], status, (time.perf_counter() - started) * 1000
+
+
+def run(traces, replayer, speed, concurrency):
+    """Replay on schedule; returns (results, elapsed seconds, schedule lag in ms per request)"""
+    results, lags = [], []
+    first = traces[0]['ts']
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+
+        def timed(trace, due):
+            lags.append((time.perf_counter() - due) * 1000)
+            results.append(replayer.send(trace))
+
+        for trace in traces:
+            due = start + ((trace['ts'] - first) / speed if speed else 0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(timed, trace, due)
+    return results, time.perf_counter() - start, sorted(lags)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('command', choices=['stats', 'run'])
+    parser.add_argument('traces')
+    parser.add_argument('--target', default='http://127.0.0.1:5000')
+    parser.add_argument('--speed', type=float, default=1.0, help='time compression; 0 for no pacing')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--endpoint', action='append', help='only replay these view names')
+    parser.add_argument('--limit', type=int, help='replay at most this many traces')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+
+    traces = read_traces(args.traces)
+    if args.endpoint:
+        traces = [t for t in traces if t['endpoint'] in args.endpoint]
+    if args.limit:
+        traces = traces[:args.limit]
+    if not traces:
+        print("No traces to replay")
+        sys.exit(1)
+    captured_seconds = traces[-1]['ts'] - traces[0]['ts']
+
+    if args.command == 'stats':
+        summary = summarise([(t['endpoint'], t['status'], t['ms']) for t in traces], captured_seconds)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_summary(summary, f"Captured: {len(traces)} requests over {captured_seconds:.0f}s")
+        sys.exit(0)
+
+    uploads = [t for t in traces if t.get('upload')]
+    traces = [t for t in traces if not t.get('upload')]
+    replayer = Replayer(args.target, local_tokens(traces), args.timeout)
+    results, elapsed, lags = run(traces, replayer, args.speed, args.concurrency)
+    summary = summarise(results, elapsed)
+    if args.json:
+        print(json.dumps({'summary': summary, 'elapsed': elapsed, 'skipped_uploads': len(uploads),
+                          'lag_p99_ms': percentile(lags, 99)}, indent=2))
+    else:
+        speed = f"{args.speed:g}x" if args.speed else "unpaced"
+        print_summary(summary, f"Replayed {len(results)} requests in {elapsed:.1f}s ({speed}, "
+                               f"{args.concurrency} workers; captured span {captured_seconds:.0f}s)")
+        if uploads:
+            print(f"  skipped {len(uploads)} upload(s), which are not captured")
+        # A late start means the client, not the server, was the bottleneck
+        print(f"  schedule lag p50 {percentile(lags, 50):.1f} ms, p99 {percentile(lags, 99):.1f} ms")
@@ -0,0 +1,213 @@
+import numpy as np
+
+from matching import haversine_km, has_location
+
+# Assignment of volunteers to the camps of one day, all camps at once.
+#
+# This is a min-cost flow: every volunteer supplies one unit, every camp
+# takes up to its open spots, and an edge costs the travel distance. Edges
+# only join a volunteer to its CANDIDATES_PER_VOLUNTEER nearest camps within
+# max_km, found through volunteers sorted by latitude, so the graph stays
+# sparse. The solver fills as many spots as the graph allows and, among
+# those assignments, has the least total distance.
+#
+# It runs successive shortest paths on the residual graph compressed to the
+# camps: an augmenting path starts with a free volunteer joining a camp,
+# moves volunteers from camp to camp, and ends at a camp with an open spot.
+# The cheapest move from camp a to camp b is the least d(v, b) - d(v, a)
+# over the volunteers v at a, kept in a dense camps x camps matrix whose
+# rows are refreshed when a camp's volunteers change. Dijkstra with node
+# potentials finds each path, stopping as soon as an open spot is settled;
+# every camp it settles costs one vectorized pass over the camps, however
+# many volunteers there are.
+
+CANDIDATES_PER_VOLUNTEER = 8
+
+
+def candidate_graph(volunteer_lats, volunteer_lons, camp_lats, camp_lons, max_km,
+                    per_volunteer=CANDIDATES_PER_VOLUNTEER, excluded=()):
+    """
+    Edges between volunteers and camps within max_km, at most `per_volunteer`
+    nearest camps per volunteer. `excluded` holds (volunteer index, camp
+    index) pairs to leave out. Returns (volunteer index, camp index, km)
+    arrays sorted by volunteer, then distance.
+    """
+    volunteer_lats = np.asarray(volunteer_lats, dtype=np.float64)
+    volunteer_lons = np.asarray(volunteer_lons, dtype=np.float64)
+    order = np.argsort(volunteer_lats, kind='stable')
+    sorted_lats = volunteer_lats[order]
+    lat_margin = max_km / 110.574
+
+    volunteers, camps, distances = [], [], []
+    for camp, (lat, lon) in enumerate(zip(camp_lats, camp_lons)):
+        start, end = np.searchsorted(sorted_lats, [lat - lat_margin, lat + lat_margin], side='left')
+        nearby = order[start:end]
+        if len(nearby) == 0:
+            continue
+        km = haversine_km(lat, lon, volunteer_lats[nearby], volunteer_lons[nearby])
+        within = km <= max_km
+        volunteers.append(nearby[within])
+        camps.append(np.full(int(within.sum()), camp, dtype=np.int64))
+        distances.append(km[within])
+    if not volunteers:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float64)
+    volunteers = np.concatenate(volunteers)
+    camps = np.concatenate(camps)
+    distances = np.concatenate(distances)
+
+    if excluded:
+        excluded_keys = np.array([v * len(camp_lats) + c for v, c in excluded], dtype=np.int64)
+        keep = ~np.isin(volunteers * len(camp_lats) + camps, excluded_keys)
+        volunteers, camps, distances = volunteers[keep], camps[keep], distances[keep]
+
+    # Nearest camps first within each volunteer, then the first per_volunteer of each
+    by_volunteer = np.lexsort((distances, volunteers))
+    volunteers, camps, distances = volunteers[by_volunteer], camps[by_volunteer], distances[by_volunteer]
+    first = np.searchsorted(volunteers, volunteers, side='left')
+    keep = np.arange(len(volunteers)) - first < per_volunteer
+    return volunteers[keep], camps[keep], distances[keep]
+
+
+def assign(n_volunteers, capacity, volunteers, camps, distances):
+    """
+    Min-cost max-flow assignment over a candidate graph. `capacity` is the
+    open spots per camp. Returns the camp index of every volunteer, -1 for
+    the unassigned.
+    """
+    capacity = np.asarray(capacity, dtype=np.int64)
+    n_camps = len(capacity)
+    assigned = np.full(n_volunteers, -1, dtype=np.int64)
+    if n_camps == 0 or len(volunteers) == 0:
+        return assigned
+
+    # Each volunteer's candidate camps and distances (dense rows padded with inf)
+    starts = np.searchsorted(volunteers, np.arange(n_volunteers + 1), side='left')
+    width = int(np.diff(starts).max())
+    slot = np.arange(len(volunteers)) - starts[volunteers]
+    # Padding points at a dummy camp past the last one
+    candidate_camps = np.full((n_volunteers, width), n_camps, dtype=np.int64)
+    candidate_km = np.full((n_volunteers, width), np.inf)
+    candidate_camps[volunteers, slot] = camps
+    candidate_km[volunteers, slot] = distances
+    km_to = {}  # (volunteer, camp) -> km, for the volunteers that get assigned
+
+    # Free volunteers of each camp, nearest first, consumed from the front
+    by_camp = np.lexsort((distances, camps))
+    camp_starts = np.searchsorted(camps[by_camp], np.arange(n_camps + 1), side='left')
+    queue_volunteers = volunteers[by_camp]
+    queue_km = distances[by_camp]
+    head = camp_starts[:-1].copy()
+
+    def nearest_free(camp):
+        while head[camp] < camp_starts[camp + 1] and assigned[queue_volunteers[head[camp]]] != -1:
+            head[camp] += 1
+        if head[camp] < camp_starts[camp + 1]:
+            return queue_km[head[camp]], queue_volunteers[head[camp]]
+        return np.inf, -1
+
+    entry_km = np.array([nearest_free(c)[0] for c in range(n_camps)])
+    members = [[] for _ in range(n_camps)]
+    filled = np.zeros(n_camps, dtype=np.int64)
+    move_km = np.full((n_camps, n_camps), np.inf)  # cheapest move from camp a to camp b
+    mover = np.full((n_camps, n_camps), -1, dtype=np.int64)
+
+    def refresh(camp):
+        move_km[camp] = np.inf
+        mover[camp] = -1
+        if not members[camp]:
+            return
+        at = np.array(members[camp], dtype=np.int64)
+        rows = np.repeat(np.arange(len(at)), width)
+        extra = np.full((len(at), n_camps + 1), np.inf)
+        here = np.array([km_to[(v, camp)] for v in at])
+        extra[rows, candidate_camps[at].ravel()] = (candidate_km[at] - here[:, None]).ravel()
+        extra = extra[:, :n_camps]
+        best = extra.argmin(axis=0)
+        move_km[camp] = extra[best, np.arange(n_camps)]
+        mover[camp] = at[best]
+        move_km[camp, camp] = np.inf
+
+    potential = np.zeros(n_camps)
+    sink_potential = 0.0
+    while True:
+        # Dijkstra on reduced costs from the free volunteers to an open spot.
+        # A settled camp keeps its distance in `dist`; `closed` (minus the
+        # potentials) is inf there, so relaxing never reopens it
+        frontier = entry_km - potential
+        dist = np.full(n_camps, np.inf)
+        closed = -potential
+        pred = np.full(n_camps, -1, dtype=np.int64)
+        best_total, best_camp = np.inf, -1
+        while True:
+            camp = int(frontier.argmin())
+            d = frontier[camp]
+            if not d < best_total:
+                break
+            dist[camp] = d
+            frontier[camp] = closed[camp] = np.inf
+            if filled[camp] < capacity[camp]:
+                total = d + potential[camp] - sink_potential
+                if total < best_total:
+                    best_total, best_camp = total, camp
+            through = move_km[camp] + closed
+            through += d + potential[camp]
+            better = through < frontier
+            pred[better] = camp
+            np.minimum(frontier, through, out=frontier)
+        if best_camp < 0:
+            break
+
+        # Walk the path back: volunteers move forward one camp, a free one joins at the start
+        path = [best_camp]
+        while pred[path[-1]] >= 0:
+            path.append(int(pred[path[-1]]))
+        path.reverse()
+        moves = [(int(mover[a, b]), a, b) for a, b in zip(path, path[1:])]
+        for volunteer, a, b in moves:
+            members[a].remove(volunteer)
+            members[b].append(volunteer)
+            km_to[(volunteer, b)] = float(candidate_km[volunteer][candidate_camps[volunteer] == b][0])
+            assigned[volunteer] = b
+        km, volunteer = nearest_free(path[0])
+        members[path[0]].append(volunteer)
+        km_to[(volunteer, path[0])] = float(km)
+        assigned[volunteer] = path[0]
+        filled[best_camp] += 1
+
+        for camp in set(path):
+            refresh(camp)
+        # The new volunteer is no longer free for any of its candidate camps
+        for camp in candidate_camps[volunteer][candidate_camps[volunteer] < n_camps]:
+            entry_km[camp] = nearest_free(camp)[0]
+
+        potential += np.minimum(np.minimum(dist, frontier), best_total)
+        sink_potential += best_total
+
+    return assigned
+
+
+def plan(volunteers, camps, max_km, excluded=(), per_volunteer=CANDIDATES_PER_VOLUNTEER):
+    """
+    Assign volunteers ((id, lat, lon) rows) to camps ((id, lat, lon, open
+    spots) rows). `excluded` holds (volunteer id, camp id) pairs that must
+    not be matched. Returns [(volunteer id, camp id, km)] sorted by camp.
+    """
+    volunteers = [v for v in volunteers if has_location(v[1], v[2])]
+    camps = [c for c in camps if has_location(c[1], c[2]) and c[3] > 0]
+    if not volunteers or not camps:
+        return []
+    volunteer_index = {v[0]: i for i, v in enumerate(volunteers)}
+    camp_index = {c[0]: i for i, c in enumerate(camps)}
+    excluded = [(volunteer_index[v], camp_index[c]) for v, c in excluded
+                if v in volunteer_index and c in camp_index]
+
+    edges = candidate_graph([v[1] for v in volunteers], [v[2] for v in volunteers],
+                            [c[1] for c in camps], [c[2] for c in camps], max_km, per_volunteer, excluded)
+    assigned = assign(len(volunteers), [c[3] for c in camps], *edges)
+
+    km = {(v, c): d for v, c, d in zip(*edges)}
+    result = [(volunteers[v][0], camps[c][0], float(km[(v, c)]))
+              for v, c in enumerate(assigned.tolist()) if c >= 0]
+    result.sort(key=lambda item: (item[1], item[2]))
+    return result
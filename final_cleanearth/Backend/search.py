@@ -0,0 +1,101 @@
+import re
+
+# SQLite FTS5 full-text index over requests and campaigns. Both FTS tables are
+# external-content tables, so they only store the index and read the text from
+# the base tables. Triggers keep them current on insert/update/delete.
+
+SEARCH_TABLES = {
+    'request': ('request_fts', ['description', 'address']),
+    'campaign': ('campaign_fts', ['name', 'description', 'completion_notes']),
+}
+
+_token = re.compile(r'\w+', re.UNICODE)
+
+
+def _ddl(base, fts, columns):
+    cols = ', '.join(columns)
+    new_cols = ', '.join('new.' + c for c in columns)
+    old_cols = ', '.join('old.' + c for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{base}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"""CREATE TRIGGER {fts}_ai AFTER INSERT ON {base} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END""",
+        f"""CREATE TRIGGER {fts}_ad AFTER DELETE ON {base} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END""",
+        # Only re-index when a searchable column changes, not on status updates
+        f"""CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {base} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END""",
+        # Index rows that existed before the FTS table was created
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_index(connection):
+    """
+    Create the FTS tables and triggers if they are missing.
+    `connection` is a SQLAlchemy connection on a SQLite database.
+    Returns the list of FTS tables that were created.
+    """
+    created = []
+    existing = {row[0] for row in connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for base, (fts, columns) in SEARCH_TABLES.items():
+        if fts in existing:
+            continue
+        for statement in _ddl(base, fts, columns):
+            connection.exec_driver_sql(statement)
+        created.append(fts)
+    return created
+
+
+def build_match_query(q):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word is quoted
+    (so FTS operators in user input are treated as text) and the last word
+    is a prefix match for search-as-you-type. Returns None for empty input.
+    """
+    tokens = _token.findall(q or '')
+    if not tokens:
+        return None
+    terms = ['"%s"' % t for t in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _select(kind, pincode, status):
+    if kind == 'request':
+        sql = """SELECT 'request' AS type, r.id AS id, bm25(request_fts, 1.0, 0.5) AS rank,
+                    snippet(request_fts, -1, '[', ']', '...', 12) AS snippet
+                 FROM request_fts JOIN request r ON r.id = request_fts.rowid
+                 WHERE request_fts MATCH :q"""
+        if pincode:
+            sql += " AND r.pincode = :pincode"
+        if status:
+            sql += " AND r.status = :status"
+    else:
+        sql = """SELECT 'campaign' AS type, c.id AS id, bm25(campaign_fts, 2.0, 1.0, 0.5) AS rank,
+                    snippet(campaign_fts, -1, '[', ']', '...', 12) AS snippet
+                 FROM campaign_fts JOIN campaign c ON c.id = campaign_fts.rowid"""
+        if pincode:
+            sql += " JOIN request r ON r.id = c.request_id"
+        sql += " WHERE campaign_fts MATCH :q"
+        if pincode:
+            sql += " AND r.pincode = :pincode"
+        if status:
+            sql += " AND c.status = :status"
+    return sql
+
+
+def search_statement(kind, pincode=None, status=None):
+    """
+    SQL for a ranked, paginated search. `kind` is 'request', 'campaign' or
+    'all'. Binds :q, :limit, :offset and optionally :pincode and :status.
+    Lower rank is a better match (bm25).
+    """
+    kinds = list(SEARCH_TABLES) if kind == 'all' else [kind]
+    union = ' UNION ALL '.join(_select(k, pincode, status) for k in kinds)
+    return f"SELECT type, id, rank, snippet FROM ({union}) ORDER BY rank, id LIMIT :limit OFFSET :offset"
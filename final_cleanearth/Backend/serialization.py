@@ -0,0 +1,92 @@
+import gzip
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json import JSONEncoder as FlaskJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# JSON encoding and response compression. Dates and datetimes are encoded as
+# ISO 8601 strings by the encoder itself, so to_dict() can return them as-is.
+
+
+class JSONEncoder(FlaskJSONEncoder):
+    """Standard library encoder with ISO 8601 dates (Flask's default uses HTTP dates)"""
+
+    def default(self, o):
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+class ORJSONEncoder(JSONEncoder):
+    """
+    Encodes with orjson, which serializes dicts, lists, datetimes and dates in
+    C. Anything orjson can't handle goes through JSONEncoder.default, and
+    values it rejects outright (e.g. integers over 64 bits) fall back to the
+    standard library encoder.
+    """
+
+    def encode(self, o):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(o, default=self.default, option=option).decode('utf-8')
+        except orjson.JSONEncodeError:
+            return super().encode(o)
+
+
+def get_json_encoder(name):
+    """'orjson' (when installed) or 'std'"""
+    if name == 'orjson' and orjson is not None:
+        return ORJSONEncoder
+    return JSONEncoder
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compress(data, encoding, gzip_level=6, brotli_quality=4):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level)
+
+
+def compress_response(response, accept_encodings, min_size, gzip_level=6, brotli_quality=4):
+    """
+    Compress a buffered JSON response in place when the client accepts br or
+    gzip and the body is at least min_size bytes. Streamed and already encoded
+    responses are left alone.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype != 'application/json'):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = accept_encodings.best_match(available_encodings())
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.set_data(compress(data, encoding, gzip_level, brotli_quality))
+    response.headers['Content-Encoding'] = encoding
+    return response
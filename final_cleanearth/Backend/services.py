@@ -0,0 +1,645 @@
+from datetime import datetime
+import functools
+import json
+import time
+
+from flask import current_app, request, jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+from extensions import db
+from models import (User, Request, RequestSignature, Campaign, CampaignVolunteer, Badge, ImpactRollup, UserCounter,
+                    Job, IdempotencyKey, ChangeEvent, Notification, ArchivedRequest, FIELD_LOADERS, ARCHIVE_MODELS)
+import backup
+import badges
+import changes
+import fieldsets
+import gazetteer
+import idempotency
+import jobs
+from jobs import job_handler
+import media
+import notify
+import priority
+import search
+import sharding
+import spatial
+import tiles
+
+# Helpers shared by the blueprints, the worker and the maintenance scripts.
+# numpy-backed modules (matching, dedup) are imported on first use so that
+# processes which never rank volunteers or index requests don't pay for them;
+# wsgi.py loads them up front for preforked servers.
+
+def sparse_fields(model, extra=()):
+    """Parse ?fields= for a model. Returns (fields, error response)"""
+    try:
+        return fieldsets.parse_fields(request.args.get('fields'), model.API_FIELDS + tuple(extra)), None
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+
+def project(query, model, fields):
+    """Load only the columns needed for the requested fields"""
+    if fields is not None:
+        fields = [f for f in fields if f in model.API_FIELDS]
+    return fieldsets.project(query, model, fields, FIELD_LOADERS.get(model))
+
+def get_with_archive(model, ident, fields=None):
+    """Row by id from the hot table, else from its archive table; None when neither has it"""
+    row = project(model.query, model, fields).get(ident)
+    if row is None and model in ARCHIVE_MODELS:
+        archived = ARCHIVE_MODELS[model]
+        row = project(archived.query, archived, fields).get(ident)
+    return row
+
+def client_key():
+    """The caller: user id when a valid token is sent, otherwise client IP"""
+    try:
+        verify_jwt_in_request(optional=True)
+        user_id = get_jwt_identity()
+        if user_id:
+            return f'user:{user_id}'
+    except Exception:
+        pass
+    proxies = current_app.config['RATELIMIT_TRUST_PROXY']
+    if proxies:
+        # Each trusted proxy appends the address it saw; entries further left
+        # were sent by the client and can be made up (as werkzeug's ProxyFix)
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',')]
+        if len(forwarded) >= proxies and forwarded[-proxies]:
+            return f'ip:{forwarded[-proxies]}'
+    return f'ip:{request.remote_addr}'
+
+def idempotent(view):
+    """
+    Honour an Idempotency-Key header on a POST view. The first response (other
+    than a 5xx) is stored for IDEMPOTENCY_TTL seconds and replayed for repeats
+    of the key from the same client; a repeat sent while the first request is
+    still running waits for its response.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key or request.method != 'POST':
+            return view(*args, **kwargs)
+        if len(key) > 100:
+            return jsonify({"error": "Idempotency-Key must be at most 100 characters"}), 400
+
+        config = current_app.config
+        scope = f'{view.__name__}:{client_key()}'
+        request_fingerprint = idempotency.fingerprint(kwargs, request.get_data())
+
+        stored = idempotency.lookup(db.engine, IdempotencyKey, scope, key)
+        claimed = stored is None and idempotency.claim(
+            db.engine, IdempotencyKey, scope, key, request_fingerprint,
+            config['IDEMPOTENCY_TTL'], config['IDEMPOTENCY_LOCK_TIMEOUT']
+        )
+        if not claimed:
+            if stored is None or stored.status == idempotency.PENDING:
+                # Another request with this key is running: wait for its response
+                stored = idempotency.wait_for(db.engine, IdempotencyKey, scope, key, config['IDEMPOTENCY_WAIT'])
+            if stored is None or stored.status != idempotency.DONE:
+                response = jsonify({"error": "A request with this Idempotency-Key is still in progress"})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            if stored.fingerprint != request_fingerprint:
+                return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+            response = current_app.response_class(stored.body, status=stored.status_code, content_type=stored.content_type)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency.release(db.engine, IdempotencyKey, scope, key)
+            raise
+        if response.status_code >= 500:
+            # Let a retry run again after a server error
+            idempotency.release(db.engine, IdempotencyKey, scope, key)
+        else:
+            idempotency.complete(db.engine, IdempotencyKey, scope, key,
+                                 response.status_code, response.content_type, response.get_data())
+        return response
+    return wrapper
+
+# Volunteer coordinates cached as numpy arrays for suggested_volunteers
+def load_volunteer_coordinates():
+    return db.session.query(User.id, User.latitude, User.longitude).filter(
+        User.role == 'volunteer',
+        User.is_blocked == False
+    ).all()
+
+def get_volunteer_locator():
+    locator = current_app.extensions.get('volunteer_locator')
+    if locator is None:
+        from matching import VolunteerLocator
+        locator = VolunteerLocator(load_volunteer_coordinates, ttl=current_app.config['VOLUNTEER_INDEX_TTL'])
+        current_app.extensions['volunteer_locator'] = locator
+    return locator
+
+def refresh_volunteer_location(user):
+    """Keep the volunteer coordinate cache in step with a changed profile"""
+    volunteer_locator = get_volunteer_locator()
+    if user.role == 'volunteer' and not user.is_blocked:
+        volunteer_locator.upsert(user.id, user.latitude, user.longitude)
+    else:
+        volunteer_locator.remove(user.id)
+
+def enqueue_job(kind, payload=None, key=None, delay=0):
+    """Queue a background job in the current transaction (committed with the caller's write)"""
+    return jobs.enqueue(db.session, Job, kind, payload, key=key, delay=delay)
+
+def enqueue_jobs(kind, items):
+    """Queue many jobs ((payload, key) pairs) in the current transaction"""
+    return jobs.enqueue_many(db.session, Job, kind, items)
+
+# Change feed entity of each model, and the pincode its events are filed under
+CHANGE_ENTITIES = {Request: 'request', Campaign: 'campaign', CampaignVolunteer: 'participation'}
+
+def change_pincode(row):
+    if isinstance(row, CampaignVolunteer):
+        row = row.campaign
+    if isinstance(row, Campaign):
+        row = row.request
+    return row.pincode if row else ''
+
+def record_change(row, action):
+    """Append a change feed event for a request, campaign or participation, in the current transaction"""
+    entity = CHANGE_ENTITIES[type(row)]
+    if action not in changes.ENTITY_ACTIONS[entity]:
+        raise ValueError(f"Unknown {entity} change: {action}")
+    if row.id is None:
+        db.session.flush()
+    if action == 'deleted':
+        data = None
+    elif action == 'left':
+        data = {'id': row.id, 'campaign_id': row.campaign_id, 'volunteer_id': row.volunteer_id}
+    else:
+        data = row.to_dict()
+    event = ChangeEvent(entity=entity, entity_id=row.id, action=action, pincode=change_pincode(row),
+                        data=changes.dump_data(data))
+    db.session.add(event)
+    return event
+
+# Completed campaigns count in the impact rollups and badge counters through
+# jobs. Each completion has its own job, which records what it added; when a
+# campaign is reopened or deleted a campaign_reopened job takes that back out
+def completion_key(campaign_id, completed_at):
+    """Job key of one completion of a campaign; completing it again after a reopen gets a new key"""
+    return f'campaign_completed:{campaign_id}:{completed_at.isoformat()}'
+
+def queue_campaigns_completed(campaigns):
+    """Queue the rollup and badge updates of completed campaigns ((id, completed_at) pairs), in the current transaction"""
+    enqueue_jobs('campaign_completed', [
+        ({'campaign_id': campaign_id, 'completed_at': completed_at.isoformat()}, completion_key(campaign_id, completed_at))
+        for campaign_id, completed_at in campaigns
+    ])
+
+def queue_campaigns_reopened(campaigns):
+    """
+    Queue taking campaigns that are no longer completed (reopened or deleted;
+    (id, completed_at of the completion being undone) pairs) back out of the
+    rollups and badge counters, in the current transaction
+    """
+    enqueue_jobs('campaign_reopened', [
+        ({'campaign_id': campaign_id, 'completed_at': completed_at.isoformat() if completed_at else None},
+         f"campaign_reopened:{campaign_id}:{completed_at.isoformat() if completed_at else ''}")
+        for campaign_id, completed_at in campaigns
+    ])
+
+def completion_contribution(campaign):
+    """What a completed campaign adds to the impact rollups and the badge counters"""
+    volunteer_ids = [row[0] for row in db.session.query(CampaignVolunteer.volunteer_id).filter_by(campaign_id=campaign.id)]
+    return {
+        'day': (campaign.completed_at or datetime.utcnow()).date().isoformat(),
+        'pincode': campaign.request.pincode if campaign.request else '',
+        # The reported attendance, as metrics.rebuild_rollups() counts it
+        'participants': campaign.actual_participants or 0,
+        'waste_kg': campaign.waste_kg or 0.0,
+        'counters': [[volunteer_id, 'camps_completed'] for volunteer_id in volunteer_ids] +
+                    [[campaign.creator_id, 'camps_organised']],
+    }
+
+def apply_contribution(contribution, sign):
+    """Add (sign 1) or take back (sign -1) a completion_contribution(), in the current transaction"""
+    deltas = {(user_id, counter): sign for user_id, counter in contribution['counters']}
+    badges.apply_counter_deltas(db.session, UserCounter, Badge, deltas)
+
+    day = datetime.strptime(contribution['day'], '%Y-%m-%d').date()
+    rollup = ImpactRollup.query.get((day, contribution['pincode']))
+    if rollup is None:
+        rollup = ImpactRollup(day=day, pincode=contribution['pincode'], campaigns_completed=0, participants=0, waste_kg=0.0)
+        db.session.add(rollup)
+    rollup.campaigns_completed += sign
+    rollup.participants += sign * contribution['participants']
+    rollup.waste_kg += sign * contribution['waste_kg']
+    if rollup.campaigns_completed <= 0:
+        # No row for a day/pincode without completed campaigns, as after a rebuild
+        db.session.delete(rollup)
+
+# Background job handlers. They don't commit: jobs.run() commits their
+# writes together with the job's status. The exception is notify_deliver,
+# which claims and settles notification rows in commits of its own
+@job_handler('campaign_completed')
+def handle_campaign_completed(payload):
+    campaign = Campaign.query.get(payload['campaign_id'])
+    if not campaign or campaign.status != 'completed':
+        return
+    if 'completed_at' in payload and (campaign.completed_at is None or
+                                      campaign.completed_at.isoformat() != payload['completed_at']):
+        # Reopened since, and maybe completed again (which queued its own job)
+        return
+
+    # Stored in the job's payload, so a reopen can take exactly this back out
+    payload['applied'] = completion_contribution(campaign)
+    apply_contribution(payload['applied'], 1)
+
+@job_handler('campaign_reopened')
+def handle_campaign_reopened(payload):
+    campaign_id, completed_at = payload['campaign_id'], payload['completed_at']
+    keys = [completion_key(campaign_id, datetime.fromisoformat(completed_at))] if completed_at else []
+    # Completions queued before keys held the completion time
+    keys.append(f'campaign_completed:{campaign_id}')
+    completions = {job.key: job for job in Job.query.filter(
+        Job.key.in_(keys), Job.status != 'cancelled')}
+    completion = next((completions[key] for key in keys if key in completions), None)
+    if completion is None:
+        return
+    if completion.status == 'running':
+        raise RuntimeError(f"Completion job {completion.id} is still running")
+
+    if completion.status == 'done':
+        completion_payload = json.loads(completion.payload or '{}')
+        if 'completed_at' in completion_payload:
+            contribution = completion_payload.get('applied')
+        else:
+            # An older job that didn't record what it applied: use the campaign as it is now
+            campaign = Campaign.query.get(campaign_id)
+            contribution = completion_contribution(campaign) if campaign else None
+            if contribution and completed_at:
+                contribution['day'] = completed_at[:10]
+        if contribution:
+            apply_contribution(contribution, -1)
+
+    # Cancelled, a queued (or failed) completion never runs and a done one is never taken back twice
+    cancelled = Job.query.filter(Job.id == completion.id, Job.status == completion.status).update(
+        {Job.status: 'cancelled', Job.finished_at: datetime.utcnow()}, synchronize_session=False)
+    if not cancelled:
+        raise RuntimeError(f"Completion job {completion.id} changed while being cancelled")
+
+@job_handler('request_created')
+def handle_request_created(payload):
+    waste_request = Request.query.get(payload['request_id'])
+    if not waste_request:
+        return
+
+    deltas = {(waste_request.user_id, 'requests_created'): 1}
+    # First report ever in this pincode, archived ones included as in the
+    # badge backfill (both use their pincode index)
+    earlier = Request.query.filter(Request.pincode == waste_request.pincode, Request.id < waste_request.id).first()
+    if earlier is None:
+        earlier = ArchivedRequest.query.filter(ArchivedRequest.pincode == waste_request.pincode,
+                                               ArchivedRequest.id < waste_request.id).first()
+    if not earlier:
+        deltas[(waste_request.user_id, 'new_pincodes_reported')] = 1
+    badges.apply_counter_deltas(db.session, UserCounter, Badge, deltas)
+
+@job_handler('volunteer_joined')
+def handle_volunteer_joined(payload):
+    badges.apply_counter_deltas(db.session, UserCounter, Badge, {(payload['volunteer_id'], 'camps_joined'): 1})
+
+@job_handler('volunteer_left')
+def handle_volunteer_left(payload):
+    badges.apply_counter_deltas(db.session, UserCounter, Badge, {(payload['volunteer_id'], 'camps_joined'): -1})
+
+# Volunteer notifications (see notify.py)
+def notify_volunteers(kind, item):
+    """Queue the fan-out of a notification about a new request or campaign, in the current transaction"""
+    if item.id is None:
+        db.session.flush()
+    # SQLite can give a new item the id of a deleted one, so the key has its creation time too
+    created_at = item.created_at.isoformat()
+    enqueue_job('notify_fan_out', {'kind': kind, 'entity_id': item.id, 'created_at': created_at},
+                key=f'notify_fan_out:{kind}:{item.id}:{created_at}')
+
+def get_notification_sender():
+    sender = current_app.extensions.get('notification_sender')
+    if sender is None:
+        config = current_app.config
+        if config['SMTP_HOST']:
+            sender = notify.SmtpPool(
+                config['SMTP_HOST'], config['SMTP_PORT'], config['SMTP_USERNAME'], config['SMTP_PASSWORD'],
+                use_tls=config['SMTP_STARTTLS'], size=config['SMTP_POOL_SIZE']
+            )
+        else:
+            sender = notify.ConsoleSender()
+        current_app.extensions['notification_sender'] = sender
+    return sender
+
+def get_channel_limiter():
+    limiter = current_app.extensions.get('channel_limiter')
+    if limiter is None:
+        limiter = notify.ChannelLimiter(current_app.config['NOTIFY_RATE_LIMITS'])
+        current_app.extensions['channel_limiter'] = limiter
+    return limiter
+
+def notification_lines(rows):
+    """
+    {notification id: digest line} for the items that still exist, loaded
+    with one query per kind. A row whose item was deleted and its id reused
+    (created_at differs) has no line.
+    """
+    ids = {}
+    for row in rows:
+        ids.setdefault(row.kind, set()).add(row.entity_id)
+    lines, created = {}, {}
+    if ids.get('request_created'):
+        for waste_request in Request.query.filter(Request.id.in_(ids['request_created'])):
+            lines[('request_created', waste_request.id)] = (
+                f"New waste report in {waste_request.pincode}: {(waste_request.description or '')[:80]}")
+            created[('request_created', waste_request.id)] = waste_request.created_at
+    if ids.get('campaign_scheduled'):
+        campaigns = Campaign.query.options(db.joinedload(Campaign.request).load_only(Request.address)).filter(
+            Campaign.id.in_(ids['campaign_scheduled']), Campaign.status != 'completed')
+        for campaign in campaigns:
+            where = f" at {campaign.request.address}" if campaign.request and campaign.request.address else ''
+            lines[('campaign_scheduled', campaign.id)] = (
+                f"Clean-up \"{campaign.name}\" on {campaign.date:%d %b %Y}, {campaign.timing}{where}")
+            created[('campaign_scheduled', campaign.id)] = campaign.created_at
+    # Rows queued before entity_created_at was added have none and match any item
+    return {row.id: lines[(row.kind, row.entity_id)] for row in rows if (row.kind, row.entity_id) in lines and
+            row.entity_created_at in (None, created[(row.kind, row.entity_id)])}
+
+@job_handler('notify_fan_out')
+def handle_notify_fan_out(payload):
+    kind, entity_id = payload['kind'], payload['entity_id']
+    item = (Request if kind == 'request_created' else Campaign).query.get(entity_id)
+    if item is None or (payload.get('created_at') and item.created_at.isoformat() != payload['created_at']):
+        # Deleted, or deleted and its id given to a new item, which has its own fan-out
+        return
+    if kind == 'request_created':
+        pincode, author_id = item.pincode, item.user_id
+    else:
+        pincode = item.request.pincode if item.request else None
+        author_id = item.creator_id
+    if not pincode:
+        return
+    queued = notify.fan_out(db.session, Notification, User, kind, entity_id, item.created_at, pincode,
+                            exclude_user_id=author_id)
+    if queued:
+        # Everything fanned out in the same window is delivered together, one
+        # message per recipient, when the window closes
+        window = current_app.config['NOTIFY_COALESCE_SECONDS']
+        now = datetime.utcnow().timestamp()
+        window_end = (int(now) // window + 1) * window if window > 0 else int(now)
+        job = enqueue_job('notify_deliver', {'channel': 'email'}, key=f'notify_deliver:email:{window_end}',
+                          delay=window_end - now)
+        if job.status == 'done':
+            # That window's delivery already ran; its rows would wait for the next one
+            enqueue_job('notify_deliver', {'channel': 'email'})
+
+@job_handler('notify_deliver')
+def handle_notify_deliver(payload):
+    channel = payload.get('channel', 'email')
+    config = current_app.config
+    sender, limiter = get_notification_sender(), get_channel_limiter()
+    # Each batch is claimed and settled in its own commits, unlike other
+    # handlers, so sent rows stay sent if a later batch fails. Delivery is at
+    # least once: if the worker dies after the SMTP server took a batch but
+    # before it is settled, the rows stay SENDING and are claimed and sent
+    # again after notify.CLAIM_TIMEOUT_SECONDS. Stop well within the job lock
+    # and leave the rest to a follow-up job
+    deadline = time.monotonic() + jobs.LOCK_TIMEOUT_SECONDS / 2
+    while True:
+        if time.monotonic() > deadline:
+            enqueue_job('notify_deliver', {'channel': channel})
+            return
+        batch, rows = notify.claim_batch(db.session, Notification, channel, config['NOTIFY_BATCH_RECIPIENTS'])
+        if not rows:
+            return
+        groups = notify.group_by_recipient(rows)
+        lines = notification_lines(rows)
+        recipients = {user.id: user for user in User.query.options(
+            db.load_only(User.id, User.name, User.email)).filter(User.id.in_(groups))}
+
+        messages, recipient_of = [], {}
+        for user_id, items in groups.items():
+            user = recipients.get(user_id)
+            item_lines = [lines[row.id] for row in items if row.id in lines]
+            if user is None or not user.email or not item_lines:
+                continue
+            subject, body = notify.digest(user.name, item_lines)
+            message = notify.build_message(config['NOTIFY_FROM'], user.email, subject, body)
+            recipient_of[id(message)] = user_id
+            messages.append(message)
+
+        def paced(messages):
+            for message in messages:
+                limiter.wait(channel)
+                yield message
+
+        delivered = set()
+        error = None
+        try:
+            sender.send(paced(messages), on_sent=lambda message: delivered.add(recipient_of[id(message)]))
+        except Exception as e:
+            error = e
+
+        # Settle the batch with one UPDATE per outcome. Rows whose item or
+        # recipient is gone are dropped; unsent rows go back to pending
+        sent_ids, dropped_ids, unsent_ids = [], [], []
+        for row in rows:
+            if row.id not in lines or row.user_id not in recipients or not recipients[row.user_id].email:
+                dropped_ids.append(row.id)
+            elif row.user_id in delivered:
+                sent_ids.append(row.id)
+            else:
+                unsent_ids.append(row.id)
+        if sent_ids:
+            Notification.query.filter(Notification.id.in_(sent_ids)).update(
+                {Notification.status: notify.SENT, Notification.sent_at: datetime.utcnow()}, synchronize_session=False)
+        if dropped_ids:
+            Notification.query.filter(Notification.id.in_(dropped_ids)).update(
+                {Notification.status: notify.DROPPED}, synchronize_session=False)
+        if unsent_ids:
+            Notification.query.filter(Notification.id.in_(unsent_ids)).update({
+                Notification.status: db.case(
+                    (Notification.attempts + 1 >= config['NOTIFY_MAX_ATTEMPTS'], notify.FAILED), else_=notify.PENDING),
+                Notification.attempts: Notification.attempts + 1,
+                Notification.last_error: str(error)[:500] if error else None,
+                Notification.batch: None
+            }, synchronize_session=False)
+        db.session.commit()
+        print(f"Notifications ({channel}): {len(sent_ids)} sent, {len(dropped_ids)} dropped, {len(unsent_ids)} unsent")
+        if error is not None:
+            # The job is retried with backoff and picks the unsent rows up again
+            raise error
+
+# Request status and map density tiles
+def update_request_tiles(waste_request, old_status, new_status):
+    """Move a request between status counts in the density tiles, in the current transaction"""
+    if old_status == new_status:
+        return
+    changes = []
+    if old_status:
+        changes += tiles.count_changes(waste_request.latitude, waste_request.longitude, old_status, -1)
+    if new_status:
+        changes += tiles.count_changes(waste_request.latitude, waste_request.longitude, new_status, 1)
+    tiles.apply_changes(db.session, changes)
+
+def set_request_status(waste_request, status):
+    old_status = waste_request.status
+    update_request_tiles(waste_request, old_status, status)
+    waste_request.status = status
+    if status != old_status:
+        record_change(waste_request, 'status_changed')
+
+# Duplicate request detection
+def index_request(waste_request):
+    """
+    Link a freshly flushed request to its canonical duplicate (if any) and
+    store its signature keys. Candidates come from one indexed IN lookup on
+    spatial cell + MinHash band keys, then get an exact similarity check.
+    Returns (canonical_id, similarity) or (None, 0.0).
+    """
+    import dedup
+    config = current_app.config
+    own_keys, search_keys = dedup.lookup_keys(
+        waste_request.latitude,
+        waste_request.longitude,
+        waste_request.description,
+        config['DUPLICATE_CELL_DEG']
+    )
+
+    candidates = Request.query.join(
+        RequestSignature, RequestSignature.request_id == Request.id
+    ).filter(
+        RequestSignature.key.in_(search_keys),
+        Request.id != waste_request.id,
+        Request.status != 'completed'
+    ).distinct().all()
+
+    best_id, best_score = None, 0.0
+    new_shingles = dedup.shingles(waste_request.description)
+    for candidate in candidates:
+        distance = dedup.distance_m(waste_request.latitude, waste_request.longitude, candidate.latitude, candidate.longitude)
+        if distance > config['DUPLICATE_RADIUS_M']:
+            continue
+        score = dedup.jaccard(new_shingles, dedup.shingles(candidate.description))
+        if score >= config['DUPLICATE_MIN_SIMILARITY'] and score > best_score:
+            best_id, best_score = candidate.duplicate_of or candidate.id, score
+
+    waste_request.duplicate_of = best_id
+    db.session.add_all([RequestSignature(request_id=waste_request.id, key=k) for k in own_keys])
+    return best_id, best_score
+
+# Triage priority (see priority.py)
+def prioritize_request(waste_request):
+    """Score a freshly indexed request and update the scores it affects, in the current transaction"""
+    priority.add_request(db.session, Request, waste_request, current_app.config['PRIORITY_CLUSTER_RADIUS_M'])
+
+def refresh_priority(request_ids):
+    """Recompute the priority of requests whose duplicates or campaigns changed"""
+    request_ids = {i for i in request_ids if i}
+    if request_ids:
+        db.session.flush()
+        requests = Request.query.filter(Request.id.in_(request_ids)).all()
+        priority.refresh(db.session, Request, Campaign, requests, current_app.config['PRIORITY_CLUSTER_RADIUS_M'])
+
+# Pincode centroids and bounding boxes, memory-mapped once per process
+def get_gazetteer():
+    """The pincode gazetteer, or None when its data file hasn't been built"""
+    extensions = current_app.extensions
+    if 'gazetteer' not in extensions:
+        extensions['gazetteer'] = gazetteer.open_gazetteer(current_app.config['PINCODE_GAZETTEER'])
+    return extensions['gazetteer']
+
+def fill_user_location(user, pincode_changed=False):
+    """Use the pincode centroid for a user without coordinates (or who moved pincode without sending new ones)"""
+    places = get_gazetteer()
+    if places is None or not (pincode_changed or gazetteer.missing_location(user.latitude, user.longitude)):
+        return
+    centroid = places.centroid(user.pincode)
+    if centroid:
+        user.latitude, user.longitude = centroid
+
+def check_request_location(pincode, latitude, longitude):
+    """Error message when the coordinates are outside the pincode, else None (also for unknown pincodes)"""
+    places = get_gazetteer()
+    if places is None:
+        return None
+    if places.contains(pincode, latitude, longitude, current_app.config['GAZETTEER_MARGIN_KM']) is False:
+        return f"Coordinates ({latitude}, {longitude}) are not within pincode {pincode}"
+    return None
+
+# Image upload, streamed to content-addressed storage
+def get_media_store():
+    store = current_app.extensions.get('media_store')
+    if store is None:
+        store = current_app.extensions['media_store'] = media.MediaStore(current_app.config['UPLOAD_FOLDER'])
+    return store
+
+# Helper function to safely get user ID from JWT token
+def get_safe_user_id():
+    """Get user ID from JWT token, ensuring it's a string and handling errors"""
+    try:
+        user_id = get_jwt_identity()
+        print(f"Raw user ID from token: {user_id}, type: {type(user_id)}")
+
+        # Convert to string if not None
+        if user_id is not None:
+            if not isinstance(user_id, str):
+                user_id = str(user_id)
+                print(f"Converted user ID to string: {user_id}")
+            return user_id
+        else:
+            print("Warning: JWT identity returned None")
+            return None
+    except Exception as e:
+        print(f"Error getting JWT identity: {str(e)}")
+        return None
+
+def region_engines():
+    """Engines holding requests and campaigns: one per region when sharded"""
+    if db.sharded:
+        return db.region_engines()
+    return {sharding.GLOBAL: db.engine}
+
+def sqlite_databases():
+    """{name: file} of every SQLite database file: the global one, then each region's when sharded"""
+    databases = {}
+    engines = {sharding.GLOBAL: db.engine}
+    if db.sharded:
+        engines.update(db.region_engines())
+    for name, engine in engines.items():
+        path = backup.sqlite_path(engine)
+        if path and path not in databases.values():
+            databases[name] = path
+    return databases
+
+# Online snapshots (see backup.py)
+@job_handler('backup_snapshot')
+def handle_backup_snapshot(payload):
+    config = current_app.config
+    manifest = backup.snapshot(sqlite_databases(), config['BACKUP_DIR'], compress=config['BACKUP_COMPRESS'])
+    deleted = backup.prune(config['BACKUP_DIR'], config['BACKUP_RETENTION'])
+    print(f"Backup snapshot {manifest['name']} written, {len(deleted)} old snapshot(s) pruned")
+
+def create_search_index():
+    """Create the FTS5 search tables, the request R*Tree and their triggers on SQLite databases"""
+    created = []
+    for engine in region_engines().values():
+        if engine.dialect.name == 'sqlite':
+            with engine.begin() as connection:
+                created.extend(search.create_search_index(connection))
+                created.extend(spatial.create_spatial_index(connection))
+    current_app.extensions.pop('spatial_index', None)
+    return created
+
+def spatial_index_available():
+    """Whether the request R*Tree exists (checked once per process)"""
+    available = current_app.extensions.get('spatial_index')
+    if available is None:
+        engine = next(iter(region_engines().values()))
+        with engine.connect() as connection:
+            available = current_app.extensions['spatial_index'] = spatial.has_spatial_index(connection)
+    return available
@@ -0,0 +1,446 @@
+import heapq
+import os
+
+from flask_sqlalchemy import BaseQuery, SQLAlchemy
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import configure_mappers, sessionmaker
+from sqlalchemy.schema import Column
+from sqlalchemy.sql import Alias, Select, func, literal_column, operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+from sqlalchemy.sql.util import find_tables
+
+# Optional region sharding. Models with a SHARD_BY attribute live in one
+# database per region, everything else in the global database (the usual
+# DATABASE_URL). SHARD_BY is either a pincode column, routed by longest
+# pincode prefix, or the name of a relationship whose row the model lives
+# next to (a campaign goes where its request is).
+#
+# Each region hands out ids from its own range, region i (1-based, in config
+# order) from i * ID_RANGE, so a primary key alone tells which database holds
+# the row. Rows moved from an unsharded database keep their old, smaller ids;
+# looking those up asks every region.
+
+GLOBAL = 'global'
+ID_RANGE = 10 ** 9
+
+
+def parse_shards(spec):
+    """
+    "north=1,2:sqlite:///shard_north.db;south=5,6:sqlite:///shard_south.db"
+    -> [(name, [pincode prefixes], url), ...]. A '*' prefix marks the
+    region for pincodes no other prefix matches (the first region otherwise).
+    """
+    regions = []
+    for entry in filter(None, (e.strip() for e in spec.split(';'))):
+        name, _, rest = entry.partition('=')
+        prefixes, _, url = rest.partition(':')
+        name = name.strip()
+        if not name or not url or name == GLOBAL:
+            raise ValueError(f"Invalid shard definition: {entry}")
+        regions.append((name, [p.strip() for p in prefixes.split(',') if p.strip()], url.strip()))
+    if len({name for name, _, _ in regions}) != len(regions):
+        raise ValueError("Shard names must be unique")
+    return regions
+
+
+class ShardRouter:
+    """Decides which database a row, a primary key or a statement belongs to"""
+
+    def __init__(self, regions):
+        self.regions = [name for name, _, _ in regions]
+        self.prefixes = {}
+        self.default = self.regions[0]
+        for name, prefixes, _ in regions:
+            for prefix in prefixes:
+                if prefix == '*':
+                    self.default = name
+                else:
+                    self.prefixes[prefix] = name
+        self.tables = None
+        self.routing = {}
+
+    def shard_for_pincode(self, pincode):
+        pincode = str(pincode or '')
+        for length in range(len(pincode), 0, -1):
+            if pincode[:length] in self.prefixes:
+                return self.prefixes[pincode[:length]]
+        return self.default
+
+    def id_base(self, shard):
+        return (self.regions.index(shard) + 1) * ID_RANGE
+
+    def shard_for_id(self, value):
+        """The region that allocated this id, or None for ids from before sharding"""
+        try:
+            index = int(value) // ID_RANGE
+        except (TypeError, ValueError):
+            return None
+        return self.regions[index - 1] if 1 <= index <= len(self.regions) else None
+
+    def configure(self, mappers):
+        """Collect the sharded tables and the columns that pin their rows to a region"""
+        self.tables = {}
+        self.routing = {}
+        for mapper in mappers:
+            if not self.is_sharded(mapper):
+                continue
+            self.tables[mapper.local_table] = mapper
+            if len(mapper.primary_key) == 1:
+                self.routing[mapper.primary_key[0]] = 'id'
+            shard_by = mapper.class_.SHARD_BY
+            if shard_by in mapper.relationships:
+                self.routing.update({c: 'id' for c in mapper.relationships[shard_by].local_columns})
+            else:
+                self.routing[mapper.columns[shard_by]] = 'pincode'
+
+    @staticmethod
+    def is_sharded(mapper):
+        return mapper is not None and getattr(mapper.class_, 'SHARD_BY', None) is not None
+
+    def shard_for_instance(self, session, instance):
+        """Region for a new row, from its pincode or the row it lives next to"""
+        mapper = inspect(instance).mapper
+        shard_by = mapper.class_.SHARD_BY
+        if shard_by not in mapper.relationships:
+            return self.shard_for_pincode(getattr(instance, shard_by))
+
+        relationship = mapper.relationships[shard_by]
+        parent = instance.__dict__.get(shard_by)
+        if parent is None:
+            keys = [getattr(instance, mapper.get_property_by_column(c).key) for c in relationship.local_columns]
+            if None in keys:
+                return self.default
+            shard = self.shard_for_id(keys[0])
+            if shard:
+                return shard
+            parent = session.get(relationship.mapper.class_, keys[0] if len(keys) == 1 else tuple(keys))
+            if parent is None:
+                return self.default
+        state = inspect(parent)
+        if state.key:
+            return state.key[2]
+        return state.identity_token or self.shard_for_instance(session, parent)
+
+    def shard_chooser(self, mapper, instance, clause=None, **kw):
+        if not self.is_sharded(mapper):
+            return GLOBAL
+        # New rows get their region in before_flush; this only sees stragglers
+        return self.shard_for_instance(inspect(instance).session, instance) if instance is not None else self.default
+
+    def id_chooser(self, query, ident):
+        mapper = query._only_full_mapper_zero('get')
+        if not self.is_sharded(mapper):
+            return [GLOBAL]
+        shard = self.shard_for_id(ident[0]) if len(ident) == 1 else None
+        return [shard] if shard else list(self.regions)
+
+    def execute_chooser(self, orm_context):
+        """Regions a statement must run on: the ones its WHERE clause pins, else all of them"""
+        tables = set(find_tables(orm_context.statement, include_crud=True))
+        sharded = {t for t in tables if t in self.tables}
+        if not sharded:
+            return [GLOBAL]
+        if sharded != tables:
+            names = ', '.join(sorted(t.name for t in tables))
+            raise ValueError(f"Can't query sharded and global tables together ({names})")
+
+        for clause in _criteria(orm_context.statement):
+            shards = self._shards_for_criterion(clause)
+            if shards:
+                return shards
+        return list(self.regions)
+
+    def _shards_for_criterion(self, clause):
+        if not isinstance(clause, BinaryExpression) or not isinstance(clause.right, BindParameter):
+            return None
+        column = clause.left
+        kind = self.routing.get(column) if isinstance(column, Column) else None
+        if kind is None or clause.operator not in (operators.eq, operators.in_op):
+            return None
+        value = clause.right.effective_value
+        values = value if clause.operator is operators.in_op else [value]
+        shards = []
+        for v in values or []:
+            shard = self.shard_for_pincode(v) if kind == 'pincode' else self.shard_for_id(v)
+            if shard is None:
+                return None
+            if shard not in shards:
+                shards.append(shard)
+        return shards or None
+
+
+def _criteria(statement):
+    """AND terms of a statement's WHERE clause, and of the subquery it selects from (as count() does)"""
+    terms = _conjuncts(getattr(statement, 'whereclause', None))
+    if isinstance(statement, Select):
+        for from_ in statement.get_final_froms():
+            if isinstance(from_, Alias) and isinstance(from_.element, Select):
+                terms.extend(_criteria(from_.element))
+    return terms
+
+
+def _conjuncts(clause):
+    """Top level AND terms of a WHERE clause; OR'd terms can't narrow the regions"""
+    if clause is None:
+        return []
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        terms = []
+        for c in clause.clauses:
+            terms.extend(_conjuncts(c))
+        return terms
+    return [clause]
+
+
+class RoutingSession(ShardedSession):
+    """Flask-SQLAlchemy session over the global and region databases"""
+
+    def __init__(self, db, autocommit=False, autoflush=True, **options):
+        self.app = db.get_app()
+        router = db.get_router(self.app)
+        if router.tables is None:
+            configure_mappers()
+            router.configure(db.Model.registry.mappers)
+        shards = dict(db.region_engines(self.app))
+        shards[GLOBAL] = db.get_engine(self.app)
+        super().__init__(
+            shard_chooser=router.shard_chooser,
+            id_chooser=router.id_chooser,
+            execute_chooser=router.execute_chooser,
+            shards=shards,
+            autocommit=autocommit,
+            autoflush=autoflush,
+            **options
+        )
+        self.router = router
+        event.listen(self, 'before_flush', self._assign_regions)
+
+    def _assign_regions(self, session, flush_context, instances):
+        for instance in session.new:
+            state = inspect(instance)
+            if state.identity_token is None and self.router.is_sharded(state.mapper):
+                state.identity_token = self.router.shard_for_instance(session, instance)
+
+
+class RegionQuery(BaseQuery):
+    def count(self):
+        """Sum of the per-region counts; a plain count() would only read the first region's row"""
+        col = func.count(literal_column('*'))
+        return sum(row[0] for row in self._from_self(col).enable_eagerloads(False))
+
+
+def on_region(query, region):
+    """Run an ORM query on one region's database only"""
+    return query.execution_options(_sa_shard_id=region)
+
+
+def region_of(instance):
+    """Region database a loaded row came from"""
+    state = inspect(instance)
+    return state.key[2] if state.key else state.identity_token
+
+
+class ShardedSQLAlchemy(SQLAlchemy):
+    """
+    SQLAlchemy extension whose session routes sharded models to region
+    databases when the app sets SHARDS; without it this is plain
+    Flask-SQLAlchemy. `db.engine` stays the global database.
+    """
+
+    def __init__(self, app=None, **kwargs):
+        self._region_engines = {}
+        kwargs.setdefault('query_class', RegionQuery)
+        super().__init__(app, **kwargs)
+
+    def init_app(self, app):
+        app.config.setdefault('SHARDS', [])
+        super().init_app(app)
+        app.extensions['sharding'] = ShardRouter(app.config['SHARDS']) if app.config['SHARDS'] else None
+
+    def get_router(self, app=None):
+        """Router of the app, None when it isn't sharded"""
+        return self.get_app(app).extensions.get('sharding')
+
+    @property
+    def router(self):
+        return self.get_router()
+
+    @property
+    def sharded(self):
+        return self.get_router() is not None
+
+    def create_session(self, options):
+        plain = super().create_session(options)
+        routed = sessionmaker(class_=RoutingSession, db=self, **options)
+        return lambda **kw: (routed if self.sharded else plain)(**kw)
+
+    def region_engines(self, app=None):
+        app = self.get_app(app)
+        if app not in self._region_engines:
+            engines = {}
+            for name, _, url in app.config['SHARDS']:
+                sa_url = make_url(url)
+                # Relative SQLite paths are relative to the app, as for DATABASE_URL
+                if sa_url.drivername.startswith('sqlite') and sa_url.database not in (None, '', ':memory:') \
+                        and not os.path.isabs(sa_url.database):
+                    sa_url = sa_url.set(database=os.path.join(app.root_path, sa_url.database))
+                engines[name] = create_engine(sa_url)
+            self._region_engines[app] = engines
+        return self._region_engines[app]
+
+    def sharded_tables(self, app=None):
+        router = self.get_router(app)
+        return [m.local_table for m in self.Model.registry.mappers if router and router.is_sharded(m)]
+
+    def create_all(self, bind='__all__', app=None):
+        """Global tables in the global database, sharded tables in every region"""
+        router = self.get_router(app)
+        if router is None:
+            return super().create_all(bind, app)
+        sharded = set(self.sharded_tables(app))
+        global_tables = [t for t in self.Model.metadata.sorted_tables if t not in sharded]
+        self.Model.metadata.create_all(self.get_engine(self.get_app(app)), tables=global_tables)
+        for table in sharded:
+            # AUTOINCREMENT so SQLite continues from the seeded sqlite_sequence
+            if len(table.primary_key.columns) == 1:
+                table.dialect_kwargs['sqlite_autoincrement'] = True
+        for name, engine in self.region_engines(app).items():
+            self.Model.metadata.create_all(engine, tables=[t for t in self.Model.metadata.sorted_tables if t in sharded])
+            if engine.dialect.name == 'sqlite':
+                with engine.begin() as connection:
+                    seed_id_ranges(connection, [t.name for t in sharded if len(t.primary_key.columns) == 1],
+                                   router.id_base(name))
+
+    def drop_all(self, bind='__all__', app=None):
+        super().drop_all(bind, app)
+        if self.get_router(app) is not None:
+            for engine in self.region_engines(app).values():
+                self.Model.metadata.drop_all(engine, tables=self.sharded_tables(app))
+
+    def dispose_engines(self, app=None):
+        """
+        Forget pooled connections after fork: the child must not reuse sockets
+        or SQLite handles opened by the parent. close=False leaves them to the
+        parent instead of closing them from under it.
+        """
+        engines = [self.get_engine(self.get_app(app))]
+        if self.get_router(app) is not None:
+            engines.extend(self.region_engines(app).values())
+        for engine in engines:
+            engine.dispose(close=False)
+
+
+def seed_id_ranges(connection, tables, base):
+    """Start each table's ids at the region's base (SQLite AUTOINCREMENT tables)"""
+    for table in tables:
+        row = connection.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :t"), {'t': table}).first()
+        if row is None:
+            connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:t, :base)"),
+                               {'t': table, 'base': base})
+        elif row[0] < base:
+            connection.execute(text("UPDATE sqlite_sequence SET seq = :base WHERE name = :t"),
+                               {'t': table, 'base': base})
+
+
+def gather_sorted(partials, key, offset, limit):
+    """
+    Merge per-region result lists that are each sorted by `key` and apply
+    offset/limit to the merged order. Each region must have been asked for
+    offset + limit rows.
+    """
+    merged = heapq.merge(*partials, key=key)
+    return [row for _, row in zip(range(offset + limit), merged)][offset:]
+
+
+def each_region(connection, engines=None):
+    """
+    Connections to read the sharded tables through, for rebuilds that write
+    global tables: `connection` itself when `engines` is None (unsharded),
+    else a connection to each region engine in turn.
+    """
+    if engines is None:
+        yield connection
+        return
+    for engine in engines:
+        with engine.connect() as region:
+            yield region
+
+
+def split_database(source, targets, router, tables):
+    """
+    Move sharded rows out of an unsharded database. `source` and `targets`
+    ({region: connection}) are connections inside transactions; `tables` are
+    (table, SHARD_BY column, parent table) in dependency order, e.g.
+    (request, 'pincode', None) then (campaign, 'request_id', 'request').
+    Rows keep their ids. Returns {table name: {region: rows moved}}.
+    """
+    placed = {}
+    moved = {}
+    for table, column, parent in tables:
+        rows = source.execute(table.select()).mappings().all()
+        placed[table.name] = {}
+        moved[table.name] = {}
+        for row in rows:
+            if parent is None:
+                shard = router.shard_for_pincode(row[column])
+            else:
+                shard = placed[parent].get(row[column], router.default)
+            pk = row[list(table.primary_key.columns)[0].name] if len(table.primary_key.columns) == 1 else None
+            if pk is not None:
+                placed[table.name][pk] = shard
+            targets[shard].execute(table.insert(), dict(row))
+            moved[table.name][shard] = moved[table.name].get(shard, 0) + 1
+    for table, _, _ in reversed(tables):
+        source.execute(table.delete())
+    return moved
+
+
+if __name__ == "__main__":
+    import sys
+    from app import app, db, create_search_index
+
+    if sys.argv[1:] not in (['init'], ['split'], ['stats']):
+        print("Usage: python sharding.py init|split|stats")
+        sys.exit(1)
+
+    with app.app_context():
+        if not db.sharded:
+            print("Set SHARDS to enable sharded storage")
+            sys.exit(1)
+        db.create_all()
+        if sys.argv[1] == 'split':
+            mappers = {m.local_table.name: m for m in db.Model.registry.mappers if db.router.is_sharded(m)}
+            tables = []
+            for table in db.Model.metadata.sorted_tables:
+                if table.name not in mappers:
+                    continue
+                mapper = mappers[table.name]
+                shard_by = mapper.class_.SHARD_BY
+                if shard_by in mapper.relationships:
+                    relationship = mapper.relationships[shard_by]
+                    tables.append((table, list(relationship.local_columns)[0].name, relationship.target.name))
+                else:
+                    tables.append((table, shard_by, None))
+            engines = db.region_engines()
+            with db.engine.begin() as source:
+                connections = {name: engine.connect() for name, engine in engines.items()}
+                transactions = [c.begin() for c in connections.values()]
+                try:
+                    moved = split_database(source, connections, db.router, tables)
+                    for transaction in transactions:
+                        transaction.commit()
+                finally:
+                    for connection in connections.values():
+                        connection.close()
+            for table, counts in moved.items():
+                print(f"{table}: " + (', '.join(f"{n} -> {s}" for s, n in counts.items()) or 'nothing to move'))
+            create_search_index()
+        elif sys.argv[1] == 'stats':
+            for name, engine in db.region_engines().items():
+                with engine.connect() as connection:
+                    counts = {t.name: connection.execute(text(f"SELECT COUNT(*) FROM {t.name}")).scalar()
+                              for t in db.sharded_tables()}
+                print(f"{name}: " + ', '.join(f"{t}={n}" for t, n in counts.items()))
+        else:
+            print(f"Created sharded tables in {', '.join(db.router.regions)}")
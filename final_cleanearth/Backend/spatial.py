@@ -0,0 +1,86 @@
+import math
+
+# SQLite R*Tree index over request coordinates, for bounding box and radius
+# searches. Like the FTS tables it is filled and kept current by triggers on
+# the request table. R*Tree stores 32-bit floats rounded outwards, so a box
+# lookup can return points a metre or so outside the box; callers repeat the
+# exact filter on the request columns.
+
+RTREE_TABLE = 'request_rtree'
+
+KM_PER_DEGREE = 111.32
+
+
+def _ddl():
+    return [
+        f"CREATE VIRTUAL TABLE {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+        f"""CREATE TRIGGER {RTREE_TABLE}_ai AFTER INSERT ON request BEGIN
+            INSERT INTO {RTREE_TABLE} VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+        END""",
+        f"""CREATE TRIGGER {RTREE_TABLE}_ad AFTER DELETE ON request BEGIN
+            DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+        END""",
+        f"""CREATE TRIGGER {RTREE_TABLE}_au AFTER UPDATE OF latitude, longitude ON request BEGIN
+            DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+            INSERT INTO {RTREE_TABLE} VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+        END""",
+        # Index rows that existed before the R*Tree was created
+        f"INSERT INTO {RTREE_TABLE} SELECT id, latitude, latitude, longitude, longitude FROM request",
+    ]
+
+
+def create_spatial_index(connection):
+    """
+    Create the R*Tree table and triggers if they are missing.
+    `connection` is a SQLAlchemy connection on a SQLite database.
+    Returns the list of tables that were created.
+    """
+    existing = {row[0] for row in connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if RTREE_TABLE in existing:
+        return []
+    for statement in _ddl():
+        connection.exec_driver_sql(statement)
+    return [RTREE_TABLE]
+
+
+def has_spatial_index(connection):
+    if connection.dialect.name != 'sqlite':
+        return False
+    return connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (RTREE_TABLE,)).first() is not None
+
+
+def rtree_ids_sql():
+    """Request ids inside (:min_lat, :max_lat, :min_lon, :max_lon)"""
+    return (f"SELECT id FROM {RTREE_TABLE} WHERE max_lat >= :min_lat AND min_lat <= :max_lat "
+            "AND max_lon >= :min_lon AND min_lon <= :max_lon")
+
+
+def radius_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing a circle; longitude is not wrapped at 180"""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (max(latitude - dlat, -90.0), min(latitude + dlat, 90.0), longitude - dlon, longitude + dlon)
+
+
+def squared_distance_km(latitude, longitude, center_lat, center_lon):
+    """
+    Squared equirectangular distance in km^2 from a centre; works on numbers
+    and on SQL column expressions. Accurate to well under 1% up to a few
+    hundred km.
+    """
+    dx = (longitude - center_lon) * (KM_PER_DEGREE * math.cos(math.radians(center_lat)))
+    dy = (latitude - center_lat) * KM_PER_DEGREE
+    return dx * dx + dy * dy
+
+
+def parse_bbox(value):
+    """'min_lon,min_lat,max_lon,max_lat' (the usual map bounds order) -> (min_lat, max_lat, min_lon, max_lon)"""
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("bbox minimums must not exceed its maximums")
+    return min_lat, max_lat, min_lon, max_lon
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import create_app
+from extensions import db
+from models import Job
+import jobs
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    A fresh app on its own SQLite file for every test, built with
+    create_app(overrides) so nothing depends on the environment. Rate limits
+    are off, as the tests register many users from one address.
+    """
+
+    overrides = {}
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(self.tmp_dir, 'test.db'),
+            'SHARDS': [],
+            'RATE_LIMITS': {},
+            'UPLOAD_FOLDER': os.path.join(self.tmp_dir, 'uploads'),
+            'TRACE_CAPTURE_PATH': None,
+            **self.overrides
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.get_engine().dispose()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def register(self, name, role='user', pincode='110001', latitude=28.6, longitude=77.2):
+        """Register and log in a user. Returns (auth headers, user id)"""
+        response = self.client.post('/api/register', json={
+            'name': name, 'email': f'{name}@example.com', 'password': 'secret', 'role': role,
+            'pincode': pincode, 'latitude': latitude, 'longitude': longitude
+        })
+        self.assertEqual(response.status_code, 201, response.get_json())
+        response = self.client.post('/api/login', json={'email': f'{name}@example.com', 'password': 'secret'})
+        body = response.get_json()
+        return {'Authorization': f"Bearer {body['access_token']}"}, body['user']['id']
+
+    def report(self, email, description='Garbage dumped next to the park gate', pincode='110001',
+               latitude=28.6, longitude=77.2, headers=None):
+        """Report a waste request. Returns the response"""
+        return self.client.post('/api/request_register', headers=headers or {}, json={
+            'email': email, 'pincode': pincode, 'latitude': latitude, 'longitude': longitude,
+            'description': description, 'address': 'Park road'
+        })
+
+    def create_camp(self, headers, request_id, date='2030-01-01', volunteers=5):
+        response = self.client.post('/api/camp_register', headers=headers, json={
+            'requestId': request_id, 'campName': 'Park clean-up', 'dateOfCamp': date, 'timeOfCamp': '9am',
+            'numberOfVolunteers': volunteers, 'description': 'Bring gloves'
+        })
+        self.assertEqual(response.status_code, 201, response.get_json())
+        return response.get_json()['id']
+
+    def run_jobs(self):
+        """Run every queued job, as `python worker.py drain` would"""
+        with self.app.app_context():
+            while True:
+                job = jobs.claim_next(db.session, Job, 'test-worker')
+                if job is None:
+                    break
+                jobs.run(db.session, job)
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+import changes
+import sharding
+from models import ChangeEvent
+
+START = datetime(2030, 1, 1)
+
+
+class CursorTest(unittest.TestCase):
+    def test_unsharded_cursor_is_a_plain_id(self):
+        self.assertEqual(changes.encode_cursor({sharding.GLOBAL: 42}), '42')
+        self.assertEqual(changes.decode_cursor('42'), {sharding.GLOBAL: 42})
+        self.assertEqual(changes.decode_cursor(''), {})
+
+    def test_region_cursor_round_trips(self):
+        positions = {'south': 2000000007, 'north': 1000000003}
+        cursor = changes.encode_cursor(positions)
+        self.assertEqual(cursor, 'north:1000000003,south:2000000007')
+        self.assertEqual(changes.decode_cursor(cursor), positions)
+
+    def test_malformed_cursor(self):
+        with self.assertRaises(ValueError):
+            changes.decode_cursor('north:abc')
+
+
+class RegionFeedTest(unittest.TestCase):
+    """The feed read from two region databases with their own id ranges"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.engines = {}
+        for region in ('north', 'south'):
+            engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir, f'{region}.db'))
+            ChangeEvent.__table__.create(engine)
+            self.engines[region] = engine
+        self.next_id = {'north': 1000000001, 'south': 2000000001}
+
+    def tearDown(self):
+        for engine in self.engines.values():
+            engine.dispose()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def add(self, region, seconds, pincode='110001'):
+        event_id = self.next_id[region]
+        self.next_id[region] += 1
+        with self.engines[region].begin() as connection:
+            connection.execute(ChangeEvent.__table__.insert().values(
+                id=event_id, entity='request', entity_id=event_id, action='created', pincode=pincode,
+                data='{"id": %d}' % event_id, created_at=START + timedelta(seconds=seconds)))
+        return event_id
+
+    def read_all(self, cursor='', limit=3, pincode=None):
+        """Page through the feed like a client, passing the cursor string back each time"""
+        seen = []
+        while True:
+            events, positions, more = changes.read(self.engines, ChangeEvent, changes.decode_cursor(cursor),
+                                                   pincode=pincode, limit=limit)
+            self.assertLessEqual(len(events), limit)
+            seen.extend(event['id'] for event in events)
+            cursor = changes.encode_cursor(positions)
+            if not more:
+                return seen, cursor
+
+    def test_pages_merge_regions_in_time_order(self):
+        expected = []
+        for second in range(10):
+            region = 'north' if second % 3 else 'south'
+            expected.append(self.add(region, second))
+        seen, _ = self.read_all()
+        self.assertEqual(seen, expected)
+
+    def test_a_busy_region_does_not_starve_or_skip_the_other(self):
+        north = [self.add('north', second) for second in range(5)]
+        south = [self.add('south', 100 + second) for second in range(5)]
+        seen, cursor = self.read_all(limit=2)
+        self.assertEqual(seen, north + south)
+
+        # Events written after the last page come with the next read, once
+        later = [self.add('south', 200), self.add('north', 201)]
+        seen, _ = self.read_all(cursor, limit=2)
+        self.assertEqual(seen, later)
+
+    def test_pincode_filter(self):
+        wanted = [self.add('north', 1, '110001'), self.add('south', 3, '110001')]
+        self.add('north', 2, '560001')
+        seen, _ = self.read_all(pincode='110001')
+        self.assertEqual(seen, wanted)
+
+    def test_data_is_decoded(self):
+        event_id = self.add('north', 1)
+        events, positions, more = changes.read(self.engines, ChangeEvent, {})
+        self.assertEqual(events[0]['data'], {'id': event_id})
+        self.assertEqual(positions, {'north': event_id})
+        self.assertFalse(more)
+
+
+if __name__ == '__main__':
+    unittest.main()
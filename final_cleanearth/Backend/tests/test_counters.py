@@ -0,0 +1,73 @@
+import unittest
+
+import badges
+from extensions import db
+from models import Badge, UserCounter
+from support import AppTestCase
+
+
+class CampCounterTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, _ = self.register('admin', 'admin')
+        self.reporter, self.reporter_id = self.register('reporter')
+        self.volunteer, self.volunteer_id = self.register('volunteer', 'volunteer')
+        self.camp_id = self.create_camp(self.admin, self.report('reporter@example.com').get_json()['id'])
+
+    def counter(self, user_id, name):
+        with self.app.app_context():
+            row = db.session.get(UserCounter, (user_id, name))
+            return row.value if row else 0
+
+    def join(self):
+        response = self.client.post(f'/api/camp_participate/{self.camp_id}', headers=self.volunteer)
+        self.assertEqual(response.status_code, 200, response.get_json())
+
+    def leave(self):
+        response = self.client.post(f'/api/leave-campaign/{self.camp_id}', headers=self.volunteer)
+        self.assertEqual(response.status_code, 200, response.get_json())
+
+    def test_join_leave_and_rejoin(self):
+        self.join()
+        self.run_jobs()
+        self.assertEqual(self.counter(self.volunteer_id, 'camps_joined'), 1)
+        self.leave()
+        self.run_jobs()
+        self.assertEqual(self.counter(self.volunteer_id, 'camps_joined'), 0)
+        self.join()
+        self.run_jobs()
+        self.assertEqual(self.counter(self.volunteer_id, 'camps_joined'), 1)
+
+    def test_rejoin_before_the_worker_runs(self):
+        # The new participation row reuses the deleted row's id, and each of
+        # the three jobs must still count
+        self.join()
+        self.leave()
+        self.join()
+        self.leave()
+        self.join()
+        self.run_jobs()
+        self.assertEqual(self.counter(self.volunteer_id, 'camps_joined'), 1)
+        with self.app.app_context():
+            self.assertEqual(Badge.query.filter_by(user_id=self.volunteer_id, rule='first_camp').count(), 1)
+
+    def test_counters_match_the_backfill(self):
+        self.join()
+        self.leave()
+        self.join()
+        self.report('reporter@example.com', description='Another pile of rubble behind the bus stop')
+        self.run_jobs()
+        live = {name: self.counter(self.reporter_id, name) for name in ('requests_created', 'new_pincodes_reported')}
+        live['camps_joined'] = self.counter(self.volunteer_id, 'camps_joined')
+        self.assertEqual(live, {'requests_created': 2, 'new_pincodes_reported': 1, 'camps_joined': 1})
+
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                badges.backfill(connection)
+        rebuilt = {name: self.counter(self.reporter_id, name) for name in ('requests_created', 'new_pincodes_reported')}
+        rebuilt['camps_joined'] = self.counter(self.volunteer_id, 'camps_joined')
+        self.assertEqual(rebuilt, live)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+import dedup
+from extensions import db
+from models import Request
+from support import AppTestCase
+
+REPORT = 'Huge garbage dump near the school gate, plastic bags everywhere'
+SAME_REPORT = 'huge garbage dump near school gate - plastic bags everywhere!!'
+OTHER_REPORT = 'Broken sewage pipe flooding the market street since Monday'
+
+
+class MinHashTest(unittest.TestCase):
+    def test_normalized_texts_have_equal_signatures(self):
+        a = dedup.minhash(dedup.shingles('Plastic  bottles, near the LAKE'))
+        b = dedup.minhash(dedup.shingles('plastic bottles near the lake'))
+        self.assertTrue((a == b).all())
+
+    def test_signature_agreement_estimates_jaccard(self):
+        a, b = dedup.shingles(REPORT), dedup.shingles(SAME_REPORT)
+        agreement = (dedup.minhash(a) == dedup.minhash(b)).mean()
+        self.assertAlmostEqual(agreement, dedup.jaccard(a, b), delta=0.25)
+
+    def test_similar_reports_nearby_share_a_key(self):
+        own, _ = dedup.lookup_keys(28.6, 77.2, REPORT, 0.005)
+        _, search = dedup.lookup_keys(28.6004, 77.2004, SAME_REPORT, 0.005)
+        self.assertTrue(set(own) & set(search))
+
+    def test_different_or_distant_reports_share_no_key(self):
+        own, _ = dedup.lookup_keys(28.6, 77.2, REPORT, 0.005)
+        _, other_text = dedup.lookup_keys(28.6, 77.2, OTHER_REPORT, 0.005)
+        _, far_away = dedup.lookup_keys(28.7, 77.3, REPORT, 0.005)
+        self.assertFalse(set(own) & set(other_text))
+        self.assertFalse(set(own) & set(far_away))
+
+    def test_empty_description(self):
+        self.assertEqual(dedup.shingles('  !! '), set())
+        self.assertEqual(dedup.jaccard(set(), {'abc'}), 0.0)
+
+
+class DuplicateLinkTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.headers, _ = self.register('reporter')
+
+    def report_id(self, description, latitude=28.6, longitude=77.2):
+        response = self.report('reporter@example.com', description, latitude=latitude, longitude=longitude)
+        self.assertEqual(response.status_code, 201, response.get_json())
+        return response.get_json()['id']
+
+    def duplicate_of(self, request_id):
+        with self.app.app_context():
+            return db.session.get(Request, request_id).duplicate_of
+
+    def test_links_a_repeated_report_to_the_first(self):
+        first = self.report_id(REPORT)
+        second = self.report_id(SAME_REPORT, 28.6004, 77.2004)
+        # Closest in text to the second report, which is itself a duplicate
+        third = self.report_id(SAME_REPORT, 28.6002, 77.2001)
+        self.assertIsNone(self.duplicate_of(first))
+        self.assertEqual(self.duplicate_of(second), first)
+        self.assertEqual(self.duplicate_of(third), first)
+
+    def test_leaves_different_or_distant_reports_alone(self):
+        self.report_id(REPORT)
+        self.assertIsNone(self.duplicate_of(self.report_id(OTHER_REPORT)))
+        self.assertIsNone(self.duplicate_of(self.report_id(REPORT, 28.62, 77.22)))
+
+
+if __name__ == '__main__':
+    unittest.main()
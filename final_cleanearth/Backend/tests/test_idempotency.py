@@ -0,0 +1,114 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+import idempotency
+from extensions import db
+from models import CampaignVolunteer, IdempotencyKey, Request
+from support import AppTestCase
+
+
+class IdempotentEndpointTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_headers, _ = self.register('reporter')
+
+    def count(self, model, **filters):
+        with self.app.app_context():
+            return model.query.filter_by(**filters).count()
+
+    def test_repeat_replays_the_first_response(self):
+        key = {'Idempotency-Key': 'report-1'}
+        first = self.report('reporter@example.com', headers=key)
+        repeat = self.report('reporter@example.com', headers=key)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(repeat.status_code, 201)
+        self.assertEqual(repeat.headers.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(repeat.get_json()['id'], first.get_json()['id'])
+        self.assertEqual(self.count(Request), 1)
+
+    def test_key_reused_for_a_different_body_is_rejected(self):
+        key = {'Idempotency-Key': 'report-2'}
+        self.assertEqual(self.report('reporter@example.com', headers=key).status_code, 201)
+        other = self.report('reporter@example.com', description='Something else entirely', headers=key)
+        self.assertEqual(other.status_code, 422)
+        self.assertEqual(self.count(Request), 1)
+
+    def test_keys_are_scoped_to_the_caller(self):
+        admin, _ = self.register('admin', 'admin')
+        organiser, _ = self.register('organiser', 'admin')
+        request_id = self.report('reporter@example.com').get_json()['id']
+        body = {'requestId': request_id, 'campName': 'C', 'dateOfCamp': '2030-01-01', 'timeOfCamp': '9',
+                'numberOfVolunteers': 2, 'description': 'd'}
+        a = self.client.post('/api/camp_register', json=body, headers={'Idempotency-Key': 'camp', **admin})
+        b = self.client.post('/api/camp_register', json=body, headers={'Idempotency-Key': 'camp', **organiser})
+        self.assertNotEqual(a.get_json()['id'], b.get_json()['id'])
+        self.assertIsNone(b.headers.get('Idempotent-Replayed'))
+
+    def test_concurrent_repeats_run_the_view_once(self):
+        admin, _ = self.register('admin', 'admin')
+        volunteer, volunteer_id = self.register('volunteer', 'volunteer')
+        camp_id = self.create_camp(admin, self.report('reporter@example.com').get_json()['id'])
+
+        responses = []
+        start = threading.Barrier(4)
+
+        def participate():
+            client = self.app.test_client()
+            start.wait()
+            responses.append(client.post(f'/api/camp_participate/{camp_id}',
+                                         headers={'Idempotency-Key': 'join-1', **volunteer}))
+
+        threads = [threading.Thread(target=participate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([r.status_code for r in responses], [200] * 4)
+        self.assertEqual([r.headers.get('Idempotent-Replayed') for r in responses].count('true'), 3)
+        self.assertEqual(self.count(CampaignVolunteer, campaign_id=camp_id, volunteer_id=volunteer_id), 1)
+
+
+class ClaimTest(AppTestCase):
+    def claim(self, now=None, lock_timeout=30):
+        return idempotency.claim(db.engine, IdempotencyKey, 'scope', 'key', 'fingerprint', ttl=3600,
+                                 lock_timeout=lock_timeout, now=now)
+
+    def test_only_one_concurrent_claim_wins(self):
+        results = []
+        start = threading.Barrier(6)
+
+        def claim():
+            with self.app.app_context():
+                start.wait()
+                results.append(self.claim())
+
+        threads = [threading.Thread(target=claim) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False] * 5 + [True])
+
+    def test_abandoned_and_expired_claims_are_taken_over(self):
+        with self.app.app_context():
+            self.assertTrue(self.claim())
+            self.assertFalse(self.claim())
+            # The worker holding it died: taken over after lock_timeout
+            self.assertTrue(self.claim(now=datetime.utcnow() + timedelta(seconds=31)))
+
+            idempotency.complete(db.engine, IdempotencyKey, 'scope', 'key', 201, 'application/json', b'{}')
+            self.assertFalse(self.claim(now=datetime.utcnow() + timedelta(seconds=60)))
+            self.assertTrue(self.claim(now=datetime.utcnow() + timedelta(hours=2)))
+
+    def test_released_claim_runs_again(self):
+        with self.app.app_context():
+            self.assertTrue(self.claim())
+            idempotency.release(db.engine, IdempotencyKey, 'scope', 'key')
+            self.assertIsNone(idempotency.lookup(db.engine, IdempotencyKey, 'scope', 'key'))
+            self.assertTrue(self.claim())
+
+
+if __name__ == '__main__':
+    unittest.main()
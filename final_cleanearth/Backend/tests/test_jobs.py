@@ -0,0 +1,86 @@
+import unittest
+from datetime import datetime, timedelta
+
+import jobs
+from extensions import db
+from models import Job, UserCounter
+from support import AppTestCase
+
+
+class SettleTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.context = self.app.app_context()
+        self.context.push()
+        jobs.job_handler('test_count')(self.count_handler)
+        self.before_write = None
+
+    def tearDown(self):
+        jobs.JOB_HANDLERS.pop('test_count', None)
+        self.context.pop()
+        super().tearDown()
+
+    def count_handler(self, payload):
+        if self.before_write:
+            self.before_write()
+        db.session.add(UserCounter(user_id=1, counter='test', value=payload['value']))
+        if payload.get('fail'):
+            raise RuntimeError('handler failed')
+
+    def queue(self, **payload):
+        jobs.enqueue(db.session, Job, 'test_count', payload)
+        db.session.commit()
+        return jobs.claim_next(db.session, Job, 'worker-a')
+
+    def counters(self):
+        return [row.value for row in db.session.query(UserCounter).filter_by(counter='test')]
+
+    def test_writes_commit_with_the_job(self):
+        job = self.queue(value=3)
+        self.assertTrue(jobs.run(db.session, job))
+        self.assertEqual(self.counters(), [3])
+        self.assertEqual(db.session.get(Job, job.id).status, 'done')
+
+    def test_failed_handler_leaves_no_writes(self):
+        job = self.queue(value=3, fail=True)
+        self.assertFalse(jobs.run(db.session, job))
+        self.assertEqual(self.counters(), [])
+        stored = db.session.get(Job, job.id)
+        self.assertEqual(stored.status, 'queued')
+        self.assertIn('handler failed', stored.last_error)
+
+    def test_reclaimed_job_discards_the_first_run(self):
+        job = self.queue(value=3)
+
+        def reclaim():
+            # Worker A ran past the lock timeout and worker B took the job over
+            with db.engine.begin() as connection:
+                connection.execute(Job.__table__.update().where(Job.__table__.c.id == job.id).values(
+                    locked_by='worker-b', locked_at=datetime.utcnow()))
+
+        self.before_write = reclaim
+        self.assertFalse(jobs.run(db.session, job))
+        self.assertEqual(self.counters(), [])
+        stored = db.session.get(Job, job.id)
+        self.assertEqual((stored.status, stored.locked_by), ('running', 'worker-b'))
+
+    def test_settle_needs_the_same_lock(self):
+        job = self.queue(value=1)
+        lock = (job.locked_by, job.locked_at)
+        self.assertFalse(jobs.settle(db.session, job, ('worker-b', lock[1]), {Job.status: 'done'}))
+        self.assertFalse(jobs.settle(db.session, job, (lock[0], lock[1] - timedelta(seconds=1)),
+                                     {Job.status: 'done'}))
+        self.assertTrue(jobs.settle(db.session, job, lock, {Job.status: 'done'}))
+        self.assertEqual(db.session.get(Job, job.id).status, 'done')
+
+    def test_stale_lock_is_claimed_again(self):
+        job = self.queue(value=1)
+        Job.query.filter_by(id=job.id).update(
+            {Job.locked_at: datetime.utcnow() - timedelta(seconds=jobs.LOCK_TIMEOUT_SECONDS + 1)})
+        db.session.commit()
+        again = jobs.claim_next(db.session, Job, 'worker-b')
+        self.assertEqual((again.id, again.locked_by, again.attempts), (job.id, 'worker-b', 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
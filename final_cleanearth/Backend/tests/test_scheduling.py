@@ -0,0 +1,149 @@
+import itertools
+import unittest
+
+import numpy as np
+
+import scheduling
+
+
+def brute_force(n_volunteers, capacity, volunteers, camps, distances):
+    """(assigned count, total km) of the best assignment over the candidate edges, by enumeration"""
+    options = [[(-1, 0.0)] for _ in range(n_volunteers)]
+    for v, c, km in zip(volunteers.tolist(), camps.tolist(), distances.tolist()):
+        options[v].append((c, km))
+    best = (0, 0.0)
+    for choice in itertools.product(*options):
+        used = [0] * len(capacity)
+        for camp, _ in choice:
+            if camp >= 0:
+                used[camp] += 1
+        if any(u > cap for u, cap in zip(used, capacity)):
+            continue
+        count = sum(1 for camp, _ in choice if camp >= 0)
+        km = sum(km for _, km in choice)
+        if count > best[0] or (count == best[0] and km < best[1]):
+            best = (count, km)
+    return best
+
+
+def min_cost_flow(n_volunteers, capacity, volunteers, camps, distances):
+    """(assigned count, total km) by successive shortest paths with Bellman-Ford on the full flow graph"""
+    source, sink = n_volunteers + len(capacity), n_volunteers + len(capacity) + 1
+    graph = [[] for _ in range(sink + 1)]  # edges as [to, residual capacity, cost, index of reverse edge]
+
+    def add_edge(a, b, cap, cost):
+        graph[a].append([b, cap, cost, len(graph[b])])
+        graph[b].append([a, 0, -cost, len(graph[a]) - 1])
+
+    for v in range(n_volunteers):
+        add_edge(source, v, 1, 0.0)
+    for v, c, km in zip(volunteers.tolist(), camps.tolist(), distances.tolist()):
+        add_edge(v, n_volunteers + c, 1, km)
+    for c, cap in enumerate(capacity):
+        add_edge(n_volunteers + c, sink, cap, 0.0)
+
+    count, total = 0, 0.0
+    while True:
+        dist = [float('inf')] * len(graph)
+        previous = [None] * len(graph)
+        dist[source] = 0.0
+        for _ in range(len(graph)):
+            changed = False
+            for node, edges in enumerate(graph):
+                if dist[node] == float('inf'):
+                    continue
+                for i, (to, cap, cost, _) in enumerate(edges):
+                    if cap > 0 and dist[node] + cost < dist[to] - 1e-12:
+                        dist[to], previous[to] = dist[node] + cost, (node, i)
+                        changed = True
+            if not changed:
+                break
+        if dist[sink] == float('inf'):
+            return count, total
+        node = sink
+        while node != source:
+            parent, i = previous[node]
+            edge = graph[parent][i]
+            edge[1] -= 1
+            graph[node][edge[3]][1] += 1
+            node = parent
+        count += 1
+        total += dist[sink]
+
+
+def random_instance(rng, max_volunteers=6, max_camps=3):
+    n_volunteers = int(rng.integers(1, max_volunteers + 1))
+    n_camps = int(rng.integers(1, max_camps + 1))
+    volunteer_lats = 28.6 + rng.uniform(-0.05, 0.05, n_volunteers)
+    volunteer_lons = 77.2 + rng.uniform(-0.05, 0.05, n_volunteers)
+    camp_lats = 28.6 + rng.uniform(-0.05, 0.05, n_camps)
+    camp_lons = 77.2 + rng.uniform(-0.05, 0.05, n_camps)
+    capacity = rng.integers(1, 3, n_camps).tolist()
+    max_km = float(rng.uniform(2, 12))
+    per_volunteer = int(rng.integers(1, max_camps + 1))
+    edges = scheduling.candidate_graph(volunteer_lats, volunteer_lons, camp_lats, camp_lons, max_km, per_volunteer)
+    return n_volunteers, capacity, edges
+
+
+class AssignTest(unittest.TestCase):
+    def test_matches_brute_force_on_random_instances(self):
+        rng = np.random.default_rng(7)
+        for _ in range(300):
+            n_volunteers, capacity, (volunteers, camps, distances) = random_instance(rng)
+            assigned = scheduling.assign(n_volunteers, capacity, volunteers, camps, distances)
+
+            km = {(v, c): d for v, c, d in zip(volunteers.tolist(), camps.tolist(), distances.tolist())}
+            chosen = [(v, c) for v, c in enumerate(assigned.tolist()) if c >= 0]
+            for pair in chosen:
+                self.assertIn(pair, km, "assigned outside the candidate graph")
+            best_count, best_km = brute_force(n_volunteers, capacity, volunteers, camps, distances)
+            self.assertEqual(len(chosen), best_count)
+            self.assertAlmostEqual(sum(km[pair] for pair in chosen), best_km, places=9)
+
+    def test_matches_min_cost_flow_on_larger_instances(self):
+        rng = np.random.default_rng(13)
+        for _ in range(150):
+            n_volunteers, capacity, (volunteers, camps, distances) = random_instance(rng, 30, 8)
+            assigned = scheduling.assign(n_volunteers, capacity, volunteers, camps, distances)
+
+            km = {(v, c): d for v, c, d in zip(volunteers.tolist(), camps.tolist(), distances.tolist())}
+            chosen = [(v, c) for v, c in enumerate(assigned.tolist()) if c >= 0]
+            best_count, best_km = min_cost_flow(n_volunteers, capacity, volunteers, camps, distances)
+            self.assertEqual(len(chosen), best_count)
+            self.assertAlmostEqual(sum(km[pair] for pair in chosen), best_km, places=6)
+
+    def test_never_exceeds_capacity(self):
+        rng = np.random.default_rng(11)
+        for _ in range(50):
+            n_volunteers, capacity, edges = random_instance(rng, max_volunteers=40, max_camps=8)
+            assigned = scheduling.assign(n_volunteers, capacity, *edges)
+            filled = np.bincount(assigned[assigned >= 0], minlength=len(capacity))
+            self.assertTrue((filled <= np.array(capacity)).all())
+
+    def test_moves_a_volunteer_to_free_a_closer_spot(self):
+        # Volunteer 0 is nearest to camp 0, but only volunteer 0 can reach camp 1
+        volunteers = np.array([0, 0, 1])
+        camps = np.array([0, 1, 0])
+        distances = np.array([1.0, 2.0, 5.0])
+        assigned = scheduling.assign(2, [1, 1], volunteers, camps, distances)
+        self.assertEqual(assigned.tolist(), [1, 0])
+
+
+class PlanTest(unittest.TestCase):
+    def test_respects_exclusions_and_skips_full_camps(self):
+        volunteers = [(10, 28.600, 77.200), (11, 28.601, 77.201), (12, None, None)]
+        camps = [(100, 28.600, 77.200, 2), (101, 28.602, 77.202, 0), (102, 28.610, 77.210, 1)]
+        plan = scheduling.plan(volunteers, camps, max_km=10, excluded=[(10, 100)])
+        assigned = {volunteer: camp for volunteer, camp, _ in plan}
+        self.assertNotEqual(assigned.get(10), 100)
+        self.assertNotIn(101, assigned.values())
+        self.assertNotIn(12, assigned)
+        self.assertEqual(set(assigned), {10, 11})
+
+    def test_empty_inputs(self):
+        self.assertEqual(scheduling.plan([], [(1, 28.6, 77.2, 3)], max_km=5), [])
+        self.assertEqual(scheduling.plan([(1, 28.6, 77.2)], [], max_km=5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import math
+import struct
+
+from sqlalchemy import text
+
+import sharding
+
+# Pre-aggregated request density tiles. Request counts per status are kept on
+# a Web Mercator grid at several resolutions: a map tile at zoom z is split into
+# 2**CELL_BITS x 2**CELL_BITS cells, which are the grid cells of level
+# z + CELL_BITS. Every request is counted once per level, so serving a tile is
+# one primary key range scan whatever the number of requests underneath.
+
+CELL_BITS = 6
+CELLS_PER_SIDE = 1 << CELL_BITS
+MAX_TILE_ZOOM = 16
+LEVELS = range(CELL_BITS, MAX_TILE_ZOOM + CELL_BITS + 1)
+
+# Status codes used in the binary format; anything else is OTHER_STATUS
+STATUSES = ['pending', 'in-progress', 'completed']
+OTHER_STATUS = 255
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+MAX_LATITUDE = 85.05112878
+
+BINARY_MAGIC = b'CET1'
+# magic, zoom, tile x, tile y, cell bits, record count
+BINARY_HEADER = struct.Struct('<4sBIIBI')
+# cell index (cy * CELLS_PER_SIDE + cx), status code, count
+BINARY_RECORD = struct.Struct('<HBI')
+
+UPSERT = """
+    INSERT INTO request_tile (zoom, x, y, status, count) VALUES (:zoom, :x, :y, :status, :delta)
+    ON CONFLICT (zoom, x, y, status) DO UPDATE SET count = request_tile.count + excluded.count"""
+
+
+def cell_for(latitude, longitude, level):
+    """Web Mercator grid cell (x, y) of a point at the given level"""
+    n = 1 << level
+    lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude)))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def cells_for(latitudes, longitudes, level):
+    """Vectorized cell_for over numpy arrays"""
+    import numpy as np
+    n = 1 << level
+    lat = np.radians(np.clip(latitudes, -MAX_LATITUDE, MAX_LATITUDE))
+    x = ((longitudes + 180.0) / 360.0 * n).astype(np.int64)
+    y = ((1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def count_changes(latitude, longitude, status, delta):
+    """Upsert parameters adding `delta` to the point's cell at every level"""
+    changes = []
+    for level in LEVELS:
+        x, y = cell_for(latitude, longitude, level)
+        changes.append({'zoom': level, 'x': x, 'y': y, 'status': status or 'pending', 'delta': delta})
+    return changes
+
+
+def apply_changes(connection, changes):
+    """Apply count changes with one executemany upsert (SQLite 3.24+ / PostgreSQL)"""
+    if changes:
+        connection.execute(text(UPSERT), changes)
+
+
+def rebuild(connection, region_engines=None, batch_size=50000):
+    """
+    Recompute every tile count from the request and archived_request tables.
+    Requests are read in id order batches and binned with numpy. With
+    sharding, `region_engines` hold the requests; the counts of every region
+    are written through `connection` to the global database. Returns the
+    number of rows written.
+    """
+    connection.execute(text("DELETE FROM request_tile"))
+    totals = {}
+    for region in sharding.each_region(connection, region_engines):
+        count_requests(region, totals, batch_size)
+
+    rows = [{'zoom': k[0], 'x': k[1], 'y': k[2], 'status': k[3], 'delta': v} for k, v in totals.items()]
+    for start in range(0, len(rows), batch_size):
+        apply_changes(connection, rows[start:start + batch_size])
+    return len(rows)
+
+
+def count_requests(connection, totals, batch_size):
+    """Add the requests of one database to `totals` ({(level, x, y, status): count})"""
+    import numpy as np
+    last_id = 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, latitude, longitude, COALESCE(status, 'pending') FROM ("
+            "SELECT id, latitude, longitude, status FROM request "
+            "UNION ALL SELECT id, latitude, longitude, status FROM archived_request"
+            ") WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        latitudes = np.array([r[1] for r in rows], dtype=np.float64)
+        longitudes = np.array([r[2] for r in rows], dtype=np.float64)
+        statuses = np.array([r[3] for r in rows], dtype=object)
+        for level in LEVELS:
+            xs, ys = cells_for(latitudes, longitudes, level)
+            for status in set(statuses):
+                mask = statuses == status
+                keys, counts = np.unique(np.stack([xs[mask], ys[mask]], axis=1), axis=0, return_counts=True)
+                for (x, y), count in zip(keys.tolist(), counts.tolist()):
+                    key = (level, x, y, status)
+                    totals[key] = totals.get(key, 0) + count
+
+
+def tile_bounds(z, x, y):
+    """Grid level and inclusive-exclusive cell ranges covered by map tile z/x/y"""
+    level = z + CELL_BITS
+    return level, (x << CELL_BITS, (x + 1) << CELL_BITS), (y << CELL_BITS, (y + 1) << CELL_BITS)
+
+
+def encode_binary(z, x, y, rows):
+    """
+    Little-endian binary tile: a 18 byte header (magic 'CET1', zoom u8,
+    x u32, y u32, cell bits u8, record count u32) then 7 byte records of
+    (cell index u16, status code u8, count u32). Cell index is
+    cy * 2**cell_bits + cx, relative to the tile's top-left cell.
+    """
+    x0, y0 = x << CELL_BITS, y << CELL_BITS
+    body = bytearray(BINARY_HEADER.pack(BINARY_MAGIC, z, x, y, CELL_BITS, len(rows)))
+    for cell_x, cell_y, status, count in rows:
+        index = (cell_y - y0) * CELLS_PER_SIDE + (cell_x - x0)
+        body += BINARY_RECORD.pack(index, STATUS_CODES.get(status, OTHER_STATUS), count)
+    return bytes(body)
+
+
+def encode_json(z, x, y, rows):
+    """Compact JSON tile: cells as [cx, cy, [count per status]] relative to the tile"""
+    x0, y0 = x << CELL_BITS, y << CELL_BITS
+    cells = {}
+    for cell_x, cell_y, status, count in rows:
+        counts = cells.setdefault((cell_x - x0, cell_y - y0), [0] * (len(STATUSES) + 1))
+        counts[STATUS_CODES.get(status, len(STATUSES))] += count
+    return {
+        'z': z,
+        'x': x,
+        'y': y,
+        'size': CELLS_PER_SIDE,
+        'statuses': STATUSES + ['other'],
+        'cells': [[cx, cy, counts] for (cx, cy), counts in sorted(cells.items())]
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    from app import app, db, region_engines
+
+    if sys.argv[1:] != ['rebuild']:
+        print("Usage: python tiles.py rebuild")
+        sys.exit(1)
+
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            written = rebuild(connection, list(region_engines().values()) if db.sharded else None)
+    print(f"Rebuilt {written} tile count row(s)")
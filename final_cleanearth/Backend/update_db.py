@@ -1,4 +1,7 @@
-from app import db, Campaign
+from app import app, db, Campaign, Request, RequestSignature, RequestTile, Notification, index_request, create_search_index, region_engines
+import metrics
+import priority
+import tiles
 import sqlite3
 from sqlite3 import Error
 
@@ -36,6 +39,23 @@ def update_campaign_table():
             print("Adding column completed_at")
             cursor.execute("ALTER TABLE campaign ADD COLUMN completed_at DATETIME")
         
+        if 'waste_quantity' not in columns:
+            print("Adding column waste_quantity")
+            cursor.execute("ALTER TABLE campaign ADD COLUMN waste_quantity FLOAT")
+        
+        if 'waste_unit' not in columns:
+            print("Adding column waste_unit")
+            cursor.execute("ALTER TABLE campaign ADD COLUMN waste_unit VARCHAR(10)")
+        
+        if 'waste_kg' not in columns:
+            print("Adding column waste_kg")
+            cursor.execute("ALTER TABLE campaign ADD COLUMN waste_kg FLOAT")
+        
+        # Indexes behind campaign search and participant counts
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_campaign_status_date ON campaign (status, date, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_campaign_request_id ON campaign (request_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_campaign_volunteer_campaign_id ON campaign_volunteer (campaign_id)")
+        
         # Commit the changes
         conn.commit()
         print("Database updated successfully")
@@ -46,6 +66,198 @@ def update_campaign_table():
         if conn:
             conn.close()
 
+def backfill_waste_metrics(batch_size=500):
+    """
+    Parse the free-text waste_collected of completed campaigns into numeric
+    quantity/unit fields, then rebuild the daily impact rollups from scratch.
+    """
+    with app.app_context():
+        db.create_all()
+        pending = Campaign.query.filter(
+            Campaign.waste_collected.isnot(None),
+            Campaign.waste_quantity.is_(None)
+        ).order_by(Campaign.id)
+        
+        parsed = unparsed = 0
+        last_id = 0
+        while True:
+            batch = pending.filter(Campaign.id > last_id).limit(batch_size).all()
+            if not batch:
+                break
+            for campaign in batch:
+                quantity, unit = metrics.parse_waste(campaign.waste_collected)
+                if quantity is None:
+                    unparsed += 1
+                    continue
+                campaign.waste_quantity = quantity
+                campaign.waste_unit = unit
+                campaign.waste_kg = metrics.to_kg(quantity, unit)
+                parsed += 1
+            last_id = batch[-1].id
+            db.session.commit()
+        
+        with db.engine.begin() as connection:
+            rollups = metrics.rebuild_rollups(connection, list(region_engines().values()) if db.sharded else None)
+        
+        print(f"Parsed {parsed} waste value(s), {unparsed} could not be parsed; rebuilt {rollups} rollup row(s)")
+
+def update_request_table():
+    """
+    Add the duplicate_of and triage priority columns to the request tables
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect('cleanearth.db')
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(request)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'duplicate_of' not in columns:
+            print("Adding column duplicate_of")
+            cursor.execute("ALTER TABLE request ADD COLUMN duplicate_of INTEGER REFERENCES request(id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_request_duplicate_of ON request (duplicate_of)")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_request_pincode ON request (pincode)")
+        
+        for table in ('request', 'archived_request'):
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [column[1] for column in cursor.fetchall()]
+            if columns and 'priority' not in columns:
+                print(f"Adding priority columns to {table}")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN priority FLOAT")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN duplicate_count INTEGER")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN cluster_size INTEGER")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_request_triage ON request (status, priority)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_request_triage_pincode ON request (status, pincode, priority)")
+        
+        # The first-report badge also looks up archived requests by pincode
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'archived_request'")
+        if cursor.fetchone():
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_archived_request_pincode ON archived_request (pincode)")
+        
+        conn.commit()
+        print("Database updated successfully")
+        
+    except Error as e:
+        print(f"Error updating database: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def update_request_priority():
+    """
+    Score every request for triage. Runs after the other request updates, as
+    the score counts duplicates and campaigns. The columns are added by
+    update_request_table().
+    """
+    with app.app_context():
+        count = priority.rebuild(db.session, Request, Campaign, app.config['PRIORITY_CLUSTER_RADIUS_M'])
+    print(f"Scored {count} request(s)")
+
+def update_badge_table():
+    """
+    Add the rule column to the Badge table in the database
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect('cleanearth.db')
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(badge)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'rule' not in columns:
+            print("Adding column rule")
+            cursor.execute("ALTER TABLE badge ADD COLUMN rule VARCHAR(50)")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_badge_user_rule ON badge (user_id, rule)")
+        
+        conn.commit()
+        print("Database updated successfully")
+        
+    except Error as e:
+        print(f"Error updating database: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def update_notification_table():
+    """
+    Add entity_created_at to the notification table and to its unique
+    constraint. SQLite can't change a constraint in place, so the table is
+    rebuilt; existing rows keep a NULL entity_created_at.
+    """
+    with app.app_context():
+        db.create_all()
+        columns = [column['name'] for column in db.inspect(db.engine).get_columns('notification')]
+        if 'entity_created_at' in columns:
+            print("Notification table already up to date")
+            return
+        table = Notification.__table__
+        copied = ', '.join(columns)
+        with db.engine.begin() as connection:
+            connection.execute(db.text("ALTER TABLE notification RENAME TO notification_old"))
+            for index in table.indexes:
+                connection.execute(db.text(f"DROP INDEX IF EXISTS {index.name}"))
+            table.create(connection)
+            connection.execute(db.text(f"INSERT INTO notification ({copied}) SELECT {copied} FROM notification_old"))
+            connection.execute(db.text("DROP TABLE notification_old"))
+        print("Rebuilt notification table with entity_created_at")
+
+def index_existing_requests(batch_size=500):
+    """
+    Build duplicate-detection signatures for requests that don't have any yet.
+    Requests are indexed oldest first so the earliest report becomes canonical.
+    """
+    with app.app_context():
+        db.create_all()
+        indexed = db.session.query(RequestSignature.request_id).distinct()
+        pending = Request.query.filter(~Request.id.in_(indexed)).order_by(Request.id)
+        
+        count = linked = 0
+        last_id = 0
+        while True:
+            batch = pending.filter(Request.id > last_id).limit(batch_size).all()
+            if not batch:
+                break
+            for waste_request in batch:
+                duplicate_of, _ = index_request(waste_request)
+                # Signatures must be visible to the next request in the batch
+                db.session.flush()
+                count += 1
+                linked += 1 if duplicate_of else 0
+            last_id = batch[-1].id
+            db.session.commit()
+        
+        print(f"Indexed {count} request(s), {linked} linked as duplicates")
+
+def build_request_tiles():
+    """
+    Fill the map density tiles from existing requests. Only runs when the
+    table is empty; `python tiles.py rebuild` recomputes it from scratch.
+    """
+    with app.app_context():
+        db.create_all()
+        if RequestTile.query.first() is not None:
+            print("Request tiles already built")
+            return
+        with db.engine.begin() as connection:
+            written = tiles.rebuild(connection, list(region_engines().values()) if db.sharded else None)
+        print(f"Built {written} request tile count(s)")
+
 if __name__ == "__main__":
     update_campaign_table()
-    print("Campaign table update complete.")
\ No newline at end of file
+    backfill_waste_metrics()
+    print("Campaign table update complete.")
+    update_request_table()
+    index_existing_requests()
+    build_request_tiles()
+    update_request_priority()
+    print("Request table update complete.")
+    update_badge_table()
+    print("Badge table update complete. Run `python badges.py backfill` to award automatic badges.")
+    update_notification_table()
+    with app.app_context():
+        created = create_search_index()
+    print(f"Search index update complete ({', '.join(created) or 'already present'}).")
\ No newline at end of file
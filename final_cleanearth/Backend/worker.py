@@ -0,0 +1,104 @@
+import argparse
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+from app import app, db, Job
+import jobs
+
+
+def worker_loop(worker_id, stop, poll_interval, drain):
+    """Claim and run jobs until stopped (or until the queue is empty when draining)"""
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                job = jobs.claim_next(db.session, Job, worker_id)
+            except Exception as e:
+                # Usually a locked SQLite database, try again on the next poll
+                db.session.rollback()
+                print(f"[{worker_id}] Error claiming job: {str(e)}")
+                job = None
+            
+            if job is None:
+                if drain:
+                    break
+                stop.wait(poll_interval)
+                continue
+            
+            started = time.monotonic()
+            ok = jobs.run(db.session, job)
+            print(f"[{worker_id}] Job {job.id} ({job.kind}) {'done' if ok else 'failed'} in {time.monotonic() - started:.3f}s")
+            db.session.remove()
+
+
+def run_workers(num_workers, poll_interval, drain=False):
+    stop = threading.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=worker_loop, args=(f"{prefix}:{i}", stop, poll_interval, drain), daemon=True)
+        for i in range(num_workers)
+    ]
+    for thread in threads:
+        thread.start()
+    
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        print("Stopping workers...")
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def show_stats():
+    with app.app_context():
+        counts = db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all()
+        for status, count in counts:
+            print(f"{status}: {count}")
+        if not counts:
+            print("No jobs")
+
+
+def retry_failed():
+    with app.app_context():
+        retried = Job.query.filter_by(status='failed').update({
+            Job.status: 'queued',
+            Job.attempts: 0,
+            Job.run_at: datetime.utcnow(),
+            Job.finished_at: None
+        }, synchronize_session=False)
+        db.session.commit()
+        print(f"Re-queued {retried} failed job(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CleanEarth background job workers")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    run_parser = subparsers.add_parser('run', help="Run workers until interrupted")
+    run_parser.add_argument('--workers', type=int, default=2, help="Number of worker threads")
+    run_parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+    
+    drain_parser = subparsers.add_parser('drain', help="Run every due job, then exit")
+    drain_parser.add_argument('--workers', type=int, default=2, help="Number of worker threads")
+    
+    subparsers.add_parser('stats', help="Show job counts by status")
+    subparsers.add_parser('retry-failed', help="Re-queue jobs that ran out of attempts")
+    
+    args = parser.parse_args()
+    
+    with app.app_context():
+        db.create_all()
+    
+    if args.command == 'drain':
+        run_workers(args.workers, 0, drain=True)
+    elif args.command == 'stats':
+        show_stats()
+    elif args.command == 'retry-failed':
+        retry_failed()
+    else:
+        run_workers(getattr(args, 'workers', 2), getattr(args, 'poll_interval', 1.0))
@@ -0,0 +1,14 @@
+"""
+Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app the master imports this once and forks the workers, which
+then share the loaded code pages, including the numpy-backed modules that
+the app itself only imports on first use.
+"""
+from app import create_app
+
+import dedup  # noqa: F401
+import matching  # noqa: F401
+import scheduling  # noqa: F401
+
+app = create_app()